@@ -0,0 +1,131 @@
+# beat_detector.py
+"""
+Inkrementel beat-detektor til pulssensoren i medicinboksen.
+
+update(v, t_ms) kaldes for hver ADC-måling. Tærsklen følger signalet:
+et glidende DC-niveau plus halvdelen af en amplitude-kurve der falder
+langsomt, så detektoren virker uanset sensorens niveau og forstærkning.
+Intervallerne mellem slag (IBI) ligger i en ringbuffer af fast størrelse
+med løbende sum og kvadratsum, så middel og jitter er O(1) pr. slag, og
+der allokeres intet i måle-løkken.
+
+Ren Python (array/time), så den kører på MicroPython og kan testes mod
+optagede eller syntetiske ADC-spor under CPython.
+"""
+from array import array
+
+try:
+    from time import ticks_diff
+except ImportError:
+    def ticks_diff(a, b):
+        return a - b
+
+
+class BeatDetector:
+    # Tidskonstanter som bit-skift: DC-niveauet følger signalet med 1/64 pr.
+    # måling (ca. 0,3 s ved 200 Hz), amplituden falder med 1/256 (ca. 1,3 s)
+    DC_SHIFT = 6
+    ENV_SHIFT = 8
+
+    def __init__(self, window=8, refractory_ms=350, min_bpm=40, max_bpm=180,
+                 max_jitter=0.35, min_beats=6, min_amplitude=60):
+        self.window = window
+        self.refractory_ms = refractory_ms
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.max_jitter = max_jitter
+        self.min_beats = min_beats
+        self.min_amplitude = min_amplitude
+        self.max_ibi_ms = 60000 // min_bpm
+        self._ibis = array("i", [0] * window)
+        self._dc = -1
+        self._env = 0
+        self.reset()
+
+    def reset(self):
+        """Glemmer slag og IBI'er (fx når boksen lukkes). Signal-niveauet beholdes."""
+        self._pos = 0
+        self._count = 0
+        self._sum = 0
+        self._sum_sq = 0
+        self._last_beat = None
+        self._armed = True
+        self.beats = 0
+
+    # ---------- SIGNAL ----------
+    def update(self, v, t_ms):
+        """Én måling. Returnerer True hvis målingen er et nyt slag."""
+        shift = self.DC_SHIFT
+        if self._dc < 0:
+            self._dc = v << shift
+        # DC som EMA i fast-komma (x 2**shift), så der kun bruges heltal
+        self._dc += v - (self._dc >> shift)
+        above = v - (self._dc >> shift)
+        if above > self._env:
+            self._env = above
+        elif self._env > 0:
+            self._env -= (self._env >> self.ENV_SHIFT) + 1
+
+        if self._env < self.min_amplitude:
+            return False
+        if self._armed:
+            if above > self._env >> 1:
+                self._armed = False
+                return self._beat(t_ms)
+        elif above < self._env >> 2:
+            self._armed = True  # hysterese: ned under 1/4 før næste slag
+        return False
+
+    def _beat(self, t_ms):
+        last = self._last_beat
+        if last is not None:
+            ibi = ticks_diff(t_ms, last)
+            if ibi < self.refractory_ms:
+                return False
+            if ibi > self.max_ibi_ms:
+                # Pause (fx fingeren løftet) -> start forfra med dette slag
+                self.reset()
+            else:
+                self._push(ibi)
+        self._last_beat = t_ms
+        self.beats += 1
+        return True
+
+    # ---------- IBI-RINGBUFFER ----------
+    def _push(self, ibi):
+        if self._count == self.window:
+            old = self._ibis[self._pos]
+            self._sum -= old
+            self._sum_sq -= old * old
+        else:
+            self._count += 1
+        self._ibis[self._pos] = ibi
+        self._sum += ibi
+        self._sum_sq += ibi * ibi
+        self._pos = (self._pos + 1) % self.window
+
+    def mean_ibi(self):
+        return self._sum / self._count if self._count else None
+
+    def jitter(self):
+        """Standardafvigelse / middel for IBI'erne i bufferen."""
+        if self._count < 2:
+            return None
+        mean = self._sum / self._count
+        var = self._sum_sq / self._count - mean * mean
+        return (var if var > 0 else 0) ** 0.5 / mean
+
+    def bpm(self):
+        """
+        BPM når der er min_beats slag i træk med stabile intervaller
+        (jitter <= max_jitter) og en realistisk puls, ellers None.
+        """
+        if self._count < self.min_beats - 1:
+            return None
+        jitter = self.jitter()
+        if jitter is None or jitter > self.max_jitter:
+            return None
+        bpm = int(60000 / self.mean_ibi() + 0.5)
+        if not self.min_bpm <= bpm <= self.max_bpm:
+            return None
+        return bpm
@@ -1,15 +1,20 @@
 import network
-import urequests as requests
 import uasyncio as asyncio
 import json
 import time
 from machine import ADC, Pin
 
+from event_codec import MIMETYPE, unix_time
+from beat_detector import BeatDetector
+from sampler import Sampler
+from spool import Backoff, Spool, upload_result
+
 # --------- KONFIGURATION ---------
 WIFI_SSID = "8awifi"
 WIFI_PASS = "Gruppe8a!"
 
 API_BASE = "http://192.168.0.52:5000"
+HTTP_TIMEOUT_S = 5                # hele requesten; serveren kan være nede
 DEVICE_USER_ID = 1
 BORGER_ID = 1
 
@@ -23,8 +28,10 @@ LDR_STABLE_COUNT = 3
 PULSE_PIN = 32
 
 
-# Beat-detektion
-PEAK_THRESHOLD = 2200             # 1900 gav ofte støj-beats
+# Beat-detektion (adaptiv tærskel, se beat_detector.py)
+PULSE_SAMPLE_MS = 5               # 200 Hz – før 20 ms, som kunne ramme ved siden af toppen
+PULSE_DRAIN_MS = 20               # hvor tit task_pulse tømmer samplerens ringbuffer
+MIN_PULSE_AMPLITUDE = 60          # ADC-enheder over DC-niveauet før noget tæller som slag
 REFRACTORY_MS = 350
 
 # Validitetsregler
@@ -33,8 +40,17 @@ MAX_VALID_BPM = 180
 MIN_BEATS_FOR_VALID = 6
 MAX_IBI_JITTER = 0.35
 
+# Spool på flash (overlever genstart) og upload i batches
+SPOOL_PATH = "/spool.bin"
+SPOOL_CAPACITY = 512
+UPLOAD_BATCH = 50
+UPLOAD_IDLE_MS = 500
+
 token = None
 box_open_state = None  # True = åben, False = lukket
+measuring = False      # pulsmåling i gang -> uploads venter, så samplingen ikke forstyrres
+sampler = None         # sættes i main(), se sampler.py
+spool = Spool(SPOOL_PATH, SPOOL_CAPACITY)
 
 
 # --------- WIFI + TOKEN ---------
@@ -49,77 +65,119 @@ def connect_wifi():
             print(".", end="")
     print("\nWiFi forbundet:", wlan.ifconfig())
 
+    # Rigtigt ur, så spoolede events beholder deres tidspunkt
+    try:
+        import ntptime
+        ntptime.settime()
+    except Exception as e:
+        print("NTP fejlede:", e)
 
-def get_token():
-    global token
-    url = f"{API_BASE}/token/{DEVICE_USER_ID}"
-    print("Henter token fra:", url)
 
-    r = requests.post(url)
-    print("Status fra /token:", r.status_code)
+def _host_port(base):
+    host, _, port = base.split("://", 1)[1].split("/", 1)[0].partition(":")
+    return host, int(port or 80)
 
+
+API_HOST, API_PORT = _host_port(API_BASE)
+
+
+async def _http_post(path, body, headers):
+    reader, writer = await asyncio.open_connection(API_HOST, API_PORT)
     try:
-        raw = r.text
-    except AttributeError:
-        raw = r.content.decode()
+        head = "POST %s HTTP/1.0\r\nHost: %s\r\nContent-Length: %d\r\n" % (
+            path, API_HOST, len(body))
+        for name, value in headers.items():
+            head += "%s: %s\r\n" % (name, value)
+        writer.write(head.encode() + b"\r\n" + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        data = await reader.read(-1)  # HTTP/1.0: serveren lukker efter svaret
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return status, data
+
+
+async def http_post(path, body=b"", headers=None):
+    """
+    POST uden at blokere event-loopet (urequests blokerer hele loopet, også Sampler.run).
+    Returnerer (status, body); rejser OSError eller TimeoutError efter HTTP_TIMEOUT_S.
+    """
+    return await asyncio.wait_for(_http_post(path, body, headers or {}), HTTP_TIMEOUT_S)
+
+
+async def get_token():
+    global token
+    path = f"/token/{DEVICE_USER_ID}"
+    print("Henter token fra:", API_BASE + path)
 
+    status, raw = await http_post(path)
+    print("Status fra /token:", status)
     print("Rå svar:", raw)
 
-    if r.status_code != 200:
-        r.close()
+    if status != 200:
         raise Exception("Kunne ikke hente token")
 
-    data = json.loads(raw)
-    r.close()
-
-    token = data["token"]
+    token = json.loads(raw.decode())["token"]
     print("Modtog token:", token)
 
 
 def auth_headers():
     return {
-        "Content-Type": "application/json",
+        "Content-Type": MIMETYPE,
         "Authorization": f"Bearer {token}",
     }
 
 
-def post_json(path, payload):
-    try:
-        r = requests.post(
-            f"{API_BASE}{path}",
-            headers=auth_headers(),
-            data=json.dumps(payload),
-        )
-        try:
-            body = r.text
-        except AttributeError:
-            body = r.content.decode()
-        print(path, "->", r.status_code, body)
-        r.close()
-    except Exception as e:
-        print("Fejl ved POST", path, ":", e)
+def event_time():
+    """Unix-tid hvis uret er sat via NTP, ellers 0 (= serverens tid)."""
+    return unix_time() if time.gmtime()[0] >= 2024 else 0
 
 
-# --------- ADC HJÆLP ---------
-def read_adc_avg(adc, samples=10, delay_ms=5):
-    total = 0
-    for _ in range(samples):
-        total += adc.read()
-        time.sleep_ms(delay_ms)
-    return total // samples
+def record_event(kind, value):
+    """Gemmer et event i spoolen; task_uploader sender det."""
+    spool.push(kind, BORGER_ID, value, event_time())
 
 
+async def send_batch(body):
+    """
+    POST af en binær batch til /events/batch (se event_codec.py).
+    Returnerer HTTP-status, eller None ved netværksfejl/timeout/afvist token.
+    """
+    try:
+        status, _ = await http_post("/events/batch", body, auth_headers())
+    except Exception as e:
+        print("Fejl ved POST /events/batch:", e)
+        return None
+    print("/events/batch ->", status)
+    if status == 401:
+        try:
+            await get_token()
+        except Exception as e:
+            print("Token fejl:", e)
+        return None
+    return status
 
 
+# --------- ADC ---------
+def make_sampler():
+    adc_ldr = ADC(Pin(LDR_PIN))
+    adc_ldr.atten(ADC.ATTN_11DB)
+    adc_pulse = ADC(Pin(PULSE_PIN))
+    adc_pulse.atten(ADC.ATTN_11DB)
+    # LDR midles over 10 målinger á 5 ms – samme som den gamle read_adc_avg
+    return Sampler(adc_pulse.read, adc_ldr.read, period_ms=PULSE_SAMPLE_MS, ldr_samples=10)
+
 
 # --------- TASK: BOKS ---------
 async def task_box():
     global box_open_state
 
-    adc_ldr = ADC(Pin(LDR_PIN))
-    adc_ldr.atten(ADC.ATTN_11DB)
-
-    v0 = read_adc_avg(adc_ldr, samples=12, delay_ms=5)
+    while sampler.ldr.seq == 0:
+        await asyncio.sleep_ms(10)
+    v0 = sampler.ldr.value
     if v0 >= LDR_OPEN_THRESHOLD:
         box_open_state = True
     elif v0 <= LDR_CLOSE_THRESHOLD:
@@ -128,13 +186,13 @@ async def task_box():
         box_open_state = False
 
     print("Initial boks-tilstand:", "ÅBEN" if box_open_state else "LUKKET", "ADC:", v0)
-    post_json("/box-event", {"borger_id": BORGER_ID, "box_open": box_open_state})
+    record_event("box", box_open_state)
 
     stable_counter = 0
     candidate_state = box_open_state
 
     while True:
-        v = read_adc_avg(adc_ldr, samples=10, delay_ms=5)
+        v = sampler.ldr.value
 
         if box_open_state is False and v >= LDR_OPEN_THRESHOLD:
             candidate_state = True
@@ -150,7 +208,7 @@ async def task_box():
                 stable_counter = 0
 
                 print("Boks-tilstand ændret:", "ÅBEN" if box_open_state else "LUKKET", "ADC:", v)
-                post_json("/box-event", {"borger_id": BORGER_ID, "box_open": box_open_state})
+                record_event("box", box_open_state)
         else:
             stable_counter = 0
 
@@ -159,8 +217,15 @@ async def task_box():
 
 # --------- TASK: PULS ---------
 async def task_pulse():
-    adc_pulse = ADC(Pin(PULSE_PIN))
-    adc_pulse.atten(ADC.ATTN_11DB)
+    global measuring
+    detector = BeatDetector(
+        refractory_ms=REFRACTORY_MS,
+        min_bpm=MIN_VALID_BPM,
+        max_bpm=MAX_VALID_BPM,
+        max_jitter=MAX_IBI_JITTER,
+        min_beats=MIN_BEATS_FOR_VALID,
+        min_amplitude=MIN_PULSE_AMPLITUDE,
+    )
 
     while True:
         print("Venter på at boksen åbnes for at måle puls...")
@@ -168,80 +233,74 @@ async def task_pulse():
             await asyncio.sleep_ms(100)
 
         print("Boks åben -> forsøger pulsmåling")
-
-        sent_valid = False
-
-        # Reset målevariabler for åbning
-        beats = 0
-        beat_times = []
-        last_above = False
-        last_beat_ms = 0
-
-        while True:
-            # Stop hvis boksen lukkes
-            if box_open_state is False:
-                print("Boks lukket -> stopper pulsmåling.")
+        measuring = True
+        detector.reset()
+        cursor = sampler.pulse.written
+
+        while box_open_state is not False:
+            # Samplerens målinger (med tidspunkt) siden sidst; kun heltalsregning
+            cursor = sampler.pulse.drain(cursor, detector.update)
+            bpm = detector.bpm()
+            if bpm is not None:
+                print("VALID BPM:", bpm, "-> gemmer til upload")
+                record_event("pulse", bpm)
+                measuring = False
+                print("Valid puls gemt -> venter på lukning.")
+                while box_open_state is not False:
+                    await asyncio.sleep_ms(200)
                 break
+            await asyncio.sleep_ms(PULSE_DRAIN_MS)
+
+        measuring = False
+        print("Boks lukket -> stopper pulsmåling.")
 
-            # Hvis vi allerede sendte en valid måling -> vent på lukning
-            if sent_valid:
-                await asyncio.sleep_ms(200)
-                continue
-
-            v = adc_pulse.read()
-            now = time.ticks_ms()
-
-            # print kun engang imellem
-            if (now % 1000) < 20:
-                print("PULSE raw:", v)
-                
-            above = v > PEAK_THRESHOLD
-
-            # Rising edge + refractory
-            if above and not last_above:
-                if (last_beat_ms == 0) or (time.ticks_diff(now, last_beat_ms) >= REFRACTORY_MS):
-                    beats += 1
-                    beat_times.append(now)
-                    last_beat_ms = now
-
-                    # Når vi har nok beats -> beregn BPM
-                    if beats >= MIN_BEATS_FOR_VALID:
-                        ibis = []
-                        for i in range(1, len(beat_times)):
-                            ibis.append(time.ticks_diff(beat_times[i], beat_times[i - 1]))
-
-                        avg_ibi = sum(ibis) / len(ibis)
-                        bpm = int(60000 / avg_ibi)
-
-                        # Validitetscheck
-                        if MIN_VALID_BPM <= bpm <= MAX_VALID_BPM:
-                            print("VALID BPM:", bpm, "-> sender til API")
-                            post_json("/pulse-event", {"borger_id": BORGER_ID, "bpm": int(bpm)})
-                            sent_valid = True
-                            print("Valid puls sendt -> venter på lukning.")
-                        else:
-                            # Hvis urealistisk BPM -> reset og prøv igen
-                            print("Ugyldig BPM:", bpm, "-> reset måling")
-                            beats = 0
-                            beat_times = []
-                            last_beat_ms = 0
-
-            last_above = above
-            await asyncio.sleep_ms(20)
 
+# --------- TASK: UPLOAD ---------
+async def task_uploader():
+    """
+    Tømmer spoolen i batches; ved fejl ventes med eksponentiel backoff.
+    Holder pause mens pulsen måles.
+    """
+    backoff = Backoff()
+    while True:
+        if measuring:
+            await asyncio.sleep_ms(UPLOAD_IDLE_MS)
+            continue
+        start = spool.head
+        body, count = spool.batch(UPLOAD_BATCH)
+        if count == 0:
+            result = "empty"
+        else:
+            result = upload_result(spool, start, count, await send_batch(body))
+        if result == "empty":
+            await asyncio.sleep_ms(UPLOAD_IDLE_MS)
+        elif result == "retry":
+            delay = backoff.next_ms()
+            print("Upload fejlede -> prøver igen om", delay, "ms (", len(spool), "i spool )")
+            await asyncio.sleep_ms(delay)
+        else:
+            if result == "discarded":
+                print("Batch afvist af serveren -> kasseret")
+            backoff.reset()
+            await asyncio.sleep_ms(0)
 
 
 # --------- MAIN ---------
 async def main():
+    global sampler
     print("Starter main()...")
     connect_wifi()
     print("WiFi OK, henter token...")
-    get_token()
+    await get_token()
     print("Token OK, starter tasks...")
 
+    sampler = make_sampler()
+
     await asyncio.gather(
+        sampler.run(),
         task_box(),
         task_pulse(),
+        task_uploader(),
     )
 
 asyncio.run(main())
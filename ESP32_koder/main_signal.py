@@ -1,9 +1,12 @@
+import machine
 import network
+import struct
 import time
 import urequests as requests
-import json
 from machine import Pin
 
+from event_codec import MIMETYPE, encode
+
 # ----------------- WIFI -----------------
 WIFI_SSID = "8awifi"
 WIFI_PASS = "Gruppe8a!"
@@ -20,9 +23,12 @@ vibrator.off()
 
 VIBRATION_TIME = 5  # én vibration i 5 sek
 
-# ----------------- TIDSPUNKT -----------------
-TARGET_HOUR = 16
-TARGET_MINUTE = 37
+# ----------------- PÅMINDELSER -----------------
+# Tidspunkterne ligger på serveren (POST /borger/<id>/reminders); armbåndet
+# spørger GET /reminders/next og sover (deep sleep) indtil da.
+WAKE_EARLY_S = 30        # vågn lidt før, RTC-uret i deep sleep driver
+MAX_SLEEP_S = 3600       # spørg serveren mindst én gang i timen (ændrede påmindelser)
+RETRY_SLEEP_S = 300      # sov så længe hvis WiFi/server ikke svarer
 
 TOKEN = None
 
@@ -61,26 +67,23 @@ def get_token():
         return False
 
 
-def post_vibration_event():
+def post_vibration_event(borger_id=BORGER_ID):
     global TOKEN
     if TOKEN is None:
         print("Ingen token - prøver at hente igen...")
         if not get_token():
             return False
 
-    url = f"{API_BASE}/vibration-event"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Bearer " + TOKEN
-    }
-    payload = {"borger_id": BORGER_ID, "signaled": True}
+    # Binært event (se event_codec.py), tidspunkt 0 = serverens tid
+    url = f"{API_BASE}/events/batch"
+    payload = encode([("vibration", borger_id, True, 0)])
 
     try:
-        r = requests.post(url, headers=headers, data=json.dumps(payload))
+        r = requests.post(url, headers={"Content-Type": MIMETYPE, "Authorization": "Bearer " + TOKEN},
+                          data=payload)
         status = r.status_code
-        text = r.text
         r.close()
-        print("vibration-event:", status, text)
+        print("vibration-event:", status)
 
         if status in (401, 403):
             TOKEN = None
@@ -88,13 +91,10 @@ def post_vibration_event():
             if get_token():
                 r2 = requests.post(
                     url,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": "Bearer " + TOKEN
-                        },
-                    data=json.dumps(payload)
+                    headers={"Content-Type": MIMETYPE, "Authorization": "Bearer " + TOKEN},
+                    data=payload
                 )
-                print("vibration-event retry:", r2.status_code, r2.text)
+                print("vibration-event retry:", r2.status_code)
                 r2.close()
         return True
     except Exception as e:
@@ -110,37 +110,79 @@ def vibrate_once():
     print("Vibration STOP")
 
 
-def should_vibrate_now():
-    now = time.localtime()
-    # now[3]=hour, now[4]=minute
-    return (now[3] == TARGET_HOUR and now[4] == TARGET_MINUTE)
+def get_next_reminder(after=None):
+    """GET /reminders/next -> dict (in_seconds, epoch, ...) eller None ved fejl."""
+    global TOKEN
+    if TOKEN is None and not get_token():
+        return None
+    url = f"{API_BASE}/reminders/next"
+    if after:
+        url += "?after=" + str(after)
+    for _ in range(2):
+        try:
+            r = requests.get(url, headers={"Authorization": "Bearer " + TOKEN})
+            status = r.status_code
+            data = r.json() if status == 200 else None
+            r.close()
+        except Exception as e:
+            print("GET FEJL:", e)
+            return None
+        if status in (401, 403) and get_token():
+            continue  # token udløbet/tilbagekaldt -> prøv igen med nyt
+        if data is None:
+            print("reminders/next:", status)
+        return data
+    return None
+
+
+# Seneste påmindelse der er vibreret for (unix-tid). Ligger i RTC-hukommelsen,
+# som overlever deep sleep, så en genstart lige efter ikke vibrerer to gange.
+def load_last_fired():
+    mem = machine.RTC().memory()
+    return struct.unpack("<I", mem)[0] if len(mem) == 4 else 0
+
+
+def save_last_fired(epoch):
+    machine.RTC().memory(struct.pack("<I", epoch))
+
+
+def deep_sleep(seconds):
+    seconds = max(1, min(seconds, MAX_SLEEP_S))
+    print("Deep sleep i", seconds, "s")
+    vibrator.off()
+    machine.deepsleep(seconds * 1000)
+
+
+def run_once():
+    """
+    Ét opvågningsforløb: vibrér hvis en påmindelse er (næsten) nu, og sov
+    derefter til lige før den næste. Returnerer antal sekunder der skal soves.
+    """
+    if not wifi_connect():
+        return RETRY_SLEEP_S
+    get_token()
+
+    last_fired = load_last_fired()
+    nxt = get_next_reminder(last_fired)
+    if nxt is None:
+        return RETRY_SLEEP_S
+
+    while nxt["in_seconds"] is not None and nxt["in_seconds"] <= WAKE_EARLY_S:
+        time.sleep(nxt["in_seconds"])
+        vibrate_once()
+        post_vibration_event(nxt["borger_id"])
+        save_last_fired(nxt["epoch"])
+        nxt = get_next_reminder(nxt["epoch"])
+        if nxt is None:
+            return RETRY_SLEEP_S
+
+    if nxt["in_seconds"] is None:
+        print("Ingen påmindelser")
+        return MAX_SLEEP_S
+    print("Næste påmindelse:", nxt["fire_at"], "om", nxt["in_seconds"], "s")
+    return nxt["in_seconds"] - WAKE_EARLY_S
 
 
 # ----------------- START -----------------
-print("Armbånd-ESP startet")
-
-wifi_connect()
-get_token()
-
-# Print tiden én gang ved opstart (til test/indstilling)
-print("ESP starttid (localtime):", time.localtime())
-print("Tester vibration kl:", TARGET_HOUR, ":", TARGET_MINUTE)
-
-last_minute_run = None
-
-while True:
-
-    if should_vibrate_now():
-        current_minute = time.localtime()[4]
-        
-        # Kør kun én gang pr. minut
-        if last_minute_run != current_minute:
-            last_minute_run = current_minute
-
-            vibrate_once()
-            post_vibration_event()
-
-            # undgå at trigge flere gange samme minut
-            time.sleep(60)
-
-    time.sleep(2)
+print("Armbånd-ESP startet (reset:", machine.reset_cause(), ")")
+deep_sleep(run_once())
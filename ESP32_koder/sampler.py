@@ -0,0 +1,125 @@
+# sampler.py
+"""
+Fælles ADC-sampling til medicinboksen, så ingen task blokerer event-loopet.
+
+Før kaldte task_box read_adc_avg(), som sov med time.sleep_ms i 50-60 ms
+pr. kald – imens stod hele uasyncio-loopet stille, og task_pulse tabte slag.
+Nu læser én task (Sampler.run) begge ADC'er med fast periode og yielder
+mellem hver måling:
+
+- pulsmålinger lægges med tidspunkt i en ringbuffer (SampleRing), som
+  task_pulse tømmer i sit eget tempo via drain()
+- LDR-målinger midles over `samples` målinger (Average), og task_box læser
+  seneste middelværdi i stedet for selv at sample
+
+Alle buffere er allokeret på forhånd. poll() er ren Python, så logikken
+kan testes under CPython; run() kræver uasyncio.
+"""
+from array import array
+
+try:
+    from time import ticks_add, ticks_diff, ticks_ms
+except ImportError:
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_add(a, b):
+        return a + b
+
+    def ticks_diff(a, b):
+        return a - b
+
+
+class SampleRing:
+    """Ringbuffer af (værdi, tidspunkt) med en fortløbende skrivetæller."""
+
+    def __init__(self, size=64):
+        self.size = size
+        self.values = array("i", [0] * size)
+        self.times = array("i", [0] * size)
+        self.written = 0
+        self.overruns = 0
+
+    def put(self, v, t_ms):
+        i = self.written % self.size
+        self.values[i] = v
+        self.times[i] = t_ms
+        self.written += 1
+
+    def drain(self, cursor, fn):
+        """
+        Kalder fn(værdi, tidspunkt) for hver måling skrevet efter cursor og
+        returnerer den nye cursor. Er læseren mere end `size` bagud, springes
+        de overskrevne målinger over (tælles i overruns).
+        """
+        written = self.written
+        if written - cursor > self.size:
+            self.overruns += written - cursor - self.size
+            cursor = written - self.size
+        while cursor < written:
+            i = cursor % self.size
+            fn(self.values[i], self.times[i])
+            cursor += 1
+        return cursor
+
+
+class Average:
+    """Blok-middel over `samples` målinger; `seq` tælles op for hver ny værdi."""
+
+    def __init__(self, samples=10):
+        self.samples = samples
+        self.value = None
+        self.seq = 0
+        self._sum = 0
+        self._n = 0
+
+    def add(self, v):
+        self._sum += v
+        self._n += 1
+        if self._n >= self.samples:
+            self.value = self._sum // self._n
+            self.seq += 1
+            self._sum = 0
+            self._n = 0
+
+
+class Sampler:
+    """
+    pulse_read/ldr_read er funktioner der returnerer én ADC-måling
+    (typisk ADC.read). Begge læses hver period_ms.
+    """
+
+    def __init__(self, pulse_read, ldr_read, period_ms=5, ring_size=64, ldr_samples=10):
+        self.pulse_read = pulse_read
+        self.ldr_read = ldr_read
+        self.period_ms = period_ms
+        self.pulse = SampleRing(ring_size)
+        self.ldr = Average(ldr_samples)
+        self.late = 0
+
+    def poll(self, t_ms):
+        """Én sampling-runde."""
+        self.pulse.put(self.pulse_read(), t_ms)
+        self.ldr.add(self.ldr_read())
+
+    async def run(self):
+        """
+        Sampler med fast takt: næste måling planlægges ud fra den forrige
+        deadline, ikke fra hvornår loopet kom tilbage, så raten holder i snit.
+        """
+        import uasyncio as asyncio
+
+        deadline = ticks_ms()
+        while True:
+            now = ticks_ms()
+            self.poll(now)
+            deadline = ticks_add(deadline, self.period_ms)
+            wait = ticks_diff(deadline, ticks_ms())
+            if wait < 0:
+                # For langt bagud (fx under et HTTP-kald) -> start takten forfra
+                self.late += 1
+                deadline = now
+                wait = 0
+            await asyncio.sleep_ms(wait)
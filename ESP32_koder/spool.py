@@ -0,0 +1,175 @@
+# spool.py
+"""
+Event-spool på flash til medicinboksen: events gemmes her i stedet for at
+blive sendt direkte, og en uploader-task tømmer spoolen i batches.
+
+Filen er en ringbuffer af faste records i event_codec-format (11 bytes),
+så en batch kan sendes direkte til /events/batch uden at blive kodet om.
+Når spoolen er fuld, overskrives de ældste events (tælles i `dropped`).
+
+Ren Python (struct/os/random), så modulet kører både på MicroPython og
+under CPython til tests og benchmarks.
+"""
+import os
+import random
+import struct
+
+from event_codec import HEADER as BODY_HEADER
+from event_codec import MAGIC, RECORD, RECORD_SIZE, TYPE_CODES, TYPE_NAMES, VERSION
+
+# magic, version, kapacitet, head (ældste), tail (næste skrivning), dropped.
+# head/tail er fortløbende tællere; positionen i filen er tæller % kapacitet.
+FILE_HEADER = "<2sBxHIII"
+FILE_HEADER_SIZE = struct.calcsize(FILE_HEADER)
+FILE_MAGIC = b"SP"
+
+
+class Spool:
+    def __init__(self, path, capacity=512):
+        self.path = path
+        try:
+            os.stat(path)
+            exists = True
+        except OSError:
+            exists = False
+
+        if exists:
+            self._f = open(path, "r+b")
+            header = self._f.read(FILE_HEADER_SIZE)
+            if len(header) == FILE_HEADER_SIZE:
+                magic, version, cap, head, tail, dropped = struct.unpack(FILE_HEADER, header)
+                if magic == FILE_MAGIC and version == VERSION and 0 <= tail - head <= cap:
+                    self.capacity = cap
+                    self.head = head
+                    self.tail = tail
+                    self.dropped = dropped
+                    return
+            self._f.close()
+
+        # Ny (eller ødelagt) fil: start forfra
+        self._f = open(path, "w+b")
+        self.capacity = capacity
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        self._f.write(bytes(FILE_HEADER_SIZE + capacity * RECORD_SIZE))
+        self._write_header()
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def _write_header(self):
+        self._f.seek(0)
+        self._f.write(struct.pack(FILE_HEADER, FILE_MAGIC, VERSION, self.capacity,
+                                  self.head, self.tail, self.dropped))
+        self._f.flush()
+
+    def _offset(self, n):
+        return FILE_HEADER_SIZE + (n % self.capacity) * RECORD_SIZE
+
+    def push(self, kind, borger_id, value, ts=0):
+        """Gemmer ét event. Recorden skrives før headeren, så et strømsvigt højst taber det."""
+        if len(self) >= self.capacity:
+            self.head += 1
+            self.dropped += 1
+        self._f.seek(self._offset(self.tail))
+        self._f.write(struct.pack(RECORD, TYPE_CODES[kind], borger_id, int(value), ts))
+        self.tail += 1
+        self._write_header()
+
+    def _read_raw(self, count):
+        """De ældste count records som rå bytes (højst to læsninger ved wrap)."""
+        start = self.head % self.capacity
+        first = min(count, self.capacity - start)
+        self._f.seek(self._offset(self.head))
+        data = self._f.read(first * RECORD_SIZE)
+        if count > first:
+            self._f.seek(FILE_HEADER_SIZE)
+            data += self._f.read((count - first) * RECORD_SIZE)
+        return data
+
+    def batch(self, max_records):
+        """
+        Body til /events/batch med op til max_records af de ældste events,
+        og antallet. Events fjernes først med commit(), når upload er lykkedes.
+        """
+        count = min(len(self), max_records)
+        return struct.pack(BODY_HEADER, MAGIC, VERSION, count) + self._read_raw(count), count
+
+    def peek(self, max_records):
+        """De ældste events som (type, borger_id, værdi, tidspunkt)."""
+        count = min(len(self), max_records)
+        data = self._read_raw(count)
+        records = []
+        for i in range(count):
+            code, borger_id, value, ts = struct.unpack_from(RECORD, data, i * RECORD_SIZE)
+            records.append((TYPE_NAMES[code], borger_id, value, ts))
+        return records
+
+    def commit(self, count, start=None):
+        """
+        Fjerner de count ældste events (efter vellykket upload). start er head
+        da batchen blev læst; er der overskrevet events imens (fuld spool under
+        en upload), fjernes kun dem der stadig er tilbage af batchen.
+        """
+        if start is None:
+            start = self.head
+        end = min(start + count, self.tail)
+        if end > self.head:
+            self.head = end
+            self._write_header()
+
+    def close(self):
+        self._f.close()
+
+
+class Backoff:
+    """Eksponentiel backoff med jitter: base, 2*base, 4*base ... højst max_ms."""
+
+    def __init__(self, base_ms=1000, max_ms=300000):
+        self.base_ms = base_ms
+        self.max_ms = max_ms
+        self.failures = 0
+
+    def reset(self):
+        self.failures = 0
+
+    def next_ms(self):
+        """Ventetid efter endnu en fejl; jitter spreder enheder efter et fælles udfald."""
+        delay = min(self.base_ms << min(self.failures, 16), self.max_ms)
+        self.failures += 1
+        return delay // 2 + random.getrandbits(24) % (delay // 2 + 1)
+
+
+# Svar fra /events/batch der betyder at batchen er behandlet
+# (207 = nogle events afvist, fx ukendt borger – de sendes ikke igen)
+DONE = (201, 207)
+# Svar hvor batchen aldrig bliver gyldig – den kasseres i stedet for at blokere spoolen
+PERMANENT = (400, 413, 422)
+
+
+def upload_result(spool, start, count, status):
+    """
+    Afslutter en upload af count events læst fra head = start, ud fra
+    HTTP-status (None ved netværksfejl). Returnerer "sent", "discarded" eller "retry".
+    """
+    if status in DONE:
+        spool.commit(count, start)
+        return "sent"
+    if status in PERMANENT:
+        spool.commit(count, start)
+        return "discarded"
+    return "retry"
+
+
+def upload_once(spool, send, max_records=50):
+    """
+    Sender én batch med send(body) -> HTTP-status (eller None ved netværksfejl).
+    Returnerer "empty", "sent", "discarded" eller "retry".
+    På enheden sendes asynkront (task_uploader) med batch() og upload_result().
+    """
+    start = spool.head
+    body, count = spool.batch(max_records)
+    if count == 0:
+        return "empty"
+    return upload_result(spool, start, count, send(body))
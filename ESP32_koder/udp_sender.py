@@ -0,0 +1,100 @@
+# udp_sender.py
+"""
+Afsender af signerede UDP-datagrammer til serverens udp_listener.py.
+
+Til telemetri hvor et tabt datagram er i orden (fx rå pulsmålinger).
+Kræver event_codec.py på enheden. Virker på MicroPython og CPython.
+
+Brug:
+    sender = UdpSender.connect(API_BASE, DEVICE_USER_ID, token)
+    sender.send([("pulse", BORGER_ID, 72, 0)])
+"""
+import socket
+import struct
+import time
+
+try:
+    import hashlib
+except ImportError:
+    import uhashlib as hashlib
+
+try:
+    from binascii import unhexlify
+except ImportError:
+    from ubinascii import unhexlify
+
+from event_codec import encode
+
+HEADER = "<HII"
+TAG_SIZE = 16
+
+# Ny session/nøgle efter så mange sekunder, så en genstartet server opdages
+KEY_REFRESH_S = 3600
+
+
+def hmac_sha256(key, message):
+    """HMAC-SHA256 (RFC 2104) – MicroPython har ikke hmac-modulet."""
+    if len(key) > 64:
+        key = hashlib.sha256(key).digest()
+    key = key + bytes(64 - len(key))
+    inner = hashlib.sha256(bytes(b ^ 0x36 for b in key))
+    inner.update(message)
+    outer = hashlib.sha256(bytes(b ^ 0x5C for b in key))
+    outer.update(inner.digest())
+    return outer.digest()
+
+
+def fetch_key(api_base, device_id, token):
+    """POST /udp-key/<id> -> dict med session, key (hex) og port."""
+    import urequests as requests
+
+    r = requests.post(
+        api_base + "/udp-key/" + str(device_id),
+        headers={"Authorization": "Bearer " + token},
+    )
+    try:
+        if r.status_code != 200:
+            raise Exception("udp-key fejl: " + str(r.status_code))
+        return r.json()
+    finally:
+        r.close()
+
+
+class UdpSender:
+    def __init__(self, host, port, device_id, session, key):
+        self.addr = socket.getaddrinfo(host, port)[0][-1]
+        self.device_id = device_id
+        self.session = session
+        self.key = key
+        self.seq = 0
+        self.created = time.time()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    @classmethod
+    def connect(cls, api_base, device_id, token):
+        """Henter session og nøgle og peger på API-serverens UDP-port."""
+        info = fetch_key(api_base, device_id, token)
+        host = api_base.split("://", 1)[-1].split("/", 1)[0].split(":", 1)[0]
+        return cls(host, info["port"], device_id, info["session"], unhexlify(info["key"]))
+
+    def needs_refresh(self):
+        """True når sessionen bør fornyes med connect()."""
+        return time.time() - self.created > KEY_REFRESH_S or self.seq >= 0xFFFFFFFF
+
+    def pack(self, records):
+        """Næste datagram for records (type, borger_id, værdi, tidspunkt)."""
+        message = struct.pack(HEADER, self.device_id, self.session, self.seq) + encode(records)
+        self.seq += 1
+        return message + hmac_sha256(self.key, message)[:TAG_SIZE]
+
+    def send(self, records):
+        """Sender uden at vente på svar; fejl ignoreres (telemetri må gå tabt)."""
+        try:
+            self.sock.sendto(self.pack(records), self.addr)
+            return True
+        except OSError as e:
+            print("UDP-fejl:", e)
+            return False
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,286 @@
+# adherence.py
+"""
+Medicin-adherence: blev boksen åbnet inden for X minutter efter en påmindelse?
+
+match_reminders() parrer påmindelser (vibration_events med signaled) med
+boks-åbninger (box_events med box_open) for én borger i ét gennemløb over de
+to tidssorterede strømme. AdherenceEngine holder resultaterne i hukommelsen
+og behandler kun nye events ved hver refresh(); kommer et event ind med et
+tidspunkt før det allerede behandlede (fx batch-upload efter WiFi-udfald),
+genberegnes den borger fra bunden.
+
+Id'er tildeles før commit, så en transaktion der committer sent kan gøre en
+række med lavere id synlig efter at max(id) er passeret. Vandmærket rykkes
+derfor først til max(id) fra en tidligere refresh, når alle transaktioner
+der var i gang dengang er afsluttet (pg_snapshot_xmin nu er større end den
+xid refreshen fik). Indtil da scannes intervallet over vandmærket igen, og rækker der
+allerede er behandlet springes over på deres id.
+"""
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+TAKEN = "taken"
+MISSED = "missed"
+PENDING = "pending"
+
+
+def match_reminders(reminders, openings, window: timedelta, now: datetime):
+    """
+    reminders: [(id, tidspunkt)] og openings: [tidspunkt], begge sorteret stigende.
+    En påmindelse dækkes af den første åbning efter den, hvis åbningen sker
+    inden for window og før næste påmindelse. Returnerer (færdige, afventende):
+    færdige er dicts, afventende er påmindelser hvis vindue ikke er udløbet endnu.
+    """
+    done = []
+    pending = []
+    j = 0
+    for i, (reminder_id, reminded_at) in enumerate(reminders):
+        while j < len(openings) and openings[j] < reminded_at:
+            j += 1
+
+        deadline = reminded_at + window
+        if i + 1 < len(reminders):
+            deadline = min(deadline, reminders[i + 1][1])
+
+        if j < len(openings) and openings[j] <= deadline:
+            opened_at = openings[j]
+            done.append({
+                "reminder_id": reminder_id,
+                "reminded_at": reminded_at,
+                "opened_at": opened_at,
+                "delay_seconds": int((opened_at - reminded_at).total_seconds()),
+                "status": TAKEN,
+            })
+            j += 1
+        elif deadline <= now or i + 1 < len(reminders):
+            done.append({
+                "reminder_id": reminder_id,
+                "reminded_at": reminded_at,
+                "opened_at": None,
+                "delay_seconds": None,
+                "status": MISSED,
+            })
+        else:
+            pending.append((reminder_id, reminded_at))
+    return done, pending
+
+
+class _BorgerState:
+    __slots__ = ("results", "pending", "horizon")
+
+    def __init__(self):
+        self.results = {}      # reminder_id -> resultat
+        self.pending = []      # [(id, tidspunkt)] uden afgørelse endnu
+        self.horizon = None    # seneste behandlede event-tidspunkt
+
+
+class AdherenceEngine:
+    """Inkrementel adherence-cache for alle borgere."""
+
+    def __init__(self, window: timedelta, retention: timedelta = timedelta(days=90),
+                 max_lag: timedelta = timedelta(minutes=10)):
+        self.window = window
+        self.retention = retention
+        # Vandmærket rykkes senest efter max_lag, også hvis en transaktion hænger åben
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+        self._states = {}
+        self._reset_watermarks()
+        self.dirty = True
+
+    def _reset_watermarks(self):
+        self._box_watermark = 0
+        self._vibration_watermark = 0
+        self._marks = deque()      # (refreshens xid, vibration max(id), box max(id), tidspunkt)
+        self._box_seen = set()     # behandlede id'er over vandmærket
+        self._vibration_seen = set()
+
+    def reset(self):
+        with self._lock:
+            self._states = {}
+            self._reset_watermarks()
+            self.dirty = True
+
+    # ---------- OPDATERING ----------
+    def refresh(self, conn, now: datetime | None = None):
+        """Henter events nyere end sidste refresh og opdaterer resultaterne."""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            self.dirty = False
+            oldest = now - self.retention
+            with conn:
+                with conn.cursor() as cur:
+                    # Øvre grænse først, så rækker der indsættes undervejs tages næste gang.
+                    # Rækker med id <= max() der ikke er synlige endnu, hører til
+                    # transaktioner der fik deres xid før denne refresh fik sin.
+                    cur.execute(
+                        """
+                        SELECT (SELECT COALESCE(max(id), 0) FROM vibration_events),
+                               (SELECT COALESCE(max(id), 0) FROM box_events),
+                               pg_snapshot_xmin(pg_current_snapshot())::text::bigint,
+                               pg_current_xact_id()::text::bigint;
+                        """
+                    )
+                    vib_max, box_max, xmin, xid = cur.fetchone()
+                    new_reminders = self._scan(
+                        cur, "vibration_events", "signaled",
+                        self._vibration_watermark, vib_max, self._vibration_seen, oldest,
+                    )
+                    new_openings = self._scan(
+                        cur, "box_events", "box_open",
+                        self._box_watermark, box_max, self._box_seen, oldest,
+                    )
+
+                    reminders_by_borger = {}
+                    for event_id, borger_id, created_at in new_reminders:
+                        reminders_by_borger.setdefault(borger_id, []).append((event_id, created_at))
+                    openings_by_borger = {}
+                    for _, borger_id, created_at in new_openings:
+                        openings_by_borger.setdefault(borger_id, []).append(created_at)
+
+                    for borger_id in set(reminders_by_borger) | set(openings_by_borger) | set(self._states):
+                        reminders = reminders_by_borger.get(borger_id, [])
+                        openings = openings_by_borger.get(borger_id, [])
+                        state = self._states.get(borger_id)
+                        earliest = min([t for _, t in reminders[:1]] + openings[:1], default=None)
+                        if state is not None and state.horizon is not None and \
+                                earliest is not None and earliest < state.horizon:
+                            # Event ude af rækkefølge -> genberegn borgeren helt
+                            state = self._recompute(cur, borger_id, oldest, now)
+                        else:
+                            state = self._advance(state, reminders, openings, now)
+                        self._prune(state, oldest)
+                        self._states[borger_id] = state
+
+            self._advance_watermarks(vib_max, box_max, xmin, xid, now)
+
+    def _scan(self, cur, table, flag, watermark, upper, seen, oldest):
+        """
+        Rækker over vandmærket (til og med upper) hvor flag er sand og som ikke
+        er behandlet før: [(id, borger_id, created_at)] sorteret pr. borger og tid.
+        """
+        cur.execute(
+            f"""
+            SELECT id, borger_id, created_at FROM {table}
+            WHERE id > %s AND id <= %s AND {flag} AND created_at >= %s
+            ORDER BY borger_id, created_at, id;
+            """,
+            (watermark, upper, oldest),
+        )
+        rows = [row for row in cur.fetchall() if row[0] not in seen]
+        seen.update(row[0] for row in rows)
+        return rows
+
+    def _advance_watermarks(self, vib_max, box_max, xmin, xid, now):
+        """
+        Rykker vandmærket til max(id) fra den seneste refresh hvor alle da
+        igangværende transaktioner nu er afsluttet (eller som er ældre end
+        max_lag); rækker under det kan ikke længere dukke op.
+        """
+        self._marks.append((xid, vib_max, box_max, now))
+        safe = None
+        # xmin > xid: alle transaktioner med lavere xid er afsluttet
+        while self._marks and (self._marks[0][0] < xmin or now - self._marks[0][3] >= self.max_lag):
+            safe = self._marks.popleft()
+        if safe is None:
+            return
+        _, self._vibration_watermark, self._box_watermark, _ = safe
+        self._vibration_seen = {i for i in self._vibration_seen if i > self._vibration_watermark}
+        self._box_seen = {i for i in self._box_seen if i > self._box_watermark}
+
+    def _advance(self, state, reminders, openings, now):
+        """Fletter nye påmindelser/åbninger ind efter borgerens horisont."""
+        if state is None:
+            state = _BorgerState()
+        done, pending = match_reminders(
+            state.pending + reminders, openings, self.window, now
+        )
+        times = [t for _, t in reminders[-1:]] + openings[-1:]
+        for result in done:
+            state.results[result["reminder_id"]] = result
+            if result["status"] == MISSED:
+                # En senere åbning inden for vinduet skal udløse genberegning
+                times.append(min(result["reminded_at"] + self.window, now))
+        state.pending = pending
+        if state.horizon is not None:
+            times.append(state.horizon)
+        if times:
+            state.horizon = max(times)
+        return state
+
+    def _recompute(self, cur, borger_id, oldest, now):
+        cur.execute(
+            """
+            SELECT id, created_at FROM vibration_events
+            WHERE borger_id = %s AND signaled AND created_at >= %s
+            ORDER BY created_at, id;
+            """,
+            (borger_id, oldest),
+        )
+        reminders = cur.fetchall()
+        cur.execute(
+            """
+            SELECT created_at FROM box_events
+            WHERE borger_id = %s AND box_open AND created_at >= %s
+            ORDER BY created_at, id;
+            """,
+            (borger_id, oldest),
+        )
+        openings = [r[0] for r in cur.fetchall()]
+        return self._advance(None, reminders, openings, now)
+
+    def _prune(self, state, oldest):
+        for reminder_id in [k for k, r in state.results.items() if r["reminded_at"] < oldest]:
+            del state.results[reminder_id]
+
+    # ---------- LÆSNING ----------
+    def result_for(self, borger_id: int, reminder_id: int) -> dict | None:
+        """Resultat for én påmindelse; None hvis den stadig afventer eller er ukendt."""
+        state = self._states.get(borger_id)
+        return state.results.get(reminder_id) if state else None
+
+    def forget(self, borger_id: int):
+        """Glemmer en (slettet) borger."""
+        with self._lock:
+            self._states.pop(borger_id, None)
+
+    def report(self, borger_id: int, since: datetime | None = None,
+               now: datetime | None = None) -> dict:
+        """
+        Resultater og opsummering for én borger (nyeste først).
+        En afventende påmindelse hvis vindue er udløbet siden sidste refresh
+        vises som missed.
+        """
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            state = self._states.get(borger_id) or _BorgerState()
+            results = [r for r in state.results.values()
+                       if since is None or r["reminded_at"] >= since]
+            for reminder_id, reminded_at in state.pending:
+                if since is not None and reminded_at < since:
+                    continue
+                results.append({
+                    "reminder_id": reminder_id,
+                    "reminded_at": reminded_at,
+                    "opened_at": None,
+                    "delay_seconds": None,
+                    "status": MISSED if reminded_at + self.window <= now else PENDING,
+                })
+        results.sort(key=lambda r: r["reminded_at"], reverse=True)
+        delays = sorted(r["delay_seconds"] for r in results if r["status"] == TAKEN)
+        pending = sum(1 for r in results if r["status"] == PENDING)
+        decided = len(results) - pending
+        return {
+            "reminders": len(results),
+            "taken": len(delays),
+            "missed": decided - len(delays),
+            "pending": pending,
+            "adherence_rate": round(len(delays) / decided, 3) if decided else None,
+            "median_delay_seconds": delays[len(delays) // 2] if delays else None,
+            "results": results,
+        }
+
+    def borger_ids(self) -> list:
+        with self._lock:
+            return sorted(self._states)
@@ -1,33 +1,352 @@
 # app.py
-from flask import render_template
-from apiflask import APIFlask, Schema, HTTPTokenAuth, abort
-from apiflask.fields import Boolean, Integer, String
+from flask import g, make_response, render_template, request
+from flask_socketio import SocketIO
+from apiflask import APIFlask, HTTPTokenAuth, abort
+from apiflask import Schema as BaseSchema
+from apiflask.fields import Boolean, DateTime, Dict, Integer, List, String
+from apiflask.validators import Length, Range, Regexp
 from authlib.jose import jwt, JoseError
+import atexit
+import click
+import base64
+import hashlib
+import json
+import os
 import secrets
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import psycopg2
 import psycopg2.extras
 from psycopg2.errors import ForeignKeyViolation
+from marshmallow import ValidationError
 import re
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+import event_codec
+import metrics
+import pulse_rollups
+import schema
+import tracing
+from adherence import AdherenceEngine
+from borger_directory import NOTIFY_CHANNEL, BorgerDirectory, BorgerListener
+from db_pool import ConnectionPool, PoolTimeout, add_query_observer, remove_query_observer
+from ingest_queue import QueueFull, WriteBehindQueue
+from recent_events import RecentEvents
+from slow_query import SlowQueryLog, file_logger
+from reminders import ALL_DAYS, ReminderScheduler, weekdays_mask
+from token_cache import TokenCache
+from udp_listener import UdpListener, derive_key
 
 # ---------- SETUP ----------
 app = APIFlask(__name__)
 auth = HTTPTokenAuth(scheme="Bearer")
-app.config["SECRET_KEY"] = secrets.token_bytes(32)
+# Fælles nøgle når flere processer skal godkende hinandens tokens (fx async_server.py)
+app.config["SECRET_KEY"] = (
+    os.environ["IOMT_SECRET_KEY"].encode() if "IOMT_SECRET_KEY" in os.environ
+    else secrets.token_bytes(32)
+)
+socketio = SocketIO(app)
+
+# Tokens: levetid i sekunder (None = udløber ikke) og cache af verificerede tokens
+app.config["TOKEN_LIFETIME"] = None
+app.config["TOKEN_CACHE_SIZE"] = 4096
+app.config["TOKEN_CACHE_TTL"] = 300.0
+
+# Connection-pool (se db_pool.py)
+app.config["DB_POOL_MIN"] = 1
+app.config["DB_POOL_MAX"] = 10
+app.config["DB_POOL_TIMEOUT"] = 5.0            # sekunder man venter på en ledig forbindelse
+app.config["DB_POOL_HEALTH_CHECK"] = 30.0      # SELECT 1 hvis forbindelsen har ligget længere
+app.config["ASYNC_DB_POOL_MAX"] = 20           # asyncpg-poolen i async_server.py
+
+# Borger-katalog: lyt på NOTIFY fra andre processer (se borger_directory.py)
+app.config["BORGER_LISTEN"] = False
+
+# Partitioner: hvor mange måneder frem de oprettes, og hvor tit der tjekkes (sekunder)
+app.config["PARTITION_MONTHS_AHEAD"] = 3
+app.config["PARTITION_CHECK_INTERVAL"] = 12 * 3600
+
+# Puls-rollups (time/døgn) opdateres ved hver insert; False = kun via rebuild-pulse-rollups
+app.config["PULSE_ROLLUPS"] = True
+
+# Adherence: boksen skal åbnes inden for så mange minutter efter en påmindelse.
+# Resultaterne genberegnes når der er kommet nye events, dog mindst hvert ADHERENCE_MAX_AGE sekund
+# (events fra andre processer markerer ikke cachen)
+app.config["ADHERENCE_WINDOW_MINUTES"] = 30
+app.config["ADHERENCE_MAX_AGE"] = 60.0
+
+# Påmindelser (se reminders.py): klokkeslæt er lokal tid i TIMEZONE.
+# Et armbånd der vågner op til REMINDER_GRACE_SECONDS for sent får stadig den påmindelse
+# det skulle have vibreret for. Skemaet læses igen fra databasen hvert REMINDER_RELOAD_INTERVAL sekund
+# (ændringer fra andre processer)
+app.config["TIMEZONE"] = "Europe/Copenhagen"
+app.config["REMINDER_GRACE_SECONDS"] = 120
+app.config["REMINDER_RELOAD_INTERVAL"] = 300.0
+
+# Maks. antal events i ét kald til /events/batch
+app.config["BATCH_MAX_EVENTS"] = 1000
+
+# Dashboard: antal rækker pr. tabel, og om de vises fra ringbufferen i hukommelsen
+app.config["DASHBOARD_ROWS"] = 10
+app.config["DASHBOARD_CACHE"] = True
+
+# Eksport: antal rækker pr. netværks-roundtrip fra server-side cursor
+app.config["EXPORT_ITERSIZE"] = 2000
+
+# Write-behind: ingest-routes lægger events i kø og svarer 202 med det samme
+app.config["WRITE_BEHIND"] = False
+app.config["WRITE_BEHIND_MAXSIZE"] = 10000        # events i køen før backpressure (503)
+app.config["WRITE_BEHIND_BATCH_SIZE"] = 500       # flush når batchen er så stor ...
+app.config["WRITE_BEHIND_FLUSH_INTERVAL"] = 0.2   # ... eller når der er gået så mange sekunder
+
+# UDP-telemetri (se udp_listener.py): signerede datagrammer via write-behind-køen
+app.config["UDP_LISTEN"] = False
+app.config["UDP_HOST"] = "0.0.0.0"
+app.config["UDP_PORT"] = 5005
+
+# Metrics på /metrics (se metrics.py): requests, svartider, DB-tid pr. statement, auth, ingest
+app.config["METRICS"] = True
+
+# Slow-query-log (se slow_query.py): statements over SLOW_QUERY_MS logges med parametre og
+# kaldested i en roterende fil. None = slået fra (fx 200.0 i drift). SLOW_QUERY_EXPLAIN_SAMPLE > 0
+# (fx 0.1 under fejlsøgning) kører også EXPLAIN (ANALYZE, BUFFERS) for den andel af dem.
+# Ændres indstillingerne efter import, kaldes setup_slow_query_log() igen
+app.config["SLOW_QUERY_MS"] = None
+app.config["SLOW_QUERY_EXPLAIN_SAMPLE"] = 0.0
+app.config["SLOW_QUERY_LOG"] = os.path.join(app.instance_path, "slow_queries.log")
+app.config["SLOW_QUERY_LOG_MAX_BYTES"] = 5 * 1024 * 1024
+app.config["SLOW_QUERY_LOG_BACKUPS"] = 3
+
+# Tracing (se tracing.py): andel af requests der får spans for auth, validering, DB og
+# rendering, skrevet som JSON-lines til TRACE_FILE. 0 = slået fra
+app.config["TRACE_SAMPLE_RATE"] = 0.0
+app.config["TRACE_FILE"] = os.path.join(app.root_path, "traces.jsonl")
+app.config["TRACE_FILE_MAX_BYTES"] = 20 * 1024 * 1024
+app.config["TRACE_FILE_BACKUPS"] = 3
+
+DB_SETTINGS = {
+    "host": "127.0.0.1",
+    "port": "5432",
+    "dbname": "iomt",
+    "user": "iomt_user",
+    "password": "1234",
+}
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool() -> ConnectionPool:
+    """
+    Returnerer den fælles connection-pool (oprettes ved første kald).
+    """
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(
+                    app.config["DB_POOL_MIN"],
+                    app.config["DB_POOL_MAX"],
+                    timeout=app.config["DB_POOL_TIMEOUT"],
+                    health_check_interval=app.config["DB_POOL_HEALTH_CHECK"],
+                    **DB_SETTINGS,
+                )
+    return _db_pool
 
 
+@tracing.traced("get_db_connection")
 def get_db_connection():
     """
-    Opretter forbindelse til PostgreSQL.
+    Låner en forbindelse til PostgreSQL fra poolen.
+    conn.close() afleverer den tilbage til poolen.
     """
-    conn = psycopg2.connect(
-        host="127.0.0.1",
-        port="5432",
-        dbname="iomt",
-        user="iomt_user",
-        password="1234",
+    return get_db_pool().getconn()
+
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(error):
+    """Alle forbindelser er optaget – bed klienten prøve igen."""
+    return {"message": "Databasen er optaget, prøv igen."}, 503, {"Retry-After": "1"}
+
+
+@app.errorhandler(QueueFull)
+def handle_queue_full(error):
+    """Write-behind-køen er fuld – backpressure til enhederne."""
+    return {"message": "Serveren er overbelastet, prøv igen."}, 503, {"Retry-After": "1"}
+
+
+# ---------- METRICS OG TRACING ----------
+def request_route() -> str:
+    # Route-mønsteret (fx /borger/<int:borger_id>), ikke stien, så antallet af serier er fast
+    return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.trace = tracing.start(f"{request.method} {request_route()}",
+                            app.config["TRACE_SAMPLE_RATE"], path=request.path)
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None and app.config["METRICS"]:
+        metrics.observe_request(request.method, request_route(), response.status_code,
+                                time.perf_counter() - started)
+    trace = g.get("trace")
+    if trace is not None:
+        trace.root.set(status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def finish_request_trace(error):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        if error is not None:
+            trace.root.set(error=type(error).__name__)
+        tracing.finish(trace, trace_exporter)
+
+
+@auth.error_processor
+def auth_error(error):
+    """Samme svar som APIFlask's standard; requests helt uden token tælles her."""
+    if not getattr(auth.get_auth(), "token", None):
+        metrics.AUTH_FAILURES.inc("missing")
+    return app.error_callback(error)
+
+
+def _pool_metrics():
+    if _db_pool is None:
+        return []
+    stats = _db_pool.stats()
+    return [
+        ("iomt_db_pool_in_use", "gauge", "Udlånte databaseforbindelser.", stats["in_use"]),
+        ("iomt_db_pool_idle", "gauge", "Ledige databaseforbindelser.", stats["idle"]),
+        ("iomt_db_pool_waits_total", "counter", "Udlån der måtte vente.", stats["waits"]),
+        ("iomt_db_pool_timeouts_total", "counter", "Udlån der gav op (503).", stats["timeouts"]),
+    ]
+
+
+def _token_cache_metrics():
+    stats = token_cache.stats()
+    return [
+        ("iomt_token_cache_hits_total", "counter", "Tokens fundet i cachen.", stats["hits"]),
+        ("iomt_token_cache_misses_total", "counter", "Tokens der skulle verificeres.", stats["misses"]),
+        ("iomt_token_cache_evictions_total", "counter", "Tokens skubbet ud af LRU'en.",
+         stats["evictions"]),
+        ("iomt_token_cache_size", "gauge", "Tokens i cachen.", stats["size"]),
+    ]
+
+
+def _ingest_queue_metrics():
+    if _ingest_queue is None:
+        return []
+    stats = _ingest_queue.stats()
+    return [
+        ("iomt_ingest_queue_depth", "gauge", "Events der venter i write-behind-køen.", stats["depth"]),
+        ("iomt_ingest_queue_capacity", "gauge", "Write-behind-køens størrelse.", stats["capacity"]),
+        ("iomt_ingest_queue_rejections_total", "counter", "Events afvist fordi køen var fuld (503).",
+         stats["backpressure_rejections"]),
+        ("iomt_ingest_queue_flushes_total", "counter", "Flushes til databasen.", stats["flushes"]),
+        ("iomt_ingest_queue_flushed_events_total", "counter", "Events skrevet af flusheren.",
+         stats["flushed_events"]),
+        ("iomt_ingest_queue_rejected_events_total", "counter",
+         "Events afvist ved flush (fx ukendt borger).", stats["rejected_events"]),
+        ("iomt_ingest_queue_dropped_events_total", "counter",
+         "Events droppet efter gentagne flush-fejl.", stats["dropped_events"]),
+        ("iomt_ingest_queue_flush_errors_total", "counter", "Flushes der fejlede.",
+         stats["flush_errors"]),
+        ("iomt_ingest_queue_flush_seconds_total", "counter", "Samlet tid brugt på flushes.",
+         stats["total_flush_seconds"]),
+        ("iomt_ingest_queue_flush_seconds_max", "gauge", "Længste flush.", stats["max_flush_seconds"]),
+    ]
+
+
+def _udp_metrics():
+    if _udp_listener is None:
+        return []
+    stats = _udp_listener.stats()
+    rejected = "UDP-datagrammer afvist pr. årsag."
+    return [
+        ("iomt_udp_datagrams_total", "counter", "Modtagne UDP-datagrammer.", stats["datagrams"]),
+        ("iomt_udp_accepted_events_total", "counter", "Events fra UDP sendt videre til køen.",
+         stats["accepted_events"]),
+        ("iomt_udp_dropped_events_total", "counter", "UDP-events tabt fordi køen var fuld.",
+         stats["dropped_events"]),
+    ] + [
+        ("iomt_udp_rejected_total", "counter", rejected, stats[reason], {"reason": reason})
+        for reason in ("malformed", "unknown_device", "bad_signature", "replayed", "stale_session")
+    ]
+
+
+if app.config["METRICS"]:
+    add_query_observer(metrics.observe_query)
+    for collector in (_pool_metrics, _token_cache_metrics, _ingest_queue_metrics, _udp_metrics):
+        metrics.registry.add_collector(collector)
+
+trace_exporter = tracing.JsonLinesExporter(
+    app.config["TRACE_FILE"], app.config["TRACE_FILE_MAX_BYTES"], app.config["TRACE_FILE_BACKUPS"]
+)
+
+
+class Schema(BaseSchema):
+    """APIFlask-schema hvor load() (validering af input) bliver et tracing-span."""
+
+    def load(self, data, **kwargs):
+        if tracing.current() is None:
+            return super().load(data, **kwargs)
+        with tracing.span("validate", schema=type(self).__name__):
+            return super().load(data, **kwargs)
+
+
+def _trace_query(cursor, query, params, seconds, error):
+    """Query-observer: ét span pr. execute() under en aktiv trace."""
+    if tracing.current() is None:
+        return
+    attrs = {"statement": metrics.statement_label(query)}
+    if error is not None:
+        attrs["error"] = type(error).__name__
+    tracing.record("execute", seconds, **attrs)
+
+
+# Før slow-query-loggen, så dens EXPLAIN-statements kommer efter det statement de forklarer
+add_query_observer(_trace_query)
+
+slow_query_log = None
+
+
+def setup_slow_query_log():
+    """(Gen)opretter slow-query-observeren ud fra app.config."""
+    global slow_query_log
+    if slow_query_log is not None:
+        remove_query_observer(slow_query_log)
+        slow_query_log = None
+    if app.config["SLOW_QUERY_MS"] is None:
+        return
+    os.makedirs(os.path.dirname(app.config["SLOW_QUERY_LOG"]), exist_ok=True)
+    slow_query_log = SlowQueryLog(
+        app.config["SLOW_QUERY_MS"],
+        file_logger(app.config["SLOW_QUERY_LOG"], app.config["SLOW_QUERY_LOG_MAX_BYTES"],
+                    app.config["SLOW_QUERY_LOG_BACKUPS"]),
+        explain_sample=app.config["SLOW_QUERY_EXPLAIN_SAMPLE"],
     )
-    return conn
+    add_query_observer(slow_query_log)
+
+
+setup_slow_query_log()
+
+
+@app.get("/metrics")
+@app.doc(hide=True)
+def prometheus_metrics():
+    """Metrics i Prometheus' tekstformat."""
+    response = make_response(metrics.registry.render())
+    response.mimetype = "text/plain"
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
 
 
 # ---------- REGEX (programmering: Regex) ----------
@@ -43,7 +362,10 @@ class User:
 
     def get_token(self) -> str:
         header = {"alg": "HS256"}
-        payload = {"id": self.id}
+        # iat bruges til at afvise tokens udstedt før en tilbagekaldelse
+        payload = {"id": self.id, "iat": time.time()}
+        if app.config["TOKEN_LIFETIME"] is not None:
+            payload["exp"] = int(time.time() + app.config["TOKEN_LIFETIME"])
         # jwt.encode returnerer bytes → dekoder til str
         return jwt.encode(header, payload, app.config["SECRET_KEY"]).decode()
 
@@ -58,24 +380,63 @@ users = [
     User(1, "Medicinboks – borger 1"),
     User(2, "Armbånd – borger 1"),
 ]
+# Opslag på id i konstant tid i stedet for at løbe listen igennem
+users_by_id = {u.id: u for u in users}
+
+# Verificerede tokens (se token_cache.py) og tidspunkt for tilbagekaldelse pr. enhed
+token_cache = TokenCache(
+    maxsize=app.config["TOKEN_CACHE_SIZE"], ttl=app.config["TOKEN_CACHE_TTL"]
+)
+revoked_before = {}
 
 
 def get_user_by_id(id: int) -> User | None:
-    matches = [u for u in users if u.id == id]
-    return matches[0] if matches else None
+    return users_by_id.get(id)
+
+
+def revoke_device(id: int) -> int:
+    """
+    Tilbagekalder alle tokens udstedt til enheden indtil nu.
+    Enheden kan hente et nyt token bagefter. Returnerer antal fjernede cache-entries.
+    """
+    revoked_before[id] = time.time()
+    return token_cache.evict_user(id)
 
 
 @auth.verify_token
+@tracing.traced("verify_token")
 def verify_token(token: str) -> User | None:
     """Validerer Bearer-token og returnerer User-objektet eller None."""
+    uid = token_cache.get(token)
+    if uid is not None:
+        return get_user_by_id(uid)
+
     try:
         data = jwt.decode(
             token.encode("ascii"),
             app.config["SECRET_KEY"],
         )
+        data.validate(now=time.time())  # exp/nbf/iat (iat er et decimaltal)
         uid = data["id"]
         user = get_user_by_id(uid)
-    except (JoseError, KeyError, IndexError):
+    except (JoseError, KeyError, IndexError, ValueError):
+        metrics.AUTH_FAILURES.inc("invalid")
+        return None
+
+    if user is None:
+        metrics.AUTH_FAILURES.inc("unknown_device")
+        return None
+    iat = data.get("iat", 0)
+    if iat <= revoked_before.get(uid, float("-inf")):
+        metrics.AUTH_FAILURES.inc("revoked")
+        return None
+
+    token_cache.put(token, uid, data.get("exp"))
+    # En tilbagekaldelse mellem tjekket og put() har allerede kørt evict_user,
+    # så tjek igen efter put() og fjern det igen i stedet for at cache det i ttl sekunder
+    if iat <= revoked_before.get(uid, float("-inf")):
+        token_cache.evict_user(uid)
+        metrics.AUTH_FAILURES.inc("revoked")
         return None
     return user
 
@@ -89,85 +450,531 @@ class BorgerIn(Schema):
     vaerelse = String(required=False)
 
 
+# Grænser så værdier uden for kolonnetyperne giver en valideringsfejl (også pr.
+# element i /events/batch) i stedet for NumericValueOutOfRange fra INSERT'en
+BORGER_ID_RANGE = Range(min=1, max=2**31 - 1)   # INTEGER / SERIAL
+BPM_RANGE = Range(min=0, max=32767)             # int16 i det binære format (event_codec)
+
+
 class BoxEventIn(Schema):
-    borger_id = Integer(required=True)
+    borger_id = Integer(required=True, validate=BORGER_ID_RANGE)
     box_open = Boolean(required=True)   # True = åben, False = lukket
 
 
 class PulseEventIn(Schema):
-    borger_id = Integer(required=True)
-    bpm = Integer(required=True)        # puls i slag/minut
+    borger_id = Integer(required=True, validate=BORGER_ID_RANGE)
+    bpm = Integer(required=True, validate=BPM_RANGE)        # puls i slag/minut
 
 
 class VibrationEventIn(Schema):
-    borger_id = Integer(required=True)
+    borger_id = Integer(required=True, validate=BORGER_ID_RANGE)
     signaled = Boolean(required=True)   # True = armbånd har vibreret
 
 
-# ---------- ROUTES: GENERELT ----------
-@app.get("/")
-def index():
-    return {"message": "Medibox API kører – se /dashboard for oversigt"}
+# Batch: samme felter som enkelt-events + klientens oprindelige tidspunkt
+class BoxBatchItem(BoxEventIn):
+    created_at = DateTime(required=False)
 
 
-@app.get("/dashboard")
-def dashboard():
-    """Vis simpel oversigt som tabeller til medarbejdere fra PostgreSQL"""
+class PulseBatchItem(PulseEventIn):
+    created_at = DateTime(required=False)
+
+
+class VibrationBatchItem(VibrationEventIn):
+    created_at = DateTime(required=False)
+
+
+class EventBatchIn(Schema):
+    # Hvert element: {"type": "box"|"pulse"|"vibration", ...felter...}
+    # Elementerne valideres enkeltvis, så én fejl ikke afviser hele batchen.
+    events = List(Dict(), required=True, validate=Length(min=1))
+
+
+class EventExportIn(Schema):
+    # Filtre til fuld eksport (/box-events/export osv.)
+    since = DateTime(required=False)     # created_at >= since
+    until = DateTime(required=False)     # created_at < until
+    borger_id = Integer(required=False)
+
+
+class EventQueryIn(EventExportIn):
+    # Filtre og keyset-pagination til /box-events, /pulse-events og /vibration-events
+    limit = Integer(load_default=100, validate=Range(min=1, max=1000))
+    cursor = String(required=False)      # next_cursor fra forrige side
+
+
+def validate_window(value: str):
+    try:
+        pulse_rollups.parse_window(value)
+    except ValueError:
+        raise ValidationError("Vindue som fx 24h, 7d eller 4w, højst 366d / 52w / 8784h.") from None
+
+
+class PulseStatsQueryIn(Schema):
+    # Vindue bagud fra nu: fx "24h", "7d" eller "4w" (højst pulse_rollups.MAX_WINDOW)
+    window = String(load_default="7d", validate=validate_window)
+
 
+class AdherenceQueryIn(Schema):
+    # Antal døgn bagud der rapporteres for (højst cachens levetid på 90 døgn)
+    days = Integer(load_default=14, validate=Range(min=1, max=90))
+
+
+class ReminderIn(Schema):
+    time = String(required=True, validate=Regexp(r"^([01]\d|2[0-3]):[0-5]\d$"))  # lokal tid "HH:MM"
+    device_id = Integer(required=True)    # armbåndet der skal vibrere
+    # 0 = mandag ... 6 = søndag; udeladt = alle dage
+    weekdays = List(Integer(validate=Range(min=0, max=6)), required=False, validate=Length(min=1))
+
+
+class NextReminderQueryIn(Schema):
+    # Unix-tid for påmindelsen enheden lige har vibreret for, så den ikke gentages
+    # (højst 2**32 - 1, som armbåndet gemmer den i RTC-hukommelsen)
+    after = Integer(required=False, validate=Range(min=0, max=2**32 - 1))
+
+
+# ---------- EVENT-TYPER ----------
+# type -> (tabel, værdikolonne, batch-schema). Tabel/kolonne er konstanter,
+# så de må gerne formatteres ind i SQL.
+EVENT_TYPES = {
+    "box": ("box_events", "box_open", BoxBatchItem),
+    "pulse": ("pulse_events", "bpm", PulseBatchItem),
+    "vibration": ("vibration_events", "signaled", VibrationBatchItem),
+}
+
+# Seneste events pr. type til /dashboard (se recent_events.py)
+recent_events = RecentEvents(EVENT_TYPES, maxlen=app.config["DASHBOARD_ROWS"])
+
+
+def insert_events(cur, kind: str, rows: list) -> list:
+    """
+    Indsætter en eller flere rækker (borger_id, værdi, created_at) i én INSERT.
+    created_at = None betyder serverens tidspunkt (now()).
+    Ukendt borger_id giver ForeignKeyViolation som før.
+    Returnerer de indsatte rækker (id, borger_id, værdi, created_at).
+    """
+    table, column, _ = EVENT_TYPES[kind]
+    inserted = psycopg2.extras.execute_values(
+        cur,
+        f"""
+        INSERT INTO {table} (borger_id, {column}, created_at)
+        VALUES %s
+        RETURNING id, borger_id, {column}, created_at;
+        """,
+        rows,
+        template="(%s, %s, COALESCE(%s::timestamptz, now()))",
+        page_size=len(rows),
+        fetch=True,
+    )
+    if kind == "pulse" and app.config["PULSE_ROLLUPS"]:
+        # Samme transaktion: rollups er aldrig ude af trit med rådata
+        pulse_rollups.update_rollups(cur, [(r[1], r[2], r[3]) for r in inserted])
+    return inserted
+
+
+def store_events(cur, events: list) -> tuple[list, dict]:
+    """
+    Gemmer en liste af events (type, borger_id, værdi, created_at) i den
+    aktuelle transaktion. Returnerer True/False (gemt/afvist) pr. event
+    samt de indsatte rækker pr. type.
+    Ukendte borger_id'er afvises enkeltvis i stedet for at fejle hele batchen.
+    """
+    if not events:
+        return [], {}
+
+    # Find eksisterende borgere og lås dem mod sletning,
+    # så de efterfølgende INSERTs ikke kan fejle på FK.
+    cur.execute(
+        "SELECT id FROM borger WHERE id = ANY(%s) FOR KEY SHARE;",
+        (sorted({borger_id for _, borger_id, _, _ in events}),),
+    )
+    known_ids = {row[0] for row in cur.fetchall()}
+
+    results = []
+    rows_by_kind = {}
+    for kind, borger_id, value, created_at in events:
+        ok = borger_id in known_ids
+        if ok:
+            rows_by_kind.setdefault(kind, []).append((borger_id, value, created_at))
+        results.append(ok)
+
+    inserted = {}
+    for kind, rows in rows_by_kind.items():
+        inserted[kind] = insert_events(cur, kind, rows)
+    return results, inserted
+
+
+# ---------- BORGER-KATALOG ----------
+borger_directory = BorgerDirectory()
+_borger_listener = None
+_borger_directory_lock = threading.Lock()
+
+
+def _load_borger_directory():
     conn = get_db_connection()
     try:
         with conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                # Medicinboks events
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, navn FROM borger;")
+                borger_directory.load(cur.fetchall())
+    finally:
+        conn.close()
+
+
+def _on_borger_changed(borger_id: int):
+    """NOTIFY fra en anden proces: hent borgeren igen og ret caches."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT navn FROM borger WHERE id = %s;", (borger_id,))
+                row = cur.fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        borger_directory.remove(borger_id)
+        recent_events.remove_borger(borger_id)
+    elif borger_directory.get(borger_id) != row[0]:
+        borger_directory.set(borger_id, row[0])
+        recent_events.rename_borger(borger_id, row[0])
+
+
+def get_borger_directory() -> BorgerDirectory:
+    """Returnerer borger-kataloget (indlæses ved første kald)."""
+    global _borger_listener
+    if not borger_directory.loaded:
+        with _borger_directory_lock:
+            if not borger_directory.loaded:
+                _load_borger_directory()
+                if app.config["BORGER_LISTEN"] and _borger_listener is None:
+                    _borger_listener = BorgerListener(
+                        borger_directory,
+                        on_change=_on_borger_changed,
+                        on_resync=_load_borger_directory,
+                        **DB_SETTINGS,
+                    )
+                    _borger_listener.start()
+    return borger_directory
+
+
+def notify_borger_changed(cur, borger_id: int):
+    """Sender NOTIFY til andre processer – leveres først ved commit."""
+    cur.execute(f"SELECT pg_notify('{NOTIFY_CHANNEL}', %s);", (str(borger_id),))
+
+
+def borger_exists(borger_id: int) -> bool:
+    """
+    Tjekker borger_id uden databasen hvis muligt.
+    Er kataloget ikke autoritativt, slås et ukendt id op én gang.
+    """
+    directory = get_borger_directory()
+    known = directory.known(borger_id)
+    if known is not None:
+        return known
+    return bool(borger_names([borger_id]))
+
+
+def borger_names(ids, conn=None) -> dict:
+    """
+    Navne for en mængde borger_id'er fra kataloget.
+    Manglende id'er (fx oprettet af en anden proces) hentes i ét opslag.
+    conn kan gives, hvis kaldet sker midt i en transaktion (fx under eksport).
+    """
+    directory = get_borger_directory()
+    missing = directory.missing(ids)
+    if missing:
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
                 cur.execute(
-                    """
-                    SELECT b.navn,
-                           e.box_open,
-                           e.created_at
-                    FROM box_events e
-                    JOIN borger b ON e.borger_id = b.id
-                    ORDER BY e.created_at DESC
-                    LIMIT 10;
-                    """
+                    "SELECT id, navn FROM borger WHERE id = ANY(%s);",
+                    (sorted(missing),),
                 )
-                box_events = cur.fetchall()
+                for borger_id, navn in cur.fetchall():
+                    directory.set(borger_id, navn)
+            if own_conn:
+                conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+    return {i: directory.get(i) for i in ids if directory.get(i) is not None}
 
-                # Puls events
-                cur.execute(
-                    """
-                    SELECT b.navn,
-                           e.bpm,
-                           e.created_at
-                    FROM pulse_events e
-                    JOIN borger b ON e.borger_id = b.id
-                    ORDER BY e.created_at DESC
-                    LIMIT 10;
-                    """
+
+# ---------- ADHERENCE ----------
+# Påmindelse -> boks åbnet? (se adherence.py)
+adherence_engine = AdherenceEngine(timedelta(minutes=app.config["ADHERENCE_WINDOW_MINUTES"]))
+_adherence_refreshed = 0.0
+
+
+def get_adherence() -> AdherenceEngine:
+    """
+    Returnerer adherence-cachen, opdateret hvis der er kommet nye box/vibration-events.
+    Uden nye events (og inden ADHERENCE_MAX_AGE) bruges databasen slet ikke.
+    """
+    global _adherence_refreshed
+    stale = time.monotonic() - _adherence_refreshed > app.config["ADHERENCE_MAX_AGE"]
+    if adherence_engine.dirty or stale:
+        conn = get_db_connection()
+        try:
+            adherence_engine.refresh(conn)
+        finally:
+            conn.close()
+        _adherence_refreshed = time.monotonic()
+    return adherence_engine
+
+
+# ---------- PÅMINDELSER ----------
+# Påmindelses-skema pr. armbånd (se reminders.py)
+reminder_scheduler = ReminderScheduler(ZoneInfo(app.config["TIMEZONE"]))
+_reminders_loaded = 0.0
+
+
+def get_reminders() -> ReminderScheduler:
+    """Returnerer skemaet, indlæst fra databasen første gang og derefter med jævne mellemrum."""
+    global _reminders_loaded
+    stale = time.monotonic() - _reminders_loaded > app.config["REMINDER_RELOAD_INTERVAL"]
+    if not reminder_scheduler.loaded or stale:
+        conn = get_db_connection()
+        try:
+            reminder_scheduler.load(conn)
+        finally:
+            conn.close()
+        _reminders_loaded = time.monotonic()
+    return reminder_scheduler
+
+
+def parse_reminder(json_data) -> tuple:
+    """(klokkeslæt, ugedage-maske, device_id) fra ReminderIn; 400 ved ukendt enhed."""
+    if get_user_by_id(json_data["device_id"]) is None:
+        abort(400, "Ukendt device_id.")
+    time_of_day = datetime.strptime(json_data["time"], "%H:%M").time()
+    days = json_data.get("weekdays")
+    weekdays = weekdays_mask(days) if days else ALL_DAYS
+    return time_of_day, weekdays, json_data["device_id"]
+
+
+# ---------- LIVE-OPDATERING (Socket.IO) ----------
+DASHBOARD_NAMESPACE = "/dashboard"
+
+
+@socketio.on("connect", namespace=DASHBOARD_NAMESPACE)
+def dashboard_connect():
+    """Dashboardet lytter kun – der er intet at sende ved forbindelse."""
+    return True
+
+
+def publish_events(kind: str, rows: list):
+    """
+    Sender nye (committede) events til ringbufferen og åbne dashboards.
+    Rækkerne er (id, borger_id, værdi, created_at) fra insert_events;
+    navnet sættes på fra borger-kataloget.
+    """
+    # Kun kaldt efter commit (ingest_event, events_batch og write-behind-flush),
+    # så tælleren ikke tæller rækker fra transaktioner der blev rullet tilbage
+    metrics.INGEST_EVENTS.inc(kind, amount=len(rows))
+    column = EVENT_TYPES[kind][1]
+    names = borger_names({r[1] for r in rows})
+    events = [
+        {"id": event_id, "borger_id": borger_id, "navn": names.get(borger_id),
+         column: value, "created_at": created_at}
+        for event_id, borger_id, value, created_at in rows
+    ]
+    recent_events.add(kind, events)
+    if kind in ("box", "vibration"):
+        adherence_engine.dirty = True
+    for event in events:
+        # Samme format som {{ row["created_at"] }} i templaten
+        socketio.emit(
+            f"{kind}_event",
+            dict(event, created_at=str(event["created_at"])),
+            namespace=DASHBOARD_NAMESPACE,
+        )
+
+
+# ---------- WRITE-BEHIND ----------
+_ingest_queue = None
+_ingest_queue_lock = threading.Lock()
+
+
+def _flush_events(batch: list) -> list:
+    """Flusher en batch fra write-behind-køen i én transaktion."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                results, inserted = store_events(cur, batch)
+    finally:
+        conn.close()
+
+    for kind, rows in inserted.items():
+        publish_events(kind, rows)
+    return results
+
+
+def get_ingest_queue() -> WriteBehindQueue:
+    """Returnerer write-behind-køen (startes ved første kald)."""
+    global _ingest_queue
+    if _ingest_queue is None:
+        with _ingest_queue_lock:
+            if _ingest_queue is None:
+                q = WriteBehindQueue(
+                    _flush_events,
+                    maxsize=app.config["WRITE_BEHIND_MAXSIZE"],
+                    batch_size=app.config["WRITE_BEHIND_BATCH_SIZE"],
+                    flush_interval=app.config["WRITE_BEHIND_FLUSH_INTERVAL"],
                 )
-                pulse_events = cur.fetchall()
+                q.start()
+                atexit.register(q.stop)
+                _ingest_queue = q
+    return _ingest_queue
+
+
+def ingest_event(kind: str, borger_id: int, value):
+    """
+    Fælles vej for enkelt-events fra ESP32: enten direkte INSERT
+    eller (i write-behind mode) i kø med svar 202.
+    Ukendte borger_id'er afvises via borger-kataloget før databasen kaldes.
+    """
+    if not borger_exists(borger_id):
+        abort(400, "Ukendt borger_id.")
+
+    if app.config["WRITE_BEHIND"]:
+        get_ingest_queue().put((kind, borger_id, value, datetime.now(timezone.utc)))
+        return {"status": "queued"}, 202
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                try:
+                    rows = insert_events(cur, kind, [(borger_id, value, None)])
+                except ForeignKeyViolation:
+                    abort(400, "Ukendt borger_id.")
+    finally:
+        conn.close()
+
+    publish_events(kind, rows)
+    return {"status": "ok"}, 201
+
 
-                # Vibration events
+# ---------- ROUTES: GENERELT ----------
+@app.get("/")
+def index():
+    return {"message": "Medibox API kører – se /dashboard for oversigt"}
+
+
+def fetch_recent_events(limit: int) -> dict:
+    """
+    Henter de nyeste events for alle tre typer i ét roundtrip (UNION ALL).
+    Hver del bruger sin egen ORDER BY/LIMIT, så hver type får sine egne rækker.
+    Navne kommer fra borger-kataloget i stedet for en JOIN.
+    """
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
                 cur.execute(
                     """
-                    SELECT b.navn,
-                           e.signaled,
-                           e.created_at
-                    FROM vibration_events e
-                    JOIN borger b ON e.borger_id = b.id
-                    ORDER BY e.created_at DESC
-                    LIMIT 10;
-                    """
+                    (SELECT 'box' AS kind, e.id, e.borger_id,
+                            e.box_open, NULL::integer AS bpm, NULL::boolean AS signaled,
+                            e.created_at
+                     FROM box_events e
+                     ORDER BY e.created_at DESC, e.id DESC
+                     LIMIT %(limit)s)
+                    UNION ALL
+                    (SELECT 'pulse', e.id, e.borger_id,
+                            NULL, e.bpm, NULL,
+                            e.created_at
+                     FROM pulse_events e
+                     ORDER BY e.created_at DESC, e.id DESC
+                     LIMIT %(limit)s)
+                    UNION ALL
+                    (SELECT 'vibration', e.id, e.borger_id,
+                            NULL, NULL, e.signaled,
+                            e.created_at
+                     FROM vibration_events e
+                     ORDER BY e.created_at DESC, e.id DESC
+                     LIMIT %(limit)s);
+                    """,
+                    {"limit": limit},
                 )
-                vibration_events = cur.fetchall()
+                rows = cur.fetchall()
     finally:
         conn.close()
 
-    return render_template(
-        "dashboard.html",
-        box_events=box_events,
-        pulse_events=pulse_events,
-        vibration_events=vibration_events,
-    )
+    names = borger_names({r["borger_id"] for r in rows})
+    events = {kind: [] for kind in EVENT_TYPES}
+    for r in rows:
+        column = EVENT_TYPES[r["kind"]][1]
+        events[r["kind"]].append({
+            "id": r["id"],
+            "borger_id": r["borger_id"],
+            "navn": names.get(r["borger_id"]),
+            column: r[column],
+            "created_at": r["created_at"],
+        })
+    # UNION ALL garanterer ikke rækkefølgen på tværs af delene
+    for kind_rows in events.values():
+        kind_rows.sort(key=lambda e: (e["created_at"], e["id"]), reverse=True)
+    return events
+
+
+def dashboard_etag(events: dict, adherence: dict) -> str:
+    """
+    ETag ud fra de viste events: id'er (nye events), navne (omdøbte borgere)
+    og adherence-status for påmindelserne.
+    Uændret ETag betyder at HTML'en er den samme.
+    """
+    h = hashlib.sha1()
+    for kind in EVENT_TYPES:
+        for row in events[kind]:
+            h.update(f"{kind}:{row['id']}:{row['navn']};".encode())
+    for reminder_id, result in sorted(adherence.items()):
+        h.update(f"a:{reminder_id}:{result['status']}:{result['delay_seconds']};".encode())
+    return h.hexdigest()
+
+
+@app.get("/dashboard")
+def dashboard():
+    """Vis simpel oversigt som tabeller til medarbejdere"""
+    limit = app.config["DASHBOARD_ROWS"]
+
+    if app.config["DASHBOARD_CACHE"]:
+        # Fra ringbufferen – databasen bruges kun ved første visning/efter sletning
+        if recent_events.needs_reload:
+            recent_events.reload(lambda: fetch_recent_events(limit))
+        events = {kind: recent_events.snapshot(kind) for kind in EVENT_TYPES}
+    else:
+        events = fetch_recent_events(limit)
+
+    # Adherence for de viste påmindelser; mangler en, afventer den stadig
+    engine = get_adherence()
+    adherence = {}
+    for row in events["vibration"]:
+        result = engine.result_for(row["borger_id"], row["id"])
+        if result is not None:
+            adherence[row["id"]] = result
+
+    # Browsere og proxies får 304 uden at templaten renderes igen
+    etag = dashboard_etag(events, adherence)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        with tracing.span("render_template", template="dashboard.html"):
+            html = render_template(
+                "dashboard.html",
+                box_events=events["box"],
+                pulse_events=events["pulse"],
+                vibration_events=events["vibration"],
+                adherence=adherence,
+            )
+        response = make_response(html)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @app.post("/token/<int:id>")
@@ -180,6 +987,44 @@ def get_token(id: int):
     return {"token": user.get_token()}
 
 
+@app.post("/token/<int:id>/revoke")
+@auth.login_required
+def revoke_token(id: int):
+    """
+    Tilbagekald alle udstedte tokens for en enhed (fx mistet eller stjålet).
+    Kræver enhedens eget token, som selv bliver ugyldigt.
+    """
+    if get_user_by_id(id) is None:
+        abort(404)
+    if auth.current_user.id != id:
+        abort(403, "Token tilhører en anden enhed.")
+    revoke_device(id)
+    return {"status": "revoked", "id": id}, 200
+
+
+# Senest udstedte UDP-session pr. enhed (sessioner skal være stigende)
+udp_sessions = {}
+_udp_sessions_lock = threading.Lock()
+
+
+@app.post("/udp-key/<int:id>")
+@auth.login_required
+def get_udp_key(id: int):
+    """
+    Ny UDP-session og HMAC-nøgle til en enhed (se udp_listener.py).
+    Kræver enhedens eget token. Tidligere sessioner afvises af listeneren,
+    så snart den nye er i brug.
+    """
+    if auth.current_user.id != id:
+        abort(403, "Token tilhører en anden enhed.")
+    with _udp_sessions_lock:
+        session = max(int(time.time()), udp_sessions.get(id, 0) + 1)
+        udp_sessions[id] = session
+    key = derive_key(app.config["SECRET_KEY"], id, session)
+    return {"device_id": id, "session": session, "key": key.hex(),
+            "port": app.config["UDP_PORT"]}, 200
+
+
 # ---------- ROUTES: BORGER CRUD (Programmering: CRUD + Regex) ----------
 
 @app.post("/borger")
@@ -215,9 +1060,11 @@ def create_borger(json_data):
                     (navn, telefon or None, adresse or None, vaerelse or None),
                 )
                 new_id = cur.fetchone()[0]
+                notify_borger_changed(cur, new_id)
     finally:
         conn.close()
 
+    get_borger_directory().set(new_id, navn)
     return {"id": new_id, "navn": navn}, 201
 
 
@@ -281,9 +1128,12 @@ def update_borger(borger_id: int, json_data):
                 row = cur.fetchone()
                 if row is None:
                     abort(404, "Borger ikke fundet.")
+                notify_borger_changed(cur, borger_id)
     finally:
         conn.close()
 
+    get_borger_directory().set(borger_id, navn)
+    recent_events.rename_borger(borger_id, navn)
     return {"status": "updated", "id": borger_id}, 200
 
 
@@ -303,21 +1153,87 @@ def delete_borger(borger_id: int):
                 row = cur.fetchone()
                 if row is None:
                     abort(404, "Borger ikke fundet.")
+                notify_borger_changed(cur, borger_id)
     finally:
         conn.close()
 
+    get_borger_directory().remove(borger_id)
+    recent_events.remove_borger(borger_id)
+    adherence_engine.forget(borger_id)
+    reminder_scheduler.remove_borger(borger_id)
     return {"status": "deleted", "id": borger_id}, 200
 
 
-# ---------- ROUTES: EVENTS (ESP32 → API → DB) ----------
+@app.get("/borger/<int:borger_id>/pulse-stats")
+@app.input(PulseStatsQueryIn, location="query")
+def borger_pulse_stats(borger_id: int, query_data):
+    """
+    Pulsstatistik for en borger over et vindue, beregnet ud fra rollups.
+    Korte vinduer (<= 2 døgn) bruger time-buckets, længere døgn-buckets.
+    """
+    if not borger_exists(borger_id):
+        abort(404, "Borger ikke fundet.")
+    window = pulse_rollups.parse_window(query_data["window"])
 
-@app.post("/box-event")
-@auth.login_required
-@app.input(BoxEventIn)
-def box_event(json_data):
-    """Kaldes af ESP32 i medicinboks (åben/lukket boks)."""
-    borger_id = json_data["borger_id"]
-    box_open = json_data["box_open"]
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                stats = pulse_rollups.pulse_stats(cur, borger_id, window)
+    finally:
+        conn.close()
+
+    return {"borger_id": borger_id, "window": query_data["window"], **stats}, 200
+
+
+@app.get("/borger/<int:borger_id>/adherence")
+@app.input(AdherenceQueryIn, location="query")
+def borger_adherence(borger_id: int, query_data):
+    """
+    Påmindelser for en borger og om/hvornår boksen blev åbnet bagefter.
+    Status: taken (åbnet inden for vinduet), missed eller pending.
+    """
+    if not borger_exists(borger_id):
+        abort(404, "Borger ikke fundet.")
+    since = datetime.now(timezone.utc) - timedelta(days=query_data["days"])
+    report = get_adherence().report(borger_id, since=since)
+    return {
+        "borger_id": borger_id,
+        "window_minutes": app.config["ADHERENCE_WINDOW_MINUTES"],
+        **report,
+    }, 200
+
+
+@app.get("/adherence")
+@app.input(AdherenceQueryIn, location="query")
+def adherence_overview(query_data):
+    """Adherence-opsummering for alle borgere med påmindelser i perioden."""
+    since = datetime.now(timezone.utc) - timedelta(days=query_data["days"])
+    engine = get_adherence()
+    names = borger_names(engine.borger_ids())
+    borgere = []
+    for borger_id in engine.borger_ids():
+        report = engine.report(borger_id, since=since)
+        if not report["reminders"]:
+            continue
+        del report["results"]
+        borgere.append({"borger_id": borger_id, "navn": names.get(borger_id), **report})
+    return {
+        "window_minutes": app.config["ADHERENCE_WINDOW_MINUTES"],
+        "days": query_data["days"],
+        "borgere": borgere,
+    }, 200
+
+
+# ---------- ROUTES: PÅMINDELSER ----------
+
+@app.post("/borger/<int:borger_id>/reminders")
+@app.input(ReminderIn)
+def create_reminder(borger_id: int, json_data):
+    """Opretter en påmindelse for en borger (klokkeslæt er lokal tid)."""
+    time_of_day, weekdays, device_id = parse_reminder(json_data)
+    if not borger_exists(borger_id):
+        abort(404, "Borger ikke fundet.")
 
     conn = get_db_connection()
     try:
@@ -326,45 +1242,134 @@ def box_event(json_data):
                 try:
                     cur.execute(
                         """
-                        INSERT INTO box_events (borger_id, box_open)
-                        VALUES (%s, %s);
+                        INSERT INTO reminders (borger_id, device_id, time_of_day, weekdays)
+                        VALUES (%s, %s, %s, %s)
+                        RETURNING id;
                         """,
-                        (borger_id, box_open),
+                        (borger_id, device_id, time_of_day, weekdays),
                     )
                 except ForeignKeyViolation:
-                    abort(400, "Ukendt borger_id.")
+                    abort(404, "Borger ikke fundet.")
+                reminder_id = cur.fetchone()[0]
     finally:
         conn.close()
 
-    return {"status": "ok"}, 201
+    scheduler = get_reminders()
+    scheduler.set(reminder_id, borger_id, device_id, time_of_day, weekdays)
+    return scheduler.get(reminder_id).to_dict(), 201
 
 
-@app.post("/pulse-event")
-@auth.login_required
-@app.input(PulseEventIn)
-def pulse_event(json_data):
-    """Kaldes af ESP32 i medicinboks (pulssensor)."""
-    borger_id = json_data["borger_id"]
-    bpm = json_data["bpm"]
+@app.get("/borger/<int:borger_id>/reminders")
+def list_reminders(borger_id: int):
+    """Borgerens påmindelser sorteret efter klokkeslæt."""
+    if not borger_exists(borger_id):
+        abort(404, "Borger ikke fundet.")
+    reminders = get_reminders().for_borger(borger_id)
+    return {"borger_id": borger_id, "reminders": [r.to_dict() for r in reminders]}, 200
+
+
+@app.put("/reminders/<int:reminder_id>")
+@app.input(ReminderIn)
+def update_reminder(reminder_id: int, json_data):
+    """Ændrer klokkeslæt, ugedage eller armbånd for en påmindelse."""
+    time_of_day, weekdays, device_id = parse_reminder(json_data)
 
     conn = get_db_connection()
     try:
         with conn:
             with conn.cursor() as cur:
-                try:
-                    cur.execute(
-                        """
-                        INSERT INTO pulse_events (borger_id, bpm)
-                        VALUES (%s, %s);
-                        """,
-                        (borger_id, bpm),
-                    )
-                except ForeignKeyViolation:
-                    abort(400, "Ukendt borger_id.")
+                cur.execute(
+                    """
+                    UPDATE reminders
+                    SET device_id = %s,
+                        time_of_day = %s,
+                        weekdays = %s
+                    WHERE id = %s
+                    RETURNING borger_id;
+                    """,
+                    (device_id, time_of_day, weekdays, reminder_id),
+                )
+                row = cur.fetchone()
+                if row is None:
+                    abort(404, "Påmindelse ikke fundet.")
     finally:
         conn.close()
 
-    return {"status": "ok"}, 201
+    scheduler = get_reminders()
+    scheduler.set(reminder_id, row[0], device_id, time_of_day, weekdays)
+    return scheduler.get(reminder_id).to_dict(), 200
+
+
+@app.delete("/reminders/<int:reminder_id>")
+def delete_reminder(reminder_id: int):
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM reminders WHERE id = %s RETURNING id;", (reminder_id,))
+                if cur.fetchone() is None:
+                    abort(404, "Påmindelse ikke fundet.")
+    finally:
+        conn.close()
+
+    reminder_scheduler.remove(reminder_id)
+    return {"status": "deleted", "id": reminder_id}, 200
+
+
+@app.get("/reminders/next")
+@auth.login_required
+@app.input(NextReminderQueryIn, location="query")
+def next_reminder(query_data):
+    """
+    Næste påmindelse for armbåndet der kalder (ud fra dets token).
+    in_seconds er tid til da (0 = vibrér nu); er der ingen påmindelser, er
+    felterne null, og enheden spørger igen senere.
+    """
+    device_id = auth.current_user.id
+    now = datetime.now(timezone.utc)
+    after = now - timedelta(seconds=app.config["REMINDER_GRACE_SECONDS"])
+    if "after" in query_data:
+        # Aldrig længere tilbage end grace-perioden: et armbånd med forkert ur må
+        # ikke få gamle påmindelser igen (og dermed logge dem som nye vibrationer)
+        after = max(after, datetime.fromtimestamp(query_data["after"], timezone.utc))
+
+    found = get_reminders().next_for(device_id, after)
+    if found is None:
+        return {"device_id": device_id, "reminder_id": None, "borger_id": None,
+                "fire_at": None, "epoch": None, "in_seconds": None}, 200
+    fire_at, reminder = found
+    return {
+        "device_id": device_id,
+        "reminder_id": reminder.id,
+        "borger_id": reminder.borger_id,
+        "fire_at": fire_at.isoformat(),
+        "epoch": int(fire_at.timestamp()),
+        "in_seconds": max(0, int((fire_at - now).total_seconds())),
+    }, 200
+
+
+# ---------- ROUTES: EVENTS (ESP32 → API → DB) ----------
+
+@app.post("/box-event")
+@auth.login_required
+@app.input(BoxEventIn)
+def box_event(json_data):
+    """Kaldes af ESP32 i medicinboks (åben/lukket boks)."""
+    borger_id = json_data["borger_id"]
+    box_open = json_data["box_open"]
+
+    return ingest_event("box", borger_id, box_open)
+
+
+@app.post("/pulse-event")
+@auth.login_required
+@app.input(PulseEventIn)
+def pulse_event(json_data):
+    """Kaldes af ESP32 i medicinboks (pulssensor)."""
+    borger_id = json_data["borger_id"]
+    bpm = json_data["bpm"]
+
+    return ingest_event("pulse", borger_id, bpm)
 
 
 @app.post("/vibration-event")
@@ -375,93 +1380,386 @@ def vibration_event(json_data):
     borger_id = json_data["borger_id"]
     signaled = json_data["signaled"]
 
+    return ingest_event("vibration", borger_id, signaled)
+
+
+@app.post("/events/batch")
+@auth.login_required
+def events_batch():
+    """
+    Modtager mange events på én gang (fx efter WiFi-udfald eller fra en gateway).
+    Body er JSON ({"events": [...]}) eller det binære format fra event_codec.py
+    (Content-Type: application/vnd.iomt.events).
+    Hvert event valideres mod sit schema, ukendte borger_id'er afvises enkeltvis,
+    og resten skrives med én INSERT pr. tabel i én transaktion.
+    """
+    if request.mimetype == event_codec.MIMETYPE:
+        results, parsed = parse_binary_batch(request.get_data())
+    else:
+        try:
+            json_data = EventBatchIn().load(request.get_json(silent=True) or {})
+        except ValidationError as err:
+            abort(422, "Validation error", {"json": err.messages})
+        items = json_data["events"]
+        if len(items) > app.config["BATCH_MAX_EVENTS"]:
+            abort(413, f"Højst {app.config['BATCH_MAX_EVENTS']} events pr. batch.")
+        results, parsed = parse_batch_items(items)
+
+    stored = []
+    if parsed:
+        conn = get_db_connection()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    stored, inserted = store_events(cur, [event for _, event in parsed])
+        finally:
+            conn.close()
+
+        for kind, rows in inserted.items():
+            publish_events(kind, rows)
+    return batch_response(results, parsed, stored)
+
+
+def parse_binary_batch(body: bytes) -> tuple[list, list]:
+    """
+    Som parse_batch_items, men for en binær body. Records er allerede
+    typede, så de springer marshmallow over; hele bodyen afvises hvis
+    den ikke kan afkodes.
+    """
+    try:
+        records = event_codec.decode(body)
+    except event_codec.CodecError as err:
+        abort(400, f"Ugyldig binær body: {err}")
+    if not records:
+        abort(400, "Ingen events i body.")
+    if len(records) > app.config["BATCH_MAX_EVENTS"]:
+        abort(413, f"Højst {app.config['BATCH_MAX_EVENTS']} events pr. batch.")
+
+    parsed = [
+        (index, (kind, borger_id, value,
+                 datetime.fromtimestamp(ts, timezone.utc) if ts else None))
+        for index, (kind, borger_id, value, ts) in enumerate(records)
+    ]
+    return [None] * len(records), parsed
+
+
+def parse_batch_items(items: list) -> tuple[list, list]:
+    """
+    Validerer hvert event mod sit schema. Returnerer resultater pr. index
+    (None for gyldige events, som endnu ikke er gemt) og de gyldige events
+    som (index, (type, borger_id, værdi, created_at)).
+    """
+    results = [None] * len(items)
+    parsed = []
+
+    for index, item in enumerate(items):
+        item = dict(item)
+        kind = item.pop("type", None)
+        if kind not in EVENT_TYPES:
+            results[index] = {"index": index, "status": "error",
+                              "message": "Ukendt eller manglende type."}
+            continue
+        try:
+            data = EVENT_TYPES[kind][2]().load(item)
+        except ValidationError as err:
+            results[index] = {"index": index, "status": "error",
+                              "errors": err.messages}
+            continue
+        column = EVENT_TYPES[kind][1]
+        parsed.append((index, (kind, data["borger_id"], data[column], data.get("created_at"))))
+    return results, parsed
+
+
+def batch_response(results: list, parsed: list, stored: list) -> tuple[dict, int]:
+    """Udfylder resultaterne for de gemte/afviste events og vælger statuskode."""
+    for (index, _), ok in zip(parsed, stored):
+        if ok:
+            results[index] = {"index": index, "status": "ok"}
+        else:
+            results[index] = {"index": index, "status": "error",
+                              "message": "Ukendt borger_id."}
+
+    accepted = sum(1 for r in results if r["status"] == "ok")
+    body = {
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results,
+    }
+    # 207 Multi-Status når mindst ét event blev afvist
+    return body, 201 if accepted == len(results) else 207
+
+
+# ---------- ROUTES: EVENT-LISTER (keyset-pagination) ----------
+
+def encode_cursor(created_at: datetime, event_id: int) -> str:
+    """Opak side-token: base64 af (created_at, id) for sidste række på siden."""
+    raw = json.dumps([created_at.isoformat(), event_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, event_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(event_id)
+    except (ValueError, TypeError):
+        abort(400, "Ugyldig cursor.")
+
+
+def event_filters(query_data: dict) -> tuple[list, list]:
+    """Bygger WHERE-betingelser og parametre for since/until/borger_id."""
+    where = []
+    params = []
+    if query_data.get("since") is not None:
+        where.append("e.created_at >= %s")
+        params.append(query_data["since"])
+    if query_data.get("until") is not None:
+        where.append("e.created_at < %s")
+        params.append(query_data["until"])
+    if query_data.get("borger_id") is not None:
+        where.append("e.borger_id = %s")
+        params.append(query_data["borger_id"])
+    return where, params
+
+
+def list_events(kind: str, query_data: dict):
+    """
+    Returnerer én side events, nyeste først, sorteret på (created_at, id).
+    Næste side hentes med WHERE (created_at, id) < cursor, så prisen pr. side
+    er den samme uanset tabellens størrelse.
+    """
+    sql, params = list_events_query(kind, query_data)
     conn = get_db_connection()
     try:
         with conn:
-            with conn.cursor() as cur:
-                try:
-                    cur.execute(
-                        """
-                        INSERT INTO vibration_events (borger_id, signaled)
-                        VALUES (%s, %s);
-                        """,
-                        (borger_id, signaled),
-                    )
-                except ForeignKeyViolation:
-                    abort(400, "Ukendt borger_id.")
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
     finally:
         conn.close()
 
-    return {"status": "ok"}, 201
-
+    rows, next_cursor = split_page(rows, query_data["limit"])
+    names = borger_names({r["borger_id"] for r in rows})
+    events = []
+    for r in rows:
+        event = dict(r)
+        event["navn"] = names.get(r["borger_id"])
+        events.append(event)
+    return {"events": events, "next_cursor": next_cursor}
+
+
+def list_events_query(kind: str, query_data: dict) -> tuple[str, list]:
+    """SQL og parametre for én side af list_events."""
+    table, column, _ = EVENT_TYPES[kind]
+
+    where, params = event_filters(query_data)
+    if query_data.get("cursor"):
+        where.append("(e.created_at, e.id) < (%s, %s)")
+        params.extend(decode_cursor(query_data["cursor"]))
+
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    params.append(query_data["limit"] + 1)  # én ekstra række fortæller om der er en næste side
+    sql = f"""
+        SELECT e.id,
+               e.borger_id,
+               e.{column},
+               e.created_at
+        FROM {table} e
+        {where_sql}
+        ORDER BY e.created_at DESC, e.id DESC
+        LIMIT %s;
+        """
+    return sql, params
+
+
+def split_page(rows: list, limit: int) -> tuple[list, str | None]:
+    """Skærer den ekstra række fra og laver next_cursor ud fra sidste række."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last["created_at"], last["id"])
 
 
 @app.get("/box-events")
-def get_box_events():
+@app.input(EventQueryIn, location="query")
+def get_box_events(query_data):
+    return list_events("box", query_data)
+
+
+@app.get("/pulse-events")
+@app.input(EventQueryIn, location="query")
+def get_pulse_events(query_data):
+    return list_events("pulse", query_data)
+
+
+@app.get("/vibration-events")
+@app.input(EventQueryIn, location="query")
+def get_vibration_events(query_data):
+    return list_events("vibration", query_data)
+
+
+# ---------- ROUTES: EKSPORT (streaming) ----------
+
+def export_events(kind: str, query_data: dict):
+    """
+    Streamer hele historikken som JSON.
+    Rækkerne hentes via en navngiven (server-side) cursor i bidder af
+    EXPORT_ITERSIZE, så hukommelsen er konstant og første byte sendes med det samme.
+    """
+    table, column, _ = EVENT_TYPES[kind]
+    where, params = event_filters(query_data)
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    itersize = app.config["EXPORT_ITERSIZE"]
+
+    # Lån forbindelsen før svaret starter, så en fuld pool stadig giver 503
+    directory = get_borger_directory()
     conn = get_db_connection()
-    try:
+
+    def generate():
         with conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            with conn.cursor(
+                name=f"export_{kind}", cursor_factory=psycopg2.extras.DictCursor
+            ) as cur:
+                cur.itersize = itersize
                 cur.execute(
-                    """
-                    SELECT b.navn,
-                           e.box_open,
+                    f"""
+                    SELECT e.id,
+                           e.borger_id,
+                           e.{column},
                            e.created_at
-                    FROM box_events e
-                    JOIN borger b ON e.borger_id = b.id
-                    ORDER BY e.created_at DESC;
-                    """
+                    FROM {table} e
+                    {where_sql}
+                    ORDER BY e.created_at DESC, e.id DESC;
+                    """,
+                    params,
                 )
-                rows = cur.fetchall()
+                yield '{"events": ['
+                chunk = []
+                sep = ""
+                for row in cur:
+                    event = dict(row)
+                    navn = directory.get(event["borger_id"])
+                    if navn is None:
+                        navn = borger_names([event["borger_id"]], conn=conn).get(event["borger_id"])
+                    event["navn"] = navn
+                    chunk.append(sep + app.json.dumps(event))
+                    sep = ","
+                    if len(chunk) >= itersize:
+                        yield "".join(chunk)
+                        chunk = []
+                if chunk:
+                    yield "".join(chunk)
+                yield "]}"
+
+    response = app.response_class(generate(), mimetype="application/json")
+    # Forbindelsen afleveres når svaret lukkes – også hvis klienten afbryder
+    response.call_on_close(conn.close)
+    return response
+
+
+@app.get("/box-events/export")
+@app.input(EventExportIn, location="query")
+def export_box_events(query_data):
+    return export_events("box", query_data)
+
+
+@app.get("/pulse-events/export")
+@app.input(EventExportIn, location="query")
+def export_pulse_events(query_data):
+    return export_events("pulse", query_data)
+
+
+@app.get("/vibration-events/export")
+@app.input(EventExportIn, location="query")
+def export_vibration_events(query_data):
+    return export_events("vibration", query_data)
+
+
+# ---------- KOMMANDOER: SKEMA ----------
+@app.cli.command("init-db")
+def init_db_command():
+    """Opretter/migrerer skemaet og de næste måneders partitioner."""
+    conn = get_db_connection()
+    try:
+        applied = schema.migrate(conn)
+        created = schema.ensure_partitions(conn, app.config["PARTITION_MONTHS_AHEAD"])
     finally:
         conn.close()
-    return {"events": [dict(r) for r in rows]}
+    print("Migrationer kørt:", applied or "ingen")
+    print("Nye partitioner:", created or "ingen")
 
 
-@app.get("/pulse-events")
-def get_pulse_events():
+@app.cli.command("ensure-partitions")
+def ensure_partitions_command():
+    """Opretter manglende partitioner frem i tiden (kør fx dagligt)."""
     conn = get_db_connection()
     try:
-        with conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute(
-                    """
-                    SELECT b.navn,
-                           e.bpm,
-                           e.created_at
-                    FROM pulse_events e
-                    JOIN borger b ON e.borger_id = b.id
-                    ORDER BY e.created_at DESC;
-                    """
-                )
-                rows = cur.fetchall()
+        created = schema.ensure_partitions(conn, app.config["PARTITION_MONTHS_AHEAD"])
     finally:
         conn.close()
-    return {"events": [dict(r) for r in rows]}
+    print("Nye partitioner:", created or "ingen")
 
 
-@app.get("/vibration-events")
-def get_vibration_events():
+@app.cli.command("rebuild-pulse-rollups")
+@click.option("--days", type=int, default=None, help="Kun de seneste N døgn (standard: alt).")
+def rebuild_pulse_rollups_command(days):
+    """Genberegner puls-rollups fra pulse_events (compaction)."""
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
     conn = get_db_connection()
     try:
         with conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute(
-                    """
-                    SELECT b.navn,
-                           e.signaled,
-                           e.created_at
-                    FROM vibration_events e
-                    JOIN borger b ON e.borger_id = b.id
-                    ORDER BY e.created_at DESC;
-                    """
-                )
-                rows = cur.fetchall()
+            with conn.cursor() as cur:
+                pulse_rollups.rebuild_rollups(cur, since)
     finally:
         conn.close()
-    return {"events": [dict(r) for r in rows]}
+    print("Puls-rollups genberegnet", f"for de seneste {days} døgn" if days else "for alt")
+
+
+def _partition_maintenance():
+    """Baggrundstråd: sikrer partitioner ved start og derefter med fast interval."""
+    while True:
+        try:
+            conn = get_db_connection()
+            try:
+                schema.ensure_partitions(conn, app.config["PARTITION_MONTHS_AHEAD"])
+            finally:
+                conn.close()
+        except psycopg2.Error:
+            app.logger.exception("Kunne ikke oprette partitioner")
+        time.sleep(app.config["PARTITION_CHECK_INTERVAL"])
+
+
+def start_partition_maintenance():
+    threading.Thread(
+        target=_partition_maintenance, name="partition-maintenance", daemon=True
+    ).start()
+
+
+# ---------- UDP-TELEMETRI ----------
+_udp_listener = None
+
+
+def start_udp_listener() -> UdpListener:
+    """Starter UDP-listeneren; events går gennem write-behind-køen."""
+    global _udp_listener
+    if _udp_listener is None:
+        _udp_listener = UdpListener(
+            app.config["SECRET_KEY"],
+            submit=get_ingest_queue().put,
+            is_device=lambda device_id: get_user_by_id(device_id) is not None,
+            host=app.config["UDP_HOST"],
+            port=app.config["UDP_PORT"],
+        )
+        _udp_listener.start()
+        atexit.register(_udp_listener.stop)
+    return _udp_listener
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    start_partition_maintenance()
+    # debug=True kører scriptet to gange (reloader) – kun barneprocessen må binde porten
+    if app.config["UDP_LISTEN"] and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_udp_listener()
+    socketio.run(app, host="0.0.0.0", port=5000, debug=True)
 
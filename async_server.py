@@ -0,0 +1,299 @@
+# async_server.py
+"""
+Asynkron serving-mode for ingest-routes og event-lister (aiohttp + asyncpg).
+
+Samme routes, schemas og Bearer-auth som app.py, men hver forbindelse
+koster en coroutine i stedet for en tråd, og ventetid på PostgreSQL
+blokerer ikke andre requests. Én proces kan dermed holde tusindvis af
+langsomme ESP32-forbindelser åbne samtidig.
+
+Dashboard, borger-CRUD og tokens serveres stadig af app.py; events gemt
+her skubbes ikke live til dashboards i Flask-processen. Tokens fra app.py
+godkendes kun hvis begge processer har samme IOMT_SECRET_KEY.
+
+Kør:  IOMT_SECRET_KEY=... python async_server.py --port 8080
+"""
+import argparse
+import asyncio
+import functools
+
+import asyncpg
+from aiohttp import web
+from apiflask.exceptions import HTTPError
+from marshmallow import ValidationError
+
+import event_codec
+import pulse_rollups
+import schema
+from app import (
+    DB_SETTINGS, EVENT_TYPES, BoxEventIn, EventBatchIn, EventQueryIn, PulseEventIn,
+    VibrationEventIn, app, batch_response, borger_directory, list_events_query,
+    parse_batch_items, parse_binary_batch, split_page, verify_token,
+)
+from borger_directory import BorgerListener
+
+# Postgres-type for værdikolonnen pr. event-type (til unnest ved batch-insert)
+_VALUE_TYPES = {
+    kind: schema.EVENT_TABLES[table].split()[1].lower()
+    for kind, (table, _, _) in EVENT_TYPES.items()
+}
+
+_INGEST_ROUTES = {
+    "/box-event": ("box", BoxEventIn),
+    "/pulse-event": ("pulse", PulseEventIn),
+    "/vibration-event": ("vibration", VibrationEventIn),
+}
+
+_LIST_ROUTES = {
+    "/box-events": "box",
+    "/pulse-events": "pulse",
+    "/vibration-events": "vibration",
+}
+
+POOL = web.AppKey("pool", asyncpg.Pool)
+
+
+# ---------- SVAR OG FEJL ----------
+def json_response(body, status: int = 200, headers=None) -> web.Response:
+    """JSON med Flasks encoder, så datoer m.m. ser ud som fra app.py."""
+    return web.Response(
+        text=app.json.dumps(body), status=status, headers=headers,
+        content_type="application/json",
+    )
+
+
+def error_response(status: int, message: str, detail=None, headers=None) -> web.Response:
+    """Samme fejlformat som APIFlask: {"detail": ..., "message": ...}."""
+    return json_response({"detail": detail or {}, "message": message}, status, headers)
+
+
+@web.middleware
+async def error_middleware(request, handler):
+    try:
+        return await handler(request)
+    except HTTPError as err:
+        # abort() fra fælles hjælpefunktioner i app.py (fx decode_cursor)
+        return error_response(err.status_code, err.message, err.detail, err.headers)
+    except asyncio.TimeoutError:
+        return error_response(503, "Databasen er optaget, prøv igen.", headers={"Retry-After": "1"})
+
+
+def login_required(handler):
+    """Bearer-token som auth.login_required i app.py."""
+    @functools.wraps(handler)
+    async def wrapper(request):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token or verify_token(token) is None:
+            return error_response(401, "Unauthorized",
+                                  headers={"WWW-Authenticate": 'Bearer realm="Authentication Required"'})
+        return await handler(request)
+    return wrapper
+
+
+async def load_json(request, schema_cls):
+    """Body valideret med app.py's schema; fejl som APIFlask (422)."""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPError(400, "Ugyldig JSON.")
+    try:
+        return schema_cls().load(data)
+    except ValidationError as err:
+        raise HTTPError(422, "Validation error", {"json": err.messages})
+
+
+def load_query(request, schema_cls):
+    try:
+        return schema_cls().load(dict(request.query))
+    except ValidationError as err:
+        raise HTTPError(422, "Validation error", {"query": err.messages})
+
+
+def acquire(request):
+    """Forbindelse fra asyncpg-poolen; timeout giver 503 som i app.py."""
+    return request.app[POOL].acquire(timeout=app.config["DB_POOL_TIMEOUT"])
+
+
+def _numbered(sql: str) -> str:
+    """psycopg2's %s -> asyncpg's $1, $2, ..."""
+    parts = sql.split("%s")
+    return "".join(p + (f"${i}" if i < len(parts) else "") for i, p in enumerate(parts, 1))
+
+
+# ---------- BORGER-KATALOG ----------
+async def borger_names(conn, ids) -> dict:
+    """Navne fra borger-kataloget; manglende id'er slås op i ét kald."""
+    missing = borger_directory.missing(ids)
+    if missing:
+        rows = await conn.fetch("SELECT id, navn FROM borger WHERE id = ANY($1);", sorted(missing))
+        for row in rows:
+            borger_directory.set(row["id"], row["navn"])
+    return {i: borger_directory.get(i) for i in ids if borger_directory.get(i) is not None}
+
+
+async def borger_exists(conn, borger_id: int) -> bool:
+    known = borger_directory.known(borger_id)
+    if known is not None:
+        return known
+    return bool(await borger_names(conn, [borger_id]))
+
+
+async def _load_borger_directory(pool):
+    rows = await pool.fetch("SELECT id, navn FROM borger;")
+    borger_directory.load((r["id"], r["navn"]) for r in rows)
+
+
+async def _on_borger_changed(pool, borger_id: int):
+    navn = await pool.fetchval("SELECT navn FROM borger WHERE id = $1;", borger_id)
+    if navn is None:
+        borger_directory.remove(borger_id)
+    else:
+        borger_directory.set(borger_id, navn)
+
+
+# ---------- INDSÆTTELSE ----------
+async def insert_events(conn, kind: str, rows: list) -> list:
+    """
+    Som insert_events i app.py: rækker (borger_id, værdi, created_at|None)
+    i én INSERT via unnest, inkl. puls-rollups i samme transaktion.
+    """
+    table, column, _ = EVENT_TYPES[kind]
+    inserted = await conn.fetch(
+        f"""
+        INSERT INTO {table} (borger_id, {column}, created_at)
+        SELECT b, v, COALESCE(c, now())
+        FROM unnest($1::integer[], $2::{_VALUE_TYPES[kind]}[], $3::timestamptz[]) AS x(b, v, c)
+        RETURNING id, borger_id, {column}, created_at;
+        """,
+        [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+    )
+    if kind == "pulse" and app.config["PULSE_ROLLUPS"]:
+        measurements = [(r["borger_id"], r["bpm"], r["created_at"]) for r in inserted]
+        for granularity, (rollup_table, _) in pulse_rollups.ROLLUP_TABLES.items():
+            await conn.executemany(
+                pulse_rollups.upsert_sql(rollup_table, "($1, $2, $3, $4, $5, $6, $7)"),
+                pulse_rollups.aggregate(measurements, granularity),
+            )
+    return inserted
+
+
+async def store_events(conn, events: list) -> list:
+    """Som store_events i app.py; returnerer True/False pr. event."""
+    known = await conn.fetch(
+        "SELECT id FROM borger WHERE id = ANY($1) FOR KEY SHARE;",
+        sorted({borger_id for _, borger_id, _, _ in events}),
+    )
+    known_ids = {r["id"] for r in known}
+
+    results = []
+    rows_by_kind = {}
+    for kind, borger_id, value, created_at in events:
+        ok = borger_id in known_ids
+        if ok:
+            rows_by_kind.setdefault(kind, []).append((borger_id, value, created_at))
+        results.append(ok)
+    for kind, rows in rows_by_kind.items():
+        await insert_events(conn, kind, rows)
+    return results
+
+
+# ---------- ROUTES ----------
+def ingest_handler(kind: str, schema_cls):
+    column = EVENT_TYPES[kind][1]
+
+    @login_required
+    async def handler(request):
+        data = await load_json(request, schema_cls)
+        async with acquire(request) as conn:
+            if not await borger_exists(conn, data["borger_id"]):
+                raise HTTPError(400, "Ukendt borger_id.")
+            try:
+                async with conn.transaction():
+                    await insert_events(conn, kind, [(data["borger_id"], data[column], None)])
+            except asyncpg.ForeignKeyViolationError:
+                raise HTTPError(400, "Ukendt borger_id.")
+        return json_response({"status": "ok"}, 201)
+    return handler
+
+
+@login_required
+async def events_batch(request):
+    if request.content_type == event_codec.MIMETYPE:
+        results, parsed = parse_binary_batch(await request.read())
+    else:
+        json_data = await load_json(request, EventBatchIn)
+        items = json_data["events"]
+        if len(items) > app.config["BATCH_MAX_EVENTS"]:
+            raise HTTPError(413, f"Højst {app.config['BATCH_MAX_EVENTS']} events pr. batch.")
+        results, parsed = parse_batch_items(items)
+    stored = []
+    if parsed:
+        async with acquire(request) as conn:
+            async with conn.transaction():
+                stored = await store_events(conn, [event for _, event in parsed])
+    body, status = batch_response(results, parsed, stored)
+    return json_response(body, status)
+
+
+def list_handler(kind: str):
+    async def handler(request):
+        query_data = load_query(request, EventQueryIn)
+        sql, params = list_events_query(kind, query_data)
+        async with acquire(request) as conn:
+            rows = await conn.fetch(_numbered(sql), *params)
+            rows, next_cursor = split_page(rows, query_data["limit"])
+            names = await borger_names(conn, {r["borger_id"] for r in rows})
+        events = [dict(r, navn=names.get(r["borger_id"])) for r in rows]
+        return json_response({"events": events, "next_cursor": next_cursor})
+    return handler
+
+
+# ---------- OPSTART ----------
+async def _db_context(aioapp):
+    pool = await asyncpg.create_pool(
+        host=DB_SETTINGS["host"],
+        port=int(DB_SETTINGS["port"]),
+        database=DB_SETTINGS["dbname"],
+        user=DB_SETTINGS["user"],
+        password=DB_SETTINGS["password"],
+        min_size=app.config["DB_POOL_MIN"],
+        max_size=app.config["ASYNC_DB_POOL_MAX"],
+    )
+    aioapp[POOL] = pool
+    await _load_borger_directory(pool)
+
+    listener = None
+    if app.config["BORGER_LISTEN"]:
+        loop = asyncio.get_running_loop()
+        listener = BorgerListener(
+            borger_directory,
+            on_change=lambda borger_id: asyncio.run_coroutine_threadsafe(
+                _on_borger_changed(pool, borger_id), loop).result(),
+            on_resync=lambda: asyncio.run_coroutine_threadsafe(
+                _load_borger_directory(pool), loop).result(),
+            **DB_SETTINGS,
+        )
+        listener.start()
+    yield
+    if listener is not None:
+        listener.stop()
+    await pool.close()
+
+
+def create_app() -> web.Application:
+    aioapp = web.Application(middlewares=[error_middleware])
+    for path, (kind, schema_cls) in _INGEST_ROUTES.items():
+        aioapp.router.add_post(path, ingest_handler(kind, schema_cls))
+    aioapp.router.add_post("/events/batch", events_batch)
+    for path, kind in _LIST_ROUTES.items():
+        aioapp.router.add_get(path, list_handler(kind))
+    aioapp.cleanup_ctx.append(_db_context)
+    return aioapp
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asynkron ingest-server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
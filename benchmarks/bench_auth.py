@@ -0,0 +1,62 @@
+# benchmarks/bench_auth.py
+"""
+Micro-benchmark af auth-hotpath: verify_token med og uden token-cache,
+og enhedsopslag via listescanning kontra dict.
+
+Kør:  python benchmarks/bench_auth.py
+Kræver ingen database.
+"""
+import sys
+import os
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import User, app, token_cache, users, verify_token
+
+N = 20000
+
+
+def _per_call_us(stmt, number: int = N) -> float:
+    best = min(timeit.repeat(stmt, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    token = users[0].get_token()
+
+    def cold():
+        token_cache.clear()
+        verify_token(token)
+
+    def warm():
+        verify_token(token)
+
+    verify_token(token)
+    cold_us = _per_call_us(cold)
+    warm_us = _per_call_us(warm)
+
+    # Enhedsopslag med en stor flåde
+    fleet = [User(i, f"enhed {i}") for i in range(10000)]
+    fleet_by_id = {u.id: u for u in fleet}
+    wanted = 9999
+
+    def list_scan():
+        matches = [u for u in fleet if u.id == wanted]
+        return matches[0] if matches else None
+
+    def dict_lookup():
+        return fleet_by_id.get(wanted)
+
+    scan_us = _per_call_us(list_scan, number=200)
+    dict_us = _per_call_us(dict_lookup)
+
+    print(f"verify_token uden cache (jwt.decode): {cold_us:8.2f} µs/kald")
+    print(f"verify_token med cache:               {warm_us:8.2f} µs/kald  ({cold_us / warm_us:.0f}x)")
+    print(f"enhedsopslag, listescanning (10k):    {scan_us:8.2f} µs/kald")
+    print(f"enhedsopslag, dict (10k):             {dict_us:8.2f} µs/kald  ({scan_us / dict_us:.0f}x)")
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        main()
@@ -0,0 +1,217 @@
+# benchmarks/bench_hotpath.py
+"""
+Micro-benchmarks af ingest-requestens hotpath, trin for trin og samlet:
+verify_token, validering af BoxEventIn, borger-opslag, get_db_connection,
+INSERT, JSON-svaret og hele POST /box-event gennem Flask-testklienten.
+
+Resultaterne sammenlignes med en baseline-fil, og kørslen fejler (status 1),
+hvis et trin er blevet mere end tærsklen langsommere.
+
+Kør:  python benchmarks/bench_hotpath.py                  # sammenlign med baseline
+      python benchmarks/bench_hotpath.py --save           # gem ny baseline
+      python benchmarks/bench_hotpath.py --threshold 0.2 --stage-threshold insert=0.5
+Kræver PostgreSQL (DB_SETTINGS i app.py) med migreret skema.
+Baseline-tallene afhænger af maskinen – gem en ny baseline på den maskine
+der sammenlignes på.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_hotpath.json")
+
+# Tilladt forværring (andel) før et trin tæller som regression
+DEFAULT_THRESHOLD = 0.30
+# Trin der går over databasen svinger mere, og trin på omkring ét µs er mest timer-støj
+STAGE_THRESHOLDS = {
+    "verify_token_cached": 1.0,
+    "borger_lookup": 1.0,
+    "db_connection": 0.5,
+    "insert": 0.5,
+    "end_to_end": 0.5,
+}
+
+
+def _per_call_us(func, number: int, repeat: int = 5) -> float:
+    """Bedste af `repeat` gentagelser, i µs pr. kald (som bench_auth.py)."""
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+def run_stages(borger_id: int, scale: float = 1.0) -> dict:
+    """Måler hvert trin isoleret. Returnerer {trin: µs pr. kald}."""
+    from app import (BoxEventIn, app, borger_exists, get_db_connection, insert_events,
+                     token_cache, users, verify_token)
+
+    token = users[0].get_token()
+    payload = {"borger_id": borger_id, "box_open": True}
+    schema = BoxEventIn()
+
+    def verify_cold():
+        token_cache.clear()
+        verify_token(token)
+
+    def verify_cached():
+        verify_token(token)
+
+    def validate():
+        schema.load(payload)
+
+    def borger_lookup():
+        borger_exists(borger_id)
+
+    def db_connection():
+        get_db_connection().close()
+
+    conn = get_db_connection()
+
+    def insert():
+        with conn:
+            with conn.cursor() as cur:
+                insert_events(cur, "box", [(borger_id, True, None)])
+
+    def json_response():
+        app.make_response(({"status": "ok"}, 201)).get_data()
+
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def end_to_end():
+        response = client.post("/box-event", json=payload, headers=headers)
+        if response.status_code != 201:
+            raise RuntimeError(f"POST /box-event gav {response.status_code}")
+
+    stages = [
+        ("verify_token_cold", verify_cold, 2000),
+        ("verify_token_cached", verify_cached, 20000),
+        ("validate_box_event", validate, 5000),
+        ("borger_lookup", borger_lookup, 20000),
+        ("db_connection", db_connection, 2000),
+        ("insert", insert, 300),
+        ("json_response", json_response, 5000),
+        ("end_to_end", end_to_end, 300),
+    ]
+
+    results = {}
+    try:
+        with app.test_request_context():
+            verify_token(token)
+            for name, func, number in stages:
+                func()  # opvarmning
+                results[name] = round(_per_call_us(func, max(1, int(number * scale))), 2)
+    finally:
+        conn.close()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float, stage_thresholds: dict) -> list:
+    """
+    Sammenligner med baseline. Returnerer [(trin, µs, baseline-µs, ændring, tærskel, regression)]
+    for alle trin der findes i begge.
+    """
+    rows = []
+    for name, us in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        limit = stage_thresholds.get(name, threshold)
+        change = us / base - 1
+        rows.append((name, us, base, change, limit, change > limit))
+    return rows
+
+
+def _create_borger() -> int:
+    from app import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("INSERT INTO borger (navn) VALUES ('Benchmark hotpath') RETURNING id;")
+                return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _delete_borger(borger_id: int):
+    from app import get_db_connection, get_borger_directory
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM borger WHERE id = %s;", (borger_id,))
+    finally:
+        conn.close()
+    get_borger_directory().remove(borger_id)
+
+
+def _parse_stage_thresholds(values: list) -> dict:
+    thresholds = dict(STAGE_THRESHOLDS)
+    for value in values:
+        name, _, fraction = value.partition("=")
+        thresholds[name] = float(fraction)
+    return thresholds
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="gem resultaterne som ny baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="tilladt forværring, fx 0.3 = 30%% langsommere")
+    parser.add_argument("--stage-threshold", action="append", default=[], metavar="TRIN=ANDEL",
+                        help="tærskel for ét trin (kan gentages)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="gang antal kald pr. trin med denne faktor (hurtig kørsel: 0.1)")
+    args = parser.parse_args(argv)
+
+    borger_id = _create_borger()
+    try:
+        results = run_stages(borger_id, args.scale)
+    finally:
+        _delete_borger(borger_id)
+
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "stages_us": results}, f, indent=2)
+            f.write("\n")
+        for name, us in results.items():
+            print(f"{name:22s} {us:10.2f} µs")
+        print(f"Baseline gemt i {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["stages_us"]
+    except FileNotFoundError:
+        baseline = {}
+        print(f"Ingen baseline ({args.baseline}) – kør med --save først")
+
+    rows = {row[0]: row for row in compare(
+        results, baseline, args.threshold, _parse_stage_thresholds(args.stage_threshold))}
+    regressions = []
+    for name, us in results.items():
+        if name not in rows:
+            print(f"{name:22s} {us:10.2f} µs")
+            continue
+        _, _, base, change, limit, regressed = rows[name]
+        mark = f"REGRESSION (> {limit:+.0%})" if regressed else ""
+        print(f"{name:22s} {us:10.2f} µs  baseline {base:10.2f} µs  {change:+7.1%}  {mark}")
+        if regressed:
+            regressions.append(name)
+
+    if regressions:
+        print("Langsommere end baseline:", ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# benchmarks/bench_server.py
+"""
+Sammenligner den synkrone Flask-server med async_server.py under mange
+samtidige enheder: hver "enhed" sender pulse-events i løkke, evt. med en
+kunstig langsom upload (--slow), som en ESP32 på dårlig WiFi.
+
+Kør:  python benchmarks/bench_server.py --devices 200 --seconds 10
+Kræver PostgreSQL (DB_SETTINGS i app.py) med migreret skema.
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+FLASK_CMD = [
+    sys.executable, "-c",
+    "import sys; from app import app; app.run(port=int(sys.argv[1]), threaded=True)",
+]
+ASYNC_CMD = [sys.executable, os.path.join(ROOT, "async_server.py"), "--host", "127.0.0.1", "--port"]
+
+
+def _delete_borgere(ids: list):
+    from app import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM borger WHERE id = ANY(%s);", (ids,))
+    finally:
+        conn.close()
+
+
+def _create_borgere(n: int) -> list:
+    """Én borger pr. enhed, så rollup-rækkerne ikke bliver et fælles låsepunkt."""
+    from app import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO borger (navn) SELECT 'Benchmark ' || i FROM generate_series(1, %s) i "
+                    "RETURNING id;",
+                    (n,),
+                )
+                return [r[0] for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+async def _wait_until_up(session, base: str):
+    for _ in range(100):
+        try:
+            async with session.get(base + "/pulse-events?limit=1") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"Serveren på {base} startede ikke")
+
+
+async def _device(session, base, token, borger_id, deadline, slow, latencies, errors):
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    body = json.dumps({"borger_id": borger_id, "bpm": 72}).encode()
+
+    async def slow_body():
+        # Sender kroppen i to dele med pause, så forbindelsen holdes åben
+        yield body[:8]
+        await asyncio.sleep(slow)
+        yield body[8:]
+
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            data = slow_body() if slow else body
+            async with session.post(base + "/pulse-event", data=data, headers=headers) as response:
+                await response.read()
+                if response.status != 201:
+                    errors.append(response.status)
+                    continue
+        except aiohttp.ClientError as err:
+            errors.append(type(err).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def _run_load(base: str, token: str, borger_ids: list, seconds: float, slow: float):
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await _wait_until_up(session, base)
+        latencies, errors = [], []
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(*(
+            _device(session, base, token, borger_id, deadline, slow, latencies, errors)
+            for borger_id in borger_ids
+        ))
+    return latencies, errors
+
+
+def _report(name: str, latencies: list, errors: list, seconds: float) -> dict:
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else None
+
+    result = {
+        "mode": name,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else None,
+    }
+    print(f"{name:6s} {result['rps']:8.1f} req/s  p50 {result['p50_ms'] or 0:7.1f} ms  "
+          f"p99 {result['p99_ms'] or 0:7.1f} ms  fejl {result['errors']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--slow", type=float, default=0.0,
+                        help="sekunders pause midt i hver upload (langsomme enheder)")
+    parser.add_argument("--modes", default="flask,async")
+    args = parser.parse_args()
+
+    env = dict(os.environ, IOMT_SECRET_KEY=os.environ.get("IOMT_SECRET_KEY", secrets.token_hex(32)))
+    os.environ["IOMT_SECRET_KEY"] = env["IOMT_SECRET_KEY"]
+    from app import users
+
+    token = users[0].get_token()
+    borger_ids = _create_borgere(args.devices)
+    commands = {"flask": (FLASK_CMD, 5051), "async": (ASYNC_CMD, 5052)}
+
+    results = []
+    try:
+        for mode in args.modes.split(","):
+            cmd, port = commands[mode]
+            proc = subprocess.Popen(cmd + [str(port)], cwd=ROOT, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                latencies, errors = asyncio.run(_run_load(
+                    f"http://127.0.0.1:{port}", token, borger_ids, args.seconds, args.slow))
+            finally:
+                proc.terminate()
+                proc.wait()
+            results.append(_report(mode, latencies, errors, args.seconds))
+    finally:
+        _delete_borgere(borger_ids)
+
+    print(json.dumps({"devices": args.devices, "slow": args.slow, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
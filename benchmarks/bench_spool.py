@@ -0,0 +1,58 @@
+# benchmarks/bench_spool.py
+"""
+Benchmark af enheds-spoolen (ESP32_koder/spool.py) under CPython:
+push/commit-hastighed mod en fil, og hvor mange bytes/requests en
+batch-upload koster i forhold til ét JSON-POST pr. event.
+
+Kør:  python benchmarks/bench_spool.py
+Kræver ingen database. Tallene er for en PC – på ESP32 er flash langt
+langsommere, men forholdet mellem batch og enkelt-POST er det samme.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "ESP32_koder"))
+
+from spool import Spool, upload_once
+
+N = 5000
+BATCH = 50
+# Typiske request-headers fra urequests (linje + Host, Content-Type, Authorization m. JWT)
+HTTP_OVERHEAD = 330
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = Spool(os.path.join(tmp, "spool.bin"), capacity=N)
+
+        start = time.perf_counter()
+        for i in range(N):
+            spool.push("pulse", 1, 60 + i % 40, 1709287200 + i)
+        push_us = (time.perf_counter() - start) / N * 1e6
+
+        bodies = []
+        start = time.perf_counter()
+        while upload_once(spool, lambda body: bodies.append(body) or 201, BATCH) != "empty":
+            pass
+        drain_us = (time.perf_counter() - start) / N * 1e6
+        spool.close()
+
+    batch_bytes = sum(len(b) + HTTP_OVERHEAD for b in bodies)
+    json_bytes = sum(
+        len(json.dumps({"borger_id": 1, "bpm": 60 + i % 40})) + HTTP_OVERHEAD for i in range(N)
+    )
+
+    print(f"push til spool:        {push_us:8.2f} µs/event")
+    print(f"batch + commit:        {drain_us:8.2f} µs/event")
+    print(f"batch-upload:          {len(bodies):6d} requests {batch_bytes / 1024:8.1f} KiB")
+    print(f"JSON, ét POST/event:   {N:6d} requests {json_bytes / 1024:8.1f} KiB "
+          f"({json_bytes / batch_bytes:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# borger_directory.py
+"""
+In-process opslag af borgere (id -> navn).
+
+Bruges til at afvise ukendte borger_id'er før databasen kaldes, og til at
+sætte navne på events uden JOIN mod borger. Kataloget holdes opdateret af
+CRUD-routes i samme proces. Med BorgerListener (PostgreSQL LISTEN/NOTIFY)
+opdateres det også når en anden proces ændrer en borger – kun da er
+kataloget "autoritativt", så et ukendt id kan afvises helt uden DB-kald.
+"""
+import logging
+import select
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "borger_changed"
+
+
+class BorgerDirectory:
+    """Trådsikkert katalog id -> navn."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self.loaded = False
+        # True mens en LISTEN-forbindelse holder kataloget i sync på tværs af processer
+        self.authoritative = False
+
+    def load(self, rows):
+        """Erstatter kataloget med rækker (id, navn)."""
+        names = {borger_id: navn for borger_id, navn in rows}
+        with self._lock:
+            self._names = names
+            self.loaded = True
+
+    def get(self, borger_id: int) -> str | None:
+        return self._names.get(borger_id)
+
+    def known(self, borger_id: int) -> bool | None:
+        """
+        True/False hvis kataloget kan svare sikkert,
+        None hvis id'et mangler og kataloget ikke er autoritativt.
+        """
+        if borger_id in self._names:
+            return True
+        return False if self.authoritative else None
+
+    def missing(self, ids) -> set:
+        return {i for i in ids if i not in self._names}
+
+    def set(self, borger_id: int, navn: str):
+        with self._lock:
+            self._names[borger_id] = navn
+
+    def remove(self, borger_id: int):
+        with self._lock:
+            self._names.pop(borger_id, None)
+
+    def __len__(self):
+        return len(self._names)
+
+
+class BorgerListener(threading.Thread):
+    """
+    Baggrundstråd der lytter på NOTIFY borger_changed.
+    on_change(borger_id) kaldes for hver ændring, on_resync() efter (gen)forbindelse,
+    fordi notifikationer sendt mens vi var afkoblet er tabt.
+    """
+
+    def __init__(self, directory: BorgerDirectory, on_change, on_resync,
+                 poll_interval: float = 5.0, **connect_kwargs):
+        super().__init__(name="borger-listener", daemon=True)
+        self.directory = directory
+        self.on_change = on_change
+        self.on_resync = on_resync
+        self.poll_interval = poll_interval
+        self.connect_kwargs = connect_kwargs
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = 0.5
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.connect_kwargs)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+                self.on_resync()
+                self.directory.authoritative = True
+                backoff = 0.5
+                self._listen(conn)
+            except Exception:
+                logger.exception("Borger-listener mistede forbindelsen")
+            finally:
+                self.directory.authoritative = False
+                if conn is not None:
+                    conn.close()
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _listen(self, conn):
+        while not self._stop_event.is_set():
+            ready, _, _ = select.select([conn], [], [], self.poll_interval)
+            if not ready:
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    self.on_change(int(notify.payload))
+                except ValueError:
+                    logger.warning("Ugyldig borger_changed payload: %r", notify.payload)
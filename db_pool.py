@@ -0,0 +1,350 @@
+# db_pool.py
+"""
+Trådsikker connection-pool til PostgreSQL.
+
+Alle routes i app.py henter forbindelser via get_db_connection(), som låner
+en forbindelse her i stedet for at lave en ny psycopg2.connect() pr. request.
+conn.close() lægger forbindelsen tilbage i poolen, så eksisterende kode
+(try/finally: conn.close()) virker uændret. Hvert udlån er sit eget
+LeasedConnection-objekt, så et ekstra close() på et gammelt udlån ikke kan
+aflevere forbindelsen mens en anden tråd har lånt den.
+
+Cursors fra poolens forbindelser rapporterer hver execute() til de
+registrerede query-observere (add_query_observer), fx metrics.py. Uden
+observere koster det kun et tjek af en tom liste.
+"""
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolError(psycopg2.Error):
+    """Generel fejl i connection-poolen."""
+
+
+class PoolTimeout(PoolError):
+    """Ingen ledig forbindelse inden for timeout."""
+
+
+# ---------- QUERY-OBSERVERE ----------
+# Kaldes efter hver execute()/executemany() som fn(cursor, query, params, sekunder, fejl).
+# Listen erstattes ved ændring (copy-on-write), så execute() kan læse den uden lås.
+_query_observers = ()
+_observers_lock = threading.Lock()
+
+
+def add_query_observer(fn):
+    global _query_observers
+    with _observers_lock:
+        _query_observers = _query_observers + (fn,)
+
+
+def remove_query_observer(fn):
+    global _query_observers
+    with _observers_lock:
+        _query_observers = tuple(f for f in _query_observers if f is not fn)
+
+
+def _notify(cursor, query, params, seconds, error):
+    for fn in _query_observers:
+        try:
+            fn(cursor, query, params, seconds, error)
+        except Exception:
+            pass  # en observer må aldrig vælte en query
+
+
+class ObservedCursorMixin:
+    """Måler execute()/executemany() og giver besked til query-observerne."""
+
+    def execute(self, query, vars=None):
+        if not _query_observers:
+            return super().execute(query, vars)
+        start = time.perf_counter()
+        error = None
+        try:
+            return super().execute(query, vars)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _notify(self, query, vars, time.perf_counter() - start, error)
+
+    def executemany(self, query, vars_list):
+        if not _query_observers:
+            return super().executemany(query, vars_list)
+        start = time.perf_counter()
+        error = None
+        try:
+            return super().executemany(query, vars_list)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _notify(self, query, vars_list, time.perf_counter() - start, error)
+
+
+_observed_classes = {}
+
+
+def _observed(cursor_class):
+    """Cursor-klassen med ObservedCursorMixin foran (fx DictCursor -> ObservedDictCursor)."""
+    cls = _observed_classes.get(cursor_class)
+    if cls is None:
+        cls = type("Observed" + cursor_class.__name__, (ObservedCursorMixin, cursor_class), {})
+        _observed_classes[cursor_class] = cls
+    return cls
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    Den fysiske psycopg2-forbindelse i poolen.
+    cursor() giver cursors der rapporterer til query-observerne.
+    """
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _observed(factory)
+        return super().cursor(*args, **kwargs)
+
+
+class LeasedConnection:
+    """
+    Ét udlån af en PooledConnection; det getconn() returnerer.
+    Attributter og metoder sendes videre til forbindelsen (conn.connection).
+    close() afleverer forbindelsen tilbage i stedet for at lukke den, og kun
+    første gang – bagefter er udlånet lukket, og et nyt close() gør ingenting.
+    """
+
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, pool, conn: PooledConnection):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_pool", pool)
+
+    @property
+    def connection(self) -> PooledConnection:
+        return self._conn
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._pool is None else self._conn.closed
+
+    def close(self):
+        pool = self._pool
+        if pool is not None:
+            # Også når psycopg2 allerede har lukket den (fx efter en Postgres-genstart):
+            # putconn kasserer lukkede forbindelser og frigiver pladsen i poolen
+            pool.putconn(self)
+
+    def __getattr__(self, name):
+        if self._pool is None:
+            raise psycopg2.InterfaceError("Forbindelsen er afleveret til poolen.")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if self._pool is None:
+            raise psycopg2.InterfaceError("Forbindelsen er afleveret til poolen.")
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+
+class ConnectionPool:
+    """
+    Connection-pool med min/max størrelse, timeout ved udlån,
+    health-check af lånte forbindelser og simple tællere.
+
+    Argumenterne efter maxconn sendes videre til psycopg2.connect(),
+    ligesom i psycopg2.pool.ThreadedConnectionPool.
+    """
+
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        *args,
+        timeout: float = 5.0,
+        health_check_interval: float = 30.0,
+        **kwargs,
+    ):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise PoolError("Ugyldig poolstørrelse.")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._args = args
+        self._kwargs = kwargs
+        self._kwargs["connection_factory"] = PooledConnection
+
+        self._cond = threading.Condition()
+        self._idle = deque()        # (conn, tidspunkt for aflevering)
+        self._in_use = set()
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "health_check_failures": 0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._stats["connections_created"] += 1
+
+    # ---------- INTERNT ----------
+    def _connect(self) -> PooledConnection:
+        return psycopg2.connect(*self._args, **self._kwargs)
+
+    def _discard(self, conn):
+        self._stats["connections_discarded"] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        """Tjekker en forbindelse før udlån. SELECT 1 kun hvis den har ligget længe."""
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    # ---------- UDLÅN / AFLEVERING ----------
+    def getconn(self, timeout: float | None = None) -> LeasedConnection:
+        """Låner en forbindelse. Rejser PoolTimeout hvis poolen er udtømt for længe."""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        wait_start = 0.0
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Poolen er lukket.")
+
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    # Health-check uden at holde låsen
+                    self._in_use.add(conn)
+                    self._cond.release()
+                    try:
+                        healthy = self._is_healthy(conn, idle_since)
+                    finally:
+                        self._cond.acquire()
+                    if not healthy:
+                        self._in_use.discard(conn)
+                        self._stats["health_check_failures"] += 1
+                        self._discard(conn)
+                        continue
+                    break
+
+                if len(self._in_use) < self.maxconn:
+                    # Reservér pladsen før vi forbinder uden lås
+                    placeholder = object()
+                    self._in_use.add(placeholder)
+                    self._cond.release()
+                    try:
+                        conn = self._connect()
+                    except Exception:
+                        self._cond.acquire()
+                        self._in_use.discard(placeholder)
+                        self._cond.notify()
+                        raise
+                    self._cond.acquire()
+                    self._in_use.discard(placeholder)
+                    self._in_use.add(conn)
+                    self._stats["connections_created"] += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    if waited:
+                        self._stats["wait_time"] += time.monotonic() - wait_start
+                    raise PoolTimeout(
+                        f"Ingen ledig databaseforbindelse efter {timeout:.1f} s."
+                    )
+                if not waited:
+                    waited = True
+                    wait_start = time.monotonic()
+                    self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["wait_time"] += time.monotonic() - wait_start
+        return LeasedConnection(self, conn)
+
+    def putconn(self, lease: LeasedConnection, close: bool = False):
+        """
+        Afleverer et udlån. Åbne transaktioner rulles tilbage.
+        Et udlån der allerede er afleveret ignoreres.
+        """
+        with self._cond:
+            if not isinstance(lease, LeasedConnection):
+                raise PoolError("Forbindelsen tilhører ikke poolen.")
+            if lease._pool is None:
+                return  # allerede afleveret; forbindelsen kan være lånt ud igen
+            if lease._pool is not self or lease._conn not in self._in_use:
+                raise PoolError("Forbindelsen tilhører ikke poolen.")
+            object.__setattr__(lease, "_pool", None)
+            conn = lease._conn
+            self._in_use.discard(conn)
+
+            if not close and not self._closed and not conn.closed:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        close = True
+
+            if close or self._closed or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Lukker alle ledige forbindelser. Udlånte lukkes ved aflevering."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Øjebliksbillede af tællere og poolstørrelse."""
+        with self._cond:
+            data = dict(self._stats)
+            data["idle"] = len(self._idle)
+            data["in_use"] = len(self._in_use)
+            data["minconn"] = self.minconn
+            data["maxconn"] = self.maxconn
+        return data
@@ -0,0 +1,92 @@
+# event_codec.py
+"""
+Kompakt binært format for events fra ESP32 til /events/batch.
+
+Bruges både af serveren og af MicroPython-scripts (kopiér filen over på
+ESP32'en ved siden af main_boks.py/main_signal.py), så den må kun bruge
+struct og time.
+
+Body (little-endian):
+    header  "IE", version (uint8), antal records (uint16)     5 bytes
+    record  type (uint8), borger_id (uint32),
+            værdi (int16), tidspunkt (uint32, unix-sekunder)  11 bytes
+
+type: 1 = box (værdi 0/1), 2 = pulse (bpm), 3 = vibration (værdi 0/1).
+Tidspunkt 0 betyder "brug serverens tid".
+Sendes med Content-Type: application/vnd.iomt.events
+"""
+import struct
+import time
+
+MIMETYPE = "application/vnd.iomt.events"
+
+MAGIC = b"IE"
+VERSION = 1
+HEADER = "<2sBH"
+RECORD = "<BIhI"
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD_SIZE = struct.calcsize(RECORD)
+MAX_RECORDS = 0xFFFF
+
+TYPE_CODES = {"box": 1, "pulse": 2, "vibration": 3}
+TYPE_NAMES = {code: kind for kind, code in TYPE_CODES.items()}
+_BOOLEAN_TYPES = ("box", "vibration")
+
+# MicroPython på ESP32 tæller fra 2000-01-01, CPython fra 1970-01-01
+EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+
+
+class CodecError(ValueError):
+    pass
+
+
+def unix_time():
+    """Unix-tid i hele sekunder på både CPython og MicroPython."""
+    return int(time.time()) + EPOCH_OFFSET
+
+
+def encode(records):
+    """
+    records: [(type, borger_id, værdi, tidspunkt)], type som "box"/"pulse"/"vibration",
+    tidspunkt i unix-sekunder eller 0. Returnerer body som bytes.
+    """
+    count = len(records)
+    if count > MAX_RECORDS:
+        raise CodecError("for mange records")
+    buf = bytearray(HEADER_SIZE + count * RECORD_SIZE)
+    struct.pack_into(HEADER, buf, 0, MAGIC, VERSION, count)
+    offset = HEADER_SIZE
+    for kind, borger_id, value, ts in records:
+        code = TYPE_CODES.get(kind)
+        if code is None:
+            raise CodecError("ukendt type")
+        struct.pack_into(RECORD, buf, offset, code, borger_id, int(value), ts or 0)
+        offset += RECORD_SIZE
+    return bytes(buf)
+
+
+def decode(data):
+    """
+    Body -> [(type, borger_id, værdi, tidspunkt)]; værdien er bool for box/vibration.
+    CodecError ved forkert header, længde eller type.
+    """
+    if len(data) < HEADER_SIZE:
+        raise CodecError("for kort body")
+    magic, version, count = struct.unpack_from(HEADER, data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise CodecError("ukendt format eller version")
+    if len(data) != HEADER_SIZE + count * RECORD_SIZE:
+        raise CodecError("længden passer ikke med antal records")
+
+    records = []
+    offset = HEADER_SIZE
+    for _ in range(count):
+        code, borger_id, value, ts = struct.unpack_from(RECORD, data, offset)
+        kind = TYPE_NAMES.get(code)
+        if kind is None:
+            raise CodecError("ukendt type")
+        if kind in _BOOLEAN_TYPES:
+            value = value != 0
+        records.append((kind, borger_id, value, ts))
+        offset += RECORD_SIZE
+    return records
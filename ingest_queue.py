@@ -0,0 +1,165 @@
+# ingest_queue.py
+"""
+Write-behind kø til event-indsamling.
+
+Ingest-routes lægger events i en begrænset kø og svarer med det samme.
+En baggrundstråd tømmer køen og kalder flush(batch) med op til batch_size
+events ad gangen – enten når batchen er fuld, eller når flush_interval er gået.
+"""
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Køen er fuld (eller lukket) – klienten skal prøve igen senere."""
+
+
+class WriteBehindQueue:
+    """
+    Begrænset in-process kø med baggrunds-flusher.
+
+    flush(batch) får en liste af events og skal returnere en liste af
+    True/False (gemt/afvist) i samme rækkefølge. Fejler flush med en
+    exception, prøves batchen igen op til max_retries gange.
+    """
+
+    def __init__(
+        self,
+        flush,
+        maxsize: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        put_timeout: float = 0.05,
+        max_retries: int = 3,
+    ):
+        self._flush = flush
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "backpressure_rejections": 0,
+            "flushes": 0,
+            "flushed_events": 0,
+            "rejected_events": 0,
+            "dropped_events": 0,
+            "flush_errors": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+
+    # ---------- PRODUCENT ----------
+    def put(self, event):
+        """
+        Lægger et event i køen. Venter højst put_timeout på plads
+        og rejser ellers QueueFull (backpressure).
+        """
+        if self._stopping.is_set():
+            raise QueueFull("Køen er lukket.")
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats["backpressure_rejections"] += 1
+            raise QueueFull("Ingest-køen er fuld.") from None
+        with self._lock:
+            self._stats["enqueued"] += 1
+
+    # ---------- LIVSCYKLUS ----------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="write-behind-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float | None = 10.0):
+        """Stopper modtagelsen og venter på at køen er tømt til databasen."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        else:
+            self._drain()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+        data["depth"] = self._queue.qsize()
+        data["capacity"] = self._queue.maxsize
+        return data
+
+    # ---------- FLUSHER ----------
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush_batch(batch)
+
+        self._drain()
+
+    def _drain(self):
+        """Tømmer resten af køen ved nedlukning."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch: list):
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                results = self._flush(batch)
+            except Exception:
+                logger.exception("Write-behind flush fejlede (forsøg %d)", attempt + 1)
+                with self._lock:
+                    self._stats["flush_errors"] += 1
+                if attempt < self.max_retries and not self._stopping.is_set():
+                    time.sleep(min(0.1 * 2 ** attempt, 2.0))
+                continue
+
+            elapsed = time.perf_counter() - start
+            accepted = sum(1 for ok in results if ok)
+            with self._lock:
+                self._stats["flushes"] += 1
+                self._stats["flushed_events"] += accepted
+                self._stats["rejected_events"] += len(batch) - accepted
+                self._stats["last_flush_seconds"] = elapsed
+                self._stats["total_flush_seconds"] += elapsed
+                if elapsed > self._stats["max_flush_seconds"]:
+                    self._stats["max_flush_seconds"] = elapsed
+            return
+
+        logger.error("Write-behind: %d events droppet efter gentagne fejl", len(batch))
+        with self._lock:
+            self._stats["dropped_events"] += len(batch)
@@ -0,0 +1,362 @@
+# loadgen.py
+"""
+Load-generator: en flåde af virtuelle ESP32'ere (medicinbokse og armbånd)
+mod API'et, til kapacitetsplanlægning og til at fange regressioner.
+
+Hver virtuel enhed henter sit eget token via POST /token/<id> og sender
+derefter events som uafhængige Poisson-strømme (eksponentielt fordelte
+pauser) med de angivne rater pr. enhed pr. minut:
+- medicinboks: box-events (skiftevis åben/lukket) og pulse-events
+- armbånd: vibration-events
+Enhederne starter spredt over --ramp sekunder, så de ikke rammer serveren
+i samme millisekund. Med --batch-size sender boksene i stedet deres events
+i binære batches til /events/batch, som spoolen på den rigtige boks gør.
+
+Latens måles fra det planlagte sendetidspunkt, så kø i klienten (fx når
+alle --connections er i brug) tæller med i stedet for at skjule at serveren
+ikke kan følge med. service_ms er den rene request-tid.
+
+Rapporten (JSON) har throughput, p50/p95/p99 og fejlrate i alt og pr. route.
+
+Kør (mod en kørende server, fx flask --app app run):
+    python loadgen.py --boxes 1000 --wristbands 1000 --seconds 60 --output rapport.json
+Mod async_server.py (som ikke har /token og /borger):
+    python loadgen.py --base http://127.0.0.1:8080 --token-base http://127.0.0.1:5000 --borger-ids 1
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+import event_codec
+
+# Enheds-id'er i app.py (users): 1 = medicinboks, 2 = armbånd
+BOX_DEVICE_ID = 1
+WRISTBAND_DEVICE_ID = 2
+
+
+# ---------- MÅLINGER ----------
+def percentile(values: list, p: float) -> float | None:
+    """Nearest-rank percentil af en sorteret liste."""
+    if not values:
+        return None
+    return values[max(math.ceil(len(values) * p) - 1, 0)]
+
+
+def summarize(latencies: list) -> dict:
+    """count, p50/p95/p99, middel og max i millisekunder."""
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None,
+                "mean_ms": None, "max_ms": None}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+    }
+
+
+class Recorder:
+    """Latenser, antal events og fejl pr. route."""
+
+    def __init__(self):
+        self.latency = {}     # route -> [sekunder fra planlagt tidspunkt]
+        self.service = {}     # route -> [sekunder for selve requesten]
+        self.events = Counter()
+        self.errors = {}      # route -> Counter(status/exception)
+
+    def ok(self, route: str, latency: float, service: float, events: int = 1):
+        self.latency.setdefault(route, []).append(latency)
+        self.service.setdefault(route, []).append(service)
+        self.events[route] += events
+
+    def error(self, route: str, reason):
+        self.errors.setdefault(route, Counter())[str(reason)] += 1
+
+    def report(self, seconds: float) -> dict:
+        routes = {}
+        for route in sorted(set(self.latency) | set(self.errors)):
+            ok = len(self.latency.get(route, ()))
+            failed = sum(self.errors.get(route, Counter()).values())
+            routes[route] = {
+                "requests": ok + failed,
+                "errors": failed,
+                "error_rate": round(failed / (ok + failed), 4),
+                "events": self.events[route],
+                "rps": round((ok + failed) / seconds, 1),
+                "latency": summarize(self.latency.get(route, [])),
+                "service": summarize(self.service.get(route, [])),
+                "error_kinds": dict(self.errors.get(route, {})),
+            }
+
+        # Token-hentning er opstart, ikke last – kun mislykkede logins tælles med
+        # i den samlede fejlrate, da enheden så ikke sender noget
+        load = [r for r in routes if r != "token"]
+        ok = sum(len(self.latency.get(r, ())) for r in load)
+        failed = sum(routes[r]["errors"] for r in routes)
+        return {
+            "seconds": round(seconds, 2),
+            "requests": ok + failed,
+            "errors": failed,
+            "completed": ok,
+            "error_rate": round(failed / (ok + failed), 4) if ok + failed else 0.0,
+            "throughput_rps": round((ok + failed) / seconds, 1),
+            "events_per_s": round(sum(self.events[r] for r in load) / seconds, 1),
+            "latency": summarize([x for r in load for x in self.latency.get(r, ())]),
+            "service": summarize([x for r in load for x in self.service.get(r, ())]),
+            "routes": routes,
+        }
+
+
+# ---------- VIRTUELLE ENHEDER ----------
+class Fleet:
+    """Fælles for alle enheder: HTTP-session, adresser og målinger."""
+
+    def __init__(self, session, base: str, token_base: str, recorder: Recorder):
+        self.session = session
+        self.base = base
+        self.token_base = token_base
+        self.recorder = recorder
+
+    async def request(self, route: str, method: str, url: str, scheduled: float,
+                      events: int = 1, **kwargs):
+        """Én request; returnerer status (eller None ved netværksfejl) og JSON-svaret."""
+        start = time.perf_counter()
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                body = await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self.recorder.error(route, type(err).__name__)
+            return None, None
+        end = time.perf_counter()
+        if status >= 400:
+            # 401 tælles ikke som fejl her – enheden henter nyt token og prøver igen
+            if status != 401:
+                self.recorder.error(route, status)
+            return status, None
+        self.recorder.ok(route, end - scheduled, end - start, events)
+        return status, json.loads(body) if body else None
+
+
+class VirtualDevice:
+    """
+    Én simuleret ESP32. streams: {type: events pr. minut}; box-events
+    skifter mellem åben og lukket, pulse er en tilfældig realistisk puls.
+    """
+
+    def __init__(self, device_id: int, borger_id: int, streams: dict, rng: random.Random,
+                 batch_size: int = 0):
+        self.device_id = device_id
+        self.borger_id = borger_id
+        self.streams = {kind: rate for kind, rate in streams.items() if rate > 0}
+        self.rng = rng
+        self.batch_size = batch_size
+        self.token = None
+        self.box_open = False
+        self._pending = []
+
+    async def login(self, fleet: Fleet) -> bool:
+        status, data = await fleet.request(
+            "token", "POST", f"{fleet.token_base}/token/{self.device_id}", time.perf_counter())
+        self.token = data["token"] if status == 200 else None
+        return self.token is not None
+
+    def _value(self, kind: str):
+        if kind == "box":
+            self.box_open = not self.box_open
+            return self.box_open
+        if kind == "pulse":
+            return int(self.rng.gauss(75, 10))
+        return True
+
+    async def _post(self, fleet: Fleet, route: str, scheduled: float, events: int = 1,
+                    headers: dict | None = None, **kwargs):
+        """POST med enhedens token; ved 401 hentes nyt token og der prøves én gang til."""
+        for attempt in range(2):
+            status, _ = await fleet.request(
+                route, "POST", f"{fleet.base}/{route}", scheduled, events=events,
+                headers={"Authorization": f"Bearer {self.token}", **(headers or {})}, **kwargs)
+            if status != 401:
+                return
+            if attempt or not await self.login(fleet):
+                break
+        # Afvist igen, eller nyt token kunne ikke hentes
+        fleet.recorder.error(route, 401)
+
+    async def _send_json(self, fleet: Fleet, kind: str, value, scheduled: float):
+        field = {"box": "box_open", "pulse": "bpm", "vibration": "signaled"}[kind]
+        await self._post(fleet, f"{kind}-event", scheduled,
+                         json={"borger_id": self.borger_id, field: value})
+
+    async def _send_batch(self, fleet: Fleet, scheduled: float):
+        records, self._pending = self._pending, []
+        await self._post(fleet, "events/batch", scheduled, events=len(records),
+                         headers={"Content-Type": event_codec.MIMETYPE},
+                         data=event_codec.encode(records))
+
+    async def _stream(self, fleet: Fleet, kind: str, rate: float, deadline: float):
+        mean_gap = 60.0 / rate
+        next_at = time.perf_counter() + self.rng.expovariate(1.0) * mean_gap
+        while next_at < deadline:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            value = self._value(kind)
+            if self.batch_size:
+                self._pending.append((kind, self.borger_id, value, event_codec.unix_time()))
+                if len(self._pending) >= self.batch_size:
+                    await self._send_batch(fleet, next_at)
+            else:
+                await self._send_json(fleet, kind, value, next_at)
+            # Planlagt ud fra forrige planlagte tidspunkt (åben last), ikke fra svaret
+            next_at += self.rng.expovariate(1.0) * mean_gap
+
+    async def run(self, fleet: Fleet, start_delay: float, deadline: float):
+        await asyncio.sleep(start_delay)
+        if not await self.login(fleet):
+            return
+        await asyncio.gather(*(
+            self._stream(fleet, kind, rate, deadline) for kind, rate in self.streams.items()
+        ))
+        if self._pending:
+            # Resten af en ufuldstændig batch sendes ved deadline i stedet for at gå tabt
+            await self._send_batch(fleet, time.perf_counter())
+
+
+# ---------- OPSÆTNING ----------
+async def create_borgere(fleet: Fleet, n: int, concurrency: int = 20) -> list:
+    """Opretter n test-borgere via POST /borger (så FK og borger-katalog er gyldige)."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(i):
+        async with semaphore:
+            async with fleet.session.post(f"{fleet.token_base}/borger",
+                                          json={"navn": f"Loadgen {i}"}) as response:
+                if response.status != 201:
+                    raise RuntimeError(f"POST /borger gav {response.status}")
+                return (await response.json())["id"]
+
+    return list(await asyncio.gather(*(create(i) for i in range(n))))
+
+
+async def delete_borgere(fleet: Fleet, ids: list, concurrency: int = 20):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def delete(borger_id):
+        async with semaphore:
+            async with fleet.session.delete(f"{fleet.token_base}/borger/{borger_id}") as response:
+                await response.read()
+
+    await asyncio.gather(*(delete(i) for i in ids))
+
+
+def build_fleet(args, borger_ids: list) -> list:
+    """Bokse og armbånd fordelt på borgerne; armbånd i går til samme borger som boks i."""
+    rng = random.Random(args.seed)
+    devices = []
+    for i in range(args.boxes):
+        devices.append(VirtualDevice(
+            BOX_DEVICE_ID, borger_ids[i % len(borger_ids)],
+            {"box": args.box_rate, "pulse": args.pulse_rate},
+            random.Random(rng.random()), batch_size=args.batch_size,
+        ))
+    for i in range(args.wristbands):
+        devices.append(VirtualDevice(
+            WRISTBAND_DEVICE_ID, borger_ids[i % len(borger_ids)],
+            {"vibration": args.vibration_rate}, random.Random(rng.random()),
+        ))
+    return devices
+
+
+async def run(args) -> dict:
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    recorder = Recorder()
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        fleet = Fleet(session, args.base.rstrip("/"), (args.token_base or args.base).rstrip("/"),
+                      recorder)
+        if args.borger_ids:
+            borger_ids, created = [int(x) for x in args.borger_ids.split(",")], []
+        else:
+            borger_ids = created = await create_borgere(fleet, max(args.boxes, args.wristbands, 1))
+        try:
+            devices = build_fleet(args, borger_ids)
+            rng = random.Random(args.seed)
+            start = time.perf_counter()
+            deadline = start + args.ramp + args.seconds
+            await asyncio.gather(*(
+                device.run(fleet, rng.uniform(0, args.ramp), deadline) for device in devices
+            ))
+            elapsed = time.perf_counter() - start
+        finally:
+            if created and not args.keep:
+                await delete_borgere(fleet, created)
+
+    report = recorder.report(elapsed)
+    report["config"] = {
+        "base": args.base, "boxes": args.boxes, "wristbands": args.wristbands,
+        "seconds": args.seconds, "ramp": args.ramp, "box_rate": args.box_rate,
+        "pulse_rate": args.pulse_rate, "vibration_rate": args.vibration_rate,
+        "batch_size": args.batch_size, "connections": args.connections, "seed": args.seed,
+    }
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base", default="http://127.0.0.1:5000", help="API der får eventene")
+    parser.add_argument("--token-base", default=None,
+                        help="server med /token og /borger (standard: --base)")
+    parser.add_argument("--boxes", type=int, default=100, help="antal virtuelle medicinbokse")
+    parser.add_argument("--wristbands", type=int, default=100, help="antal virtuelle armbånd")
+    parser.add_argument("--seconds", type=float, default=30.0, help="varighed efter ramp-up")
+    parser.add_argument("--ramp", type=float, default=5.0, help="enhederne starter spredt over så mange sekunder")
+    parser.add_argument("--box-rate", type=float, default=2.0, help="box-events pr. boks pr. minut")
+    parser.add_argument("--pulse-rate", type=float, default=1.0, help="pulse-events pr. boks pr. minut")
+    parser.add_argument("--vibration-rate", type=float, default=0.5, help="vibration-events pr. armbånd pr. minut")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="bokse sender binære batches af så mange events (0 = ét JSON-POST pr. event)")
+    parser.add_argument("--borger-ids", default=None,
+                        help="kommasepareret liste af eksisterende borgere (ellers oprettes og slettes de)")
+    parser.add_argument("--keep", action="store_true", help="slet ikke de oprettede borgere")
+    parser.add_argument("--connections", type=int, default=100, help="maks. samtidige TCP-forbindelser")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="skriv rapporten hertil i stedet for stdout")
+    parser.add_argument("--max-error-rate", type=float, default=None,
+                        help="afslut med status 1 hvis fejlraten er højere")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print(f"{report['throughput_rps']:.1f} req/s, p50 {report['latency']['p50_ms']} ms, "
+          f"p99 {report['latency']['p99_ms']} ms, fejlrate {report['error_rate']:.2%}",
+          file=sys.stderr)
+    if not report["completed"]:
+        print("ingen requests blev gennemført", file=sys.stderr)
+        return 1
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
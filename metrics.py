@@ -0,0 +1,261 @@
+# metrics.py
+"""
+Metrics i Prometheus' tekstformat til GET /metrics.
+
+Tællere og histogrammer skrives i en shard pr. tråd (threading.local), så
+en request aldrig venter på en lås for at tælle: den eneste lås tages når
+en ny tråd tæller første gang. render() lægger shards sammen. Shards fra
+tråde der er stoppet (fx Werkzeugs tråd pr. request) foldes ind i én fælles
+shard, så antallet ikke vokser med antallet af requests.
+
+Modulet definerer også de metrics app.py bruger (requests, DB-tid, auth-fejl,
+ingest) og en query-observer til db_pool.add_query_observer.
+"""
+import re
+import threading
+from bisect import bisect_left
+
+# Standard-buckets (sekunder) for HTTP-requests og for enkelte SQL-statements
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _Shard:
+    __slots__ = ("thread", "data")
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.data = {}   # (metric, label-værdier) -> tal (tæller) eller liste (histogram)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._fold_at = 64
+
+    # ---------- DEFINITION ----------
+    def counter(self, name: str, help: str, labels=()) -> "Counter":
+        metric = Counter(self, name, help, tuple(labels))
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels=(), buckets=REQUEST_BUCKETS) -> "Histogram":
+        metric = Histogram(self, name, help, tuple(labels), tuple(buckets))
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        """
+        fn() -> [(navn, type, hjælpetekst, værdi)] – læses først ved render() (fx pool-tal).
+        Et femte element {label: værdi} giver flere samples under samme navn.
+        """
+        self._collectors.append(fn)
+
+    # ---------- SHARDS ----------
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        shard = _Shard(threading.current_thread())
+        with self._lock:
+            self._shards.append(shard)
+            if len(self._shards) >= self._fold_at:
+                self._fold_dead()
+                self._fold_at = max(64, 2 * len(self._shards))
+        self._local.shard = shard
+        return shard
+
+    def _fold_dead(self):
+        """Lægger shards fra stoppede tråde sammen i _retired (kaldes med låsen)."""
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                _merge(self._retired.data, shard.data.items())
+        self._shards = alive
+
+    def reset(self):
+        """Nulstiller alle værdier (til tests)."""
+        with self._lock:
+            for shard in self._shards:
+                shard.data.clear()
+            self._retired.data.clear()
+
+    # ---------- UDLÆSNING ----------
+    def snapshot(self) -> dict:
+        """Summen over alle shards: {(metric, labels): værdi}."""
+        with self._lock:
+            self._fold_dead()
+            total = {}
+            _merge(total, list(self._retired.data.items()))
+            for shard in self._shards:
+                # list() kopierer under GIL'en, så trådens skrivninger ikke forstyrrer
+                _merge(total, list(shard.data.items()))
+        return total
+
+    def render(self) -> str:
+        snapshot = self.snapshot()
+        by_metric = {}
+        for (metric, labels), value in snapshot.items():
+            by_metric.setdefault(metric, []).append((labels, value))
+
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for labels, value in sorted(by_metric.get(metric, ())):
+                metric.render(lines, labels, value)
+        collected = {}
+        for fn in self._collectors:
+            for name, kind, help, value, *labels in fn():
+                entry = collected.setdefault(name, (kind, help, []))
+                entry[2].append((labels[0] if labels else {}, value))
+        for name, (kind, help, samples) in collected.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(total: dict, items):
+    for key, value in items:
+        if isinstance(value, list):
+            current = total.get(key)
+            if current is None:
+                total[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    current[i] += v
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra="") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, registry, name, help, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+    def inc(self, *labels, amount=1):
+        data = self.registry._shard().data
+        key = (self, labels)
+        data[key] = data.get(key, 0) + amount
+
+    def render(self, lines, labels, value):
+        lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, registry, name, help, labelnames, buckets):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        data = self.registry._shard().data
+        key = (self, labels)
+        entry = data.get(key)
+        if entry is None:
+            # Én plads pr. bucket + "+Inf", og summen til sidst
+            entry = data[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def render(self, lines, labels, value):
+        cumulative = 0
+        for le, count in zip(self.buckets + ("+Inf",), value):
+            cumulative += count
+            label = _labels(self.labelnames, labels, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{label} {cumulative}")
+        label = _labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{label} {_number(value[-1])}")
+        lines.append(f"{self.name}_count{label} {cumulative}")
+
+
+# ---------- SQL-LABELS ----------
+_VERB = re.compile(r"\s*(\w+)")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|JOIN)\s+([A-Za-z_][\w.]*)", re.IGNORECASE)
+
+
+def statement_label(query) -> str:
+    """
+    Kort label for et SQL-statement: verbum + første tabel, fx "INSERT box_events".
+    Kun starten af teksten bruges – execute_values sætter værdierne ind i selve SQL'en.
+    """
+    if isinstance(query, bytes):
+        query = query[:400].decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    head = query[:400]
+    verb = _VERB.match(head)
+    if verb is None:
+        return "OTHER"
+    label = verb.group(1).upper()
+    table = _TABLE.search(head)
+    if table is not None:
+        label += " " + table.group(1).lower()
+    return label
+
+
+# ---------- APP-METRICS ----------
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "iomt_http_requests_total", "HTTP-requests pr. route, metode og status.",
+    ("method", "route", "status"))
+HTTP_SECONDS = registry.histogram(
+    "iomt_http_request_duration_seconds", "Svartid pr. route.", ("method", "route"))
+DB_SECONDS = registry.histogram(
+    "iomt_db_query_duration_seconds", "Tid pr. SQL-statement (verbum + tabel).",
+    ("statement",), buckets=QUERY_BUCKETS)
+DB_ERRORS = registry.counter(
+    "iomt_db_query_errors_total", "SQL-statements der fejlede.", ("statement",))
+AUTH_FAILURES = registry.counter(
+    "iomt_auth_failures_total", "Afviste tokens pr. årsag.", ("reason",))
+INGEST_EVENTS = registry.counter(
+    "iomt_ingest_events_total", "Gemte events pr. type.", ("type",))
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    HTTP_REQUESTS.inc(method, route, str(status))
+    HTTP_SECONDS.observe(seconds, method, route)
+
+
+def observe_query(cursor, query, params, seconds, error):
+    """Query-observer til db_pool.add_query_observer."""
+    label = statement_label(query)
+    DB_SECONDS.observe(seconds, label)
+    if error is not None:
+        DB_ERRORS.inc(label)
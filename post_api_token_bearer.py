@@ -1,6 +1,7 @@
 import requests
 
 BASE_URL = "http://127.0.0.1:5000"
+BORGER_ID = 1  # skal findes i borger-tabellen
 
 
 def get_token(user_id: int) -> str:
@@ -28,8 +29,8 @@ def send_box_event(token: str):
         "accept": "application/json",
     }
     data = {
-        "box_open": True,   
-        "adc_value": 1500,  
+        "borger_id": BORGER_ID,
+        "box_open": True,
     }
     r = requests.post(url, json=data, headers=headers)
     print("box-event:", r.status_code, r.text)
@@ -45,6 +46,7 @@ def send_pulse_event(token: str):
         "accept": "application/json",
     }
     data = {
+        "borger_id": BORGER_ID,
         "bpm": 72,   # fiktiv puls
     }
     r = requests.post(url, json=data, headers=headers)
@@ -61,7 +63,8 @@ def send_vibration_event(token: str):
         "accept": "application/json",
     }
     data = {
-        "strength": 80,   # fiktiv vibrationsstyrke (0–100)
+        "borger_id": BORGER_ID,
+        "signaled": True,   # armbåndet har vibreret
     }
     r = requests.post(url, json=data, headers=headers)
     print("vibration-event:", r.status_code, r.text)
@@ -0,0 +1,191 @@
+# pulse_rollups.py
+"""
+Rollups af pulsmålinger pr. borger pr. time og pr. døgn (UTC).
+
+Hver bucket gemmer count, min, max, sum og sum af kvadrater, så middelværdi
+og standardafvigelse kan regnes for vilkårlige vinduer ud fra få rækker.
+update_rollups() kaldes i samme transaktion som INSERT i pulse_events;
+rebuild_rollups() genberegner fra rådata (compaction/efter import).
+"""
+import math
+from datetime import datetime, timedelta, timezone
+
+import psycopg2.extras
+
+# granularitet -> (tabel, date_trunc-enhed)
+ROLLUP_TABLES = {
+    "hour": ("pulse_rollup_hourly", "hour"),
+    "day": ("pulse_rollup_daily", "day"),
+}
+
+# Vinduer op til denne længde besvares fra time-tabellen, længere fra døgn-tabellen
+HOURLY_MAX_WINDOW = timedelta(days=2)
+# Længste vindue der kan spørges på (366d / 52w / 8784h)
+MAX_WINDOW = timedelta(days=366)
+
+_WINDOW_UNITS = {"h": timedelta(hours=1), "d": timedelta(days=1), "w": timedelta(weeks=1)}
+
+
+def create_tables(cur):
+    """DDL til skema-migrationen."""
+    for table, _ in ROLLUP_TABLES.values():
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                borger_id INTEGER NOT NULL REFERENCES borger(id) ON DELETE CASCADE,
+                bucket TIMESTAMPTZ NOT NULL,
+                count BIGINT NOT NULL,
+                min INTEGER NOT NULL,
+                max INTEGER NOT NULL,
+                sum BIGINT NOT NULL,
+                sum_sq BIGINT NOT NULL,
+                PRIMARY KEY (borger_id, bucket)
+            );
+            """
+        )
+
+
+def _bucket(created_at: datetime, granularity: str) -> datetime:
+    ts = created_at.astimezone(timezone.utc)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate(rows, granularity: str) -> list:
+    """
+    Samler målinger (borger_id, bpm, created_at) pr. bucket:
+    [(borger_id, bucket, count, min, max, sum, sum_sq)] sorteret på nøglen.
+    """
+    agg = {}
+    for borger_id, bpm, created_at in rows:
+        key = (borger_id, _bucket(created_at, granularity))
+        a = agg.get(key)
+        if a is None:
+            agg[key] = [1, bpm, bpm, bpm, bpm * bpm]
+        else:
+            a[0] += 1
+            a[1] = min(a[1], bpm)
+            a[2] = max(a[2], bpm)
+            a[3] += bpm
+            a[4] += bpm * bpm
+    # Fast rækkefølge, så samtidige transaktioner ikke deadlocker
+    return [(k[0], k[1], *v) for k, v in sorted(agg.items())]
+
+
+def upsert_sql(table: str, values: str) -> str:
+    """UPSERT af aggregerede buckets; values er VALUES-delen i driverens parameterstil."""
+    return f"""
+        INSERT INTO {table} AS r (borger_id, bucket, count, min, max, sum, sum_sq)
+        VALUES {values}
+        ON CONFLICT (borger_id, bucket) DO UPDATE
+        SET count = r.count + EXCLUDED.count,
+            min = LEAST(r.min, EXCLUDED.min),
+            max = GREATEST(r.max, EXCLUDED.max),
+            sum = r.sum + EXCLUDED.sum,
+            sum_sq = r.sum_sq + EXCLUDED.sum_sq;
+        """
+
+
+def update_rollups(cur, rows):
+    """
+    Lægger nye målinger (borger_id, bpm, created_at) til i rollup-tabellerne.
+    Målingerne samles først i Python, så hver bucket kun rammes én gang pr. kald.
+    """
+    for granularity, (table, _) in ROLLUP_TABLES.items():
+        values = aggregate(rows, granularity)
+        psycopg2.extras.execute_values(
+            cur,
+            upsert_sql(table, "%s"),
+            values,
+            page_size=max(len(values), 1),
+        )
+
+
+def rebuild_rollups(cur, since: datetime | None = None):
+    """
+    Genberegner rollups fra pulse_events (fra og med since's døgn, eller alt).
+    Bruges som compaction-job og efter import af rådata uden om API'et.
+    """
+    if since is not None:
+        since = _bucket(since, "day")
+    for table, unit in ROLLUP_TABLES.values():
+        where = "WHERE created_at >= %(since)s" if since is not None else ""
+        cur.execute(
+            f"DELETE FROM {table} {'WHERE bucket >= %(since)s' if since is not None else ''};",
+            {"since": since},
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {table} (borger_id, bucket, count, min, max, sum, sum_sq)
+            SELECT borger_id,
+                   date_trunc('{unit}', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+                   count(*), min(bpm), max(bpm), sum(bpm), sum(bpm::bigint * bpm)
+            FROM pulse_events
+            {where}
+            GROUP BY 1, 2;
+            """,
+            {"since": since},
+        )
+
+
+def parse_window(window: str) -> timedelta:
+    """'24h', '7d', '4w' -> timedelta. ValueError ved ugyldigt format eller over MAX_WINDOW."""
+    unit = _WINDOW_UNITS.get(window[-1:])
+    if unit is None or not window[:-1].isdigit() or int(window[:-1]) < 1:
+        raise ValueError(window)
+    try:
+        delta = int(window[:-1]) * unit
+    except OverflowError:
+        raise ValueError(window) from None
+    if delta > MAX_WINDOW:
+        raise ValueError(window)
+    return delta
+
+
+def _summary(count, total, total_sq) -> dict:
+    if not count:
+        return {"mean": None, "stddev": None}
+    mean = total / count
+    variance = max(total_sq / count - mean * mean, 0.0)
+    return {"mean": round(mean, 2), "stddev": round(math.sqrt(variance), 2)}
+
+
+def pulse_stats(cur, borger_id: int, window: timedelta, now: datetime | None = None) -> dict:
+    """
+    Statistik for de seneste `window` ud fra rollups.
+    Første bucket tælles med fra sin start, så vinduet rundes ned til hel time/dag.
+    """
+    now = now or datetime.now(timezone.utc)
+    granularity = "hour" if window <= HOURLY_MAX_WINDOW else "day"
+    table, _ = ROLLUP_TABLES[granularity]
+    since = _bucket(now - window, granularity)
+
+    cur.execute(
+        f"""
+        SELECT bucket, count, min, max, sum, sum_sq
+        FROM {table}
+        WHERE borger_id = %s AND bucket >= %s
+        ORDER BY bucket;
+        """,
+        (borger_id, since),
+    )
+    rows = cur.fetchall()
+
+    count = sum(r[1] for r in rows)
+    total = sum(r[4] for r in rows)
+    total_sq = sum(r[5] for r in rows)
+    stats = {
+        "granularity": granularity,
+        "since": since,
+        "count": count,
+        "min": min((r[2] for r in rows), default=None),
+        "max": max((r[3] for r in rows), default=None),
+        **_summary(count, total, total_sq),
+        "buckets": [
+            {"bucket": r[0], "count": r[1], "min": r[2], "max": r[3],
+             **_summary(r[1], r[4], r[5])}
+            for r in rows
+        ],
+    }
+    return stats
@@ -0,0 +1,130 @@
+# recent_events.py
+"""
+Ringbuffer med de seneste N events pr. type til dashboardet.
+
+Bufferen fyldes fra databasen ved første brug og holdes derefter opdateret
+af ingest-routes efter hver commit, så /dashboard kan vises uden databasekald.
+Bufferen lever i processen – kører man flere workers, har hver sin egen.
+"""
+import bisect
+import threading
+
+
+class RecentEvents:
+    """
+    Seneste maxlen events pr. type, sorteret på (created_at, id).
+    Rækkerne er dicts med mindst id, borger_id, navn og created_at.
+    """
+
+    def __init__(self, kinds, maxlen: int = 10):
+        self.maxlen = maxlen
+        self._lock = threading.Lock()
+        self._keys = {kind: [] for kind in kinds}   # stigende (created_at, id)
+        self._rows = {kind: [] for kind in kinds}   # samme rækkefølge som _keys
+        self._loaded = False
+        self._reloading = False
+        self._pending = []                          # ændringer under reload
+        self.version = 0                            # tælles op ved hver ændring
+
+    @property
+    def needs_reload(self) -> bool:
+        return not self._loaded
+
+    # ---------- FYLD FRA DATABASEN ----------
+    def reload(self, fetch):
+        """
+        Erstatter indholdet med fetch() -> {type: [rækker]}.
+        Ændringer der kommer ind mens fetch() kører, lægges oven på bagefter.
+        """
+        with self._lock:
+            self._reloading = True
+            self._pending = []
+        try:
+            rows_by_kind = fetch()
+        except Exception:
+            with self._lock:
+                self._reloading = False
+                self._pending = []
+            raise
+
+        with self._lock:
+            for kind in self._rows:
+                self._keys[kind] = []
+                self._rows[kind] = []
+                for row in rows_by_kind.get(kind, []):
+                    self._insert(kind, dict(row))
+            stale = False
+            for op, args in self._pending:
+                if op(*args) and op == self._remove:
+                    stale = True
+            self._pending = []
+            self._reloading = False
+            self._loaded = not stale
+            self.version += 1
+
+    # ---------- OPDATERING ----------
+    def add(self, kind: str, rows: list):
+        """Tilføjer nyindsatte (committede) rækker."""
+        with self._lock:
+            for row in rows:
+                self._insert(kind, dict(row))
+                if self._reloading:
+                    self._pending.append((self._insert, (kind, dict(row))))
+            self.version += 1
+
+    def rename_borger(self, borger_id: int, navn: str):
+        """Retter navnet i alle bufferede rækker for borgeren."""
+        with self._lock:
+            self._rename(borger_id, navn)
+            if self._reloading:
+                self._pending.append((self._rename, (borger_id, navn)))
+            self.version += 1
+
+    def remove_borger(self, borger_id: int):
+        """
+        Fjerner borgerens events. Bufferen har så færre end maxlen rækker,
+        og de ældre rækker kendes ikke – derfor markeres den til genindlæsning.
+        """
+        with self._lock:
+            if self._remove(borger_id):
+                self._loaded = False
+            if self._reloading:
+                self._pending.append((self._remove, (borger_id,)))
+            self.version += 1
+
+    # ---------- LÆSNING ----------
+    def snapshot(self, kind: str) -> list:
+        """Nyeste først, ligesom ORDER BY created_at DESC."""
+        with self._lock:
+            return list(reversed(self._rows[kind]))
+
+    # ---------- INTERNT (kaldes med låsen) ----------
+    def _insert(self, kind: str, row: dict):
+        keys = self._keys[kind]
+        key = (row["created_at"], row["id"])
+        if len(keys) >= self.maxlen and key <= keys[0]:
+            return  # ældre end alt i en fuld buffer
+        pos = bisect.bisect_left(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            return  # findes allerede
+        keys.insert(pos, key)
+        self._rows[kind].insert(pos, row)
+        if len(keys) > self.maxlen:
+            del keys[0]
+            del self._rows[kind][0]
+
+    def _remove(self, borger_id: int) -> bool:
+        removed = False
+        for kind in self._rows:
+            keep = [i for i, r in enumerate(self._rows[kind]) if r["borger_id"] != borger_id]
+            if len(keep) != len(self._rows[kind]):
+                removed = True
+                self._keys[kind] = [self._keys[kind][i] for i in keep]
+                self._rows[kind] = [self._rows[kind][i] for i in keep]
+        return removed
+
+    def _rename(self, borger_id: int, navn: str):
+        for rows in self._rows.values():
+            for row in rows:
+                if row["borger_id"] == borger_id:
+                    row["navn"] = navn
@@ -0,0 +1,190 @@
+# reminders.py
+"""
+Påmindelses-skema pr. borger: "vibrér armbåndet kl. HH:MM på disse ugedage".
+
+Tidspunkterne er lokal tid (app.config["TIMEZONE"]), så en påmindelse kl.
+08:00 bliver ved med at være kl. 08:00 hen over sommertid. next_fire()
+regner næste forekomst om til UTC.
+
+ReminderScheduler holder én min-heap pr. armbånd med (næste tidspunkt,
+reminder-id, version). Når en påmindelse ændres eller slettes, røres heapen
+ikke – der lægges et nyt element ind med ny version, og forældede elementer
+smides først væk når de når toppen (lazy deletion). next_for() er dermed
+O(log n) amortiseret, uanset hvor mange påmindelser enheden har.
+"""
+import heapq
+import threading
+from datetime import datetime, time, timedelta, timezone
+
+# Ugedage som bitmaske: bit 0 = mandag ... bit 6 = søndag (som date.weekday())
+ALL_DAYS = 0x7F
+
+
+def weekdays_mask(days) -> int:
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+    return mask
+
+
+def mask_days(mask: int) -> list:
+    return [day for day in range(7) if mask >> day & 1]
+
+
+def next_fire(time_of_day: time, weekdays: int, tz, after: datetime) -> datetime | None:
+    """
+    Første tidspunkt efter `after` hvor klokken lokalt er time_of_day på en
+    af ugedagene i masken. Returneres i UTC; None hvis masken er tom.
+    Et lokalt tidspunkt der ikke findes (sommertid starter) rykkes en time frem.
+    """
+    local_day = after.astimezone(tz).date()
+    for offset in range(8):
+        day = local_day + timedelta(days=offset)
+        if not weekdays >> day.weekday() & 1:
+            continue
+        fire_at = datetime.combine(day, time_of_day, tzinfo=tz).astimezone(timezone.utc)
+        if fire_at > after:
+            return fire_at
+    return None
+
+
+class Reminder:
+    __slots__ = ("id", "borger_id", "device_id", "time_of_day", "weekdays", "version")
+
+    def __init__(self, id, borger_id, device_id, time_of_day, weekdays, version):
+        self.id = id
+        self.borger_id = borger_id
+        self.device_id = device_id
+        self.time_of_day = time_of_day
+        self.weekdays = weekdays
+        self.version = version
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "borger_id": self.borger_id,
+            "device_id": self.device_id,
+            "time": self.time_of_day.strftime("%H:%M"),
+            "weekdays": mask_days(self.weekdays),
+        }
+
+
+class ReminderScheduler:
+    """Påmindelser i hukommelsen med en heap pr. enhed (se modul-docstring)."""
+
+    def __init__(self, tz):
+        self.tz = tz
+        self._lock = threading.Lock()
+        self._reminders = {}   # reminder_id -> Reminder
+        self._heaps = {}       # device_id -> [(tidspunkt, reminder_id, version)]
+        self._stale = {}       # device_id -> antal forældede elementer i heapen
+        self._version = 0
+        self.loaded = False
+
+    # ---------- INDLÆSNING ----------
+    def load(self, conn, now: datetime | None = None):
+        """Erstatter skemaet med indholdet af reminders-tabellen."""
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT id, borger_id, device_id, time_of_day, weekdays
+                    FROM reminders ORDER BY id;
+                    """
+                )
+                rows = cur.fetchall()
+        with self._lock:
+            self._reminders = {}
+            self._heaps = {}
+            self._stale = {}
+            for row in rows:
+                self._set(*row, now=now)
+            self.loaded = True
+
+    # ---------- ÆNDRINGER ----------
+    def set(self, reminder_id: int, borger_id: int, device_id: int, time_of_day: time,
+            weekdays: int, now: datetime | None = None):
+        """Tilføjer eller erstatter en påmindelse."""
+        with self._lock:
+            self._set(reminder_id, borger_id, device_id, time_of_day, weekdays, now)
+
+    def _set(self, reminder_id, borger_id, device_id, time_of_day, weekdays, now=None):
+        old = self._reminders.get(reminder_id)
+        self._version += 1
+        reminder = Reminder(reminder_id, borger_id, device_id, time_of_day, weekdays, self._version)
+        self._reminders[reminder_id] = reminder
+        if old is not None:
+            self._retire(old)
+        fire_at = next_fire(time_of_day, weekdays, self.tz, now or datetime.now(timezone.utc))
+        if fire_at is not None:
+            heapq.heappush(self._heaps.setdefault(device_id, []),
+                           (fire_at, reminder_id, reminder.version))
+
+    def remove(self, reminder_id: int) -> bool:
+        with self._lock:
+            reminder = self._reminders.pop(reminder_id, None)
+            if reminder is None:
+                return False
+            self._retire(reminder)
+            return True
+
+    def remove_borger(self, borger_id: int):
+        with self._lock:
+            for reminder in [r for r in self._reminders.values() if r.borger_id == borger_id]:
+                del self._reminders[reminder.id]
+                self._retire(reminder)
+
+    def _retire(self, reminder):
+        """
+        Påmindelsens heap-element er nu forældet. Bliver over halvdelen af
+        heapen forældet, bygges den om, så den ikke vokser ved mange ændringer.
+        """
+        device_id = reminder.device_id
+        heap = self._heaps.get(device_id)
+        if not heap:
+            return
+        stale = self._stale.get(device_id, 0) + 1
+        if stale * 2 > len(heap):
+            heap[:] = [entry for entry in heap if self._is_current(entry)]
+            heapq.heapify(heap)
+            stale = 0
+        self._stale[device_id] = stale
+
+    def _is_current(self, entry) -> bool:
+        reminder = self._reminders.get(entry[1])
+        return reminder is not None and reminder.version == entry[2]
+
+    # ---------- LÆSNING ----------
+    def get(self, reminder_id: int) -> Reminder | None:
+        return self._reminders.get(reminder_id)
+
+    def for_borger(self, borger_id: int) -> list:
+        with self._lock:
+            found = [r for r in self._reminders.values() if r.borger_id == borger_id]
+        return sorted(found, key=lambda r: (r.time_of_day, r.id))
+
+    def next_for(self, device_id: int, after: datetime) -> tuple | None:
+        """
+        Næste påmindelse for enheden efter `after`: (tidspunkt i UTC, Reminder)
+        eller None. Forældede heap-elementer fjernes, og forekomster der er
+        passeret rykkes til deres næste forekomst.
+        """
+        with self._lock:
+            heap = self._heaps.get(device_id)
+            while heap:
+                fire_at, reminder_id, version = heap[0]
+                reminder = self._reminders.get(reminder_id)
+                if reminder is None or reminder.version != version:
+                    heapq.heappop(heap)  # slettet eller ændret siden
+                    self._stale[device_id] = max(self._stale.get(device_id, 0) - 1, 0)
+                    continue
+                if fire_at <= after:
+                    fire_at = next_fire(reminder.time_of_day, reminder.weekdays, self.tz, after)
+                    heapq.heapreplace(heap, (fire_at, reminder_id, version))
+                    continue
+                return fire_at, reminder
+            return None
+
+    def heap_size(self, device_id: int) -> int:
+        """Antal elementer i enhedens heap, inkl. forældede (til tests)."""
+        return len(self._heaps.get(device_id, ()))
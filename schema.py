@@ -0,0 +1,256 @@
+# schema.py
+"""
+Versioneret databaseskema for IOMT.
+
+migrate(conn) kører de migrationer der mangler (registreres i schema_migrations).
+Event-tabellerne er range-partitioneret pr. måned på created_at med indeks på
+(borger_id, created_at) og (created_at, id). ensure_partitions(conn) opretter
+kommende måneders partitioner i forvejen, så inserts aldrig skal vente på DDL.
+
+Kør fra kommandolinjen:
+    flask --app app init-db            # migrationer + partitioner
+    flask --app app ensure-partitions  # fx dagligt fra cron
+"""
+from datetime import date, datetime, timezone
+
+import pulse_rollups
+
+EVENT_TABLES = {
+    "box_events": "box_open BOOLEAN NOT NULL",
+    "pulse_events": "bpm INTEGER NOT NULL",
+    "vibration_events": "signaled BOOLEAN NOT NULL",
+}
+
+# Låse-id så to processer ikke migrerer samtidig
+_MIGRATION_LOCK_ID = 4_200_001
+
+
+# ---------- MIGRATIONER ----------
+def _m001_baseline(cur):
+    """Tabellerne som app.py altid har forudsat (no-op på eksisterende databaser)."""
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS borger (
+            id SERIAL PRIMARY KEY,
+            navn TEXT NOT NULL,
+            telefon TEXT,
+            adresse TEXT,
+            vaerelse TEXT
+        );
+        """
+    )
+    for table, value_column in EVENT_TABLES.items():
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id SERIAL PRIMARY KEY,
+                borger_id INTEGER NOT NULL REFERENCES borger(id) ON DELETE CASCADE,
+                {value_column},
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            """
+        )
+
+
+def _m002_partition_events(cur):
+    """
+    Omdanner event-tabellerne til månedspartitionerede tabeller.
+    Eksisterende rækker (og id'er) flyttes med over.
+    """
+    for table, value_column in EVENT_TABLES.items():
+        cur.execute(
+            "SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(%s);",
+            (table,),
+        )
+        row = cur.fetchone()
+        if row is not None and row[0] == "p":
+            continue  # allerede partitioneret
+
+        legacy = f"{table}_legacy"
+        cur.execute(f"ALTER TABLE {table} RENAME TO {legacy};")
+        cur.execute("SELECT pg_get_serial_sequence(%s, 'id');", (legacy,))
+        old_seq = cur.fetchone()[0]
+        if old_seq is not None:
+            cur.execute(f"ALTER SEQUENCE {old_seq} RENAME TO {legacy}_id_seq;")
+        # Indeks (inkl. primærnøglen) beholder deres navne ved RENAME – giv dem nye
+        cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s;", (legacy,))
+        for (index_name,) in cur.fetchall():
+            cur.execute(f"ALTER INDEX {index_name} RENAME TO {index_name}_legacy;")
+
+        cur.execute(f"CREATE SEQUENCE {table}_id_seq AS BIGINT;")
+        cur.execute(
+            f"""
+            CREATE TABLE {table} (
+                id BIGINT NOT NULL DEFAULT nextval('{table}_id_seq'),
+                borger_id INTEGER NOT NULL REFERENCES borger(id) ON DELETE CASCADE,
+                {value_column},
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at);
+            """
+        )
+        cur.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id;")
+        cur.execute(f"CREATE INDEX {table}_borger_created_idx ON {table} (borger_id, created_at);")
+        cur.execute(f"CREATE INDEX {table}_created_id_idx ON {table} (created_at, id);")
+        cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;")
+
+        # Partitioner for alle måneder med eksisterende data
+        cur.execute(f"SELECT min(created_at), max(created_at) FROM {legacy};")
+        first, last = cur.fetchone()
+        if first is not None:
+            month = _month_start(first)
+            while month <= _month_start(last):
+                _create_partition(cur, table, month)
+                month = _add_months(month, 1)
+
+        value_name = value_column.split()[0]
+        cur.execute(
+            f"""
+            INSERT INTO {table} (id, borger_id, {value_name}, created_at)
+            SELECT id, borger_id, {value_name}, created_at FROM {legacy};
+            """
+        )
+        cur.execute(
+            f"SELECT setval('{table}_id_seq', COALESCE((SELECT max(id) FROM {table}), 0) + 1, false);"
+        )
+        cur.execute(f"DROP TABLE {legacy};")
+
+
+def _m003_pulse_rollups(cur):
+    """Rollup-tabeller for puls (time/døgn), fyldt fra eksisterende målinger."""
+    pulse_rollups.create_tables(cur)
+    pulse_rollups.rebuild_rollups(cur)
+
+
+def _m004_reminders(cur):
+    """
+    Påmindelses-skema pr. borger (se reminders.py): lokalt klokkeslæt,
+    ugedage som bitmaske (bit 0 = mandag) og armbåndet der skal vibrere.
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reminders (
+            id SERIAL PRIMARY KEY,
+            borger_id INTEGER NOT NULL REFERENCES borger(id) ON DELETE CASCADE,
+            device_id INTEGER NOT NULL,
+            time_of_day TIME NOT NULL,
+            weekdays SMALLINT NOT NULL DEFAULT 127 CHECK (weekdays BETWEEN 1 AND 127)
+        );
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS reminders_borger_idx ON reminders (borger_id);")
+
+
+MIGRATIONS = [
+    (1, "baseline", _m001_baseline),
+    (2, "partition_event_tables", _m002_partition_events),
+    (3, "pulse_rollups", _m003_pulse_rollups),
+    (4, "reminders", _m004_reminders),
+]
+
+
+def migrate(conn) -> list:
+    """Kører manglende migrationer, hver i sin egen transaktion. Returnerer de nye versioner."""
+    applied = []
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                """
+            )
+
+    for version, name, func in MIGRATIONS:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s);", (_MIGRATION_LOCK_ID,))
+                cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s;", (version,))
+                if cur.fetchone() is not None:
+                    continue
+                func(cur)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s);",
+                    (version, name),
+                )
+                applied.append(version)
+    return applied
+
+
+def current_version(conn) -> int:
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_migrations');")
+            if cur.fetchone()[0] is None:
+                return 0
+            cur.execute("SELECT COALESCE(max(version), 0) FROM schema_migrations;")
+            return cur.fetchone()[0]
+
+
+# ---------- PARTITIONER ----------
+def _month_start(value) -> date:
+    if isinstance(value, datetime):
+        value = value.astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def _create_partition(cur, table: str, month: date) -> bool:
+    """
+    Opretter partitionen for én måned (UTC-grænser), hvis den mangler.
+    Rækker der allerede ligger i default-partitionen for måneden flyttes over,
+    ellers ville ATTACH fejle.
+    """
+    name = partition_name(table, month)
+    cur.execute("SELECT to_regclass(%s);", (name,))
+    if cur.fetchone()[0] is not None:
+        return False
+
+    start = f"{month.isoformat()} 00:00:00+00"
+    end = f"{_add_months(month, 1).isoformat()} 00:00:00+00"
+    cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS);")
+    cur.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {table}_default
+            WHERE created_at >= %s AND created_at < %s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved;
+        """,
+        (start, end),
+    )
+    cur.execute(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s);",
+        (start, end),
+    )
+    return True
+
+
+def ensure_partitions(conn, months_ahead: int = 3, today: date | None = None) -> list:
+    """
+    Sikrer partitioner fra indeværende måned og months_ahead måneder frem.
+    Returnerer navnene på de nyoprettede partitioner.
+    """
+    month = _month_start(today or datetime.now(timezone.utc))
+    created = []
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (_MIGRATION_LOCK_ID,))
+            for table in EVENT_TABLES:
+                for n in range(months_ahead + 1):
+                    m = _add_months(month, n)
+                    if _create_partition(cur, table, m):
+                        created.append(partition_name(table, m))
+    return created
@@ -0,0 +1,158 @@
+# slow_query.py
+"""
+Slow-query-log: en query-observer (db_pool.add_query_observer) der logger
+ethvert SQL-statement over en tærskel med parametre og kaldested (første
+linje i vores egen kode, ikke psycopg2/db_pool).
+
+Med explain_sample > 0 (debug) køres EXPLAIN (ANALYZE, BUFFERS) også for
+den andel af de langsomme statements, og planen skrives med i loggen:
+- SELECT forklares direkte
+- INSERT/UPDATE/DELETE (og WITH, som kan indeholde DML) forklares inden i
+  SAVEPOINT ... ROLLBACK TO SAVEPOINT, så de ikke udføres to gange.
+  Uden åben transaktion (autocommit) springes de over.
+- Named (server-side) cursors, executemany og fejlede statements springes over.
+EXPLAIN ANALYZE kører statementet igen, så det koster lige så meget som
+det langsomme statement selv – derfor kun en stikprøve.
+
+file_logger() giver en logger der skriver til en roterende fil.
+"""
+import logging
+import os
+import random
+import sys
+import threading
+from logging.handlers import RotatingFileHandler
+
+import psycopg2
+import psycopg2.extensions
+
+import db_pool
+
+MAX_QUERY_CHARS = 2000
+MAX_PARAMS_CHARS = 500
+
+# Kaldestedet er første frame uden for disse filer/mapper
+_SKIP_PATHS = (
+    os.path.abspath(__file__),
+    os.path.abspath(db_pool.__file__),
+    os.path.dirname(os.path.abspath(psycopg2.__file__)),
+)
+
+_READ_VERBS = ("SELECT", "VALUES", "TABLE")
+_WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def file_logger(path: str, max_bytes: int = 5 * 1024 * 1024, backups: int = 3,
+                name: str = "slow_query") -> logging.Logger:
+    """
+    Logger der skriver til en roterende fil (filen oprettes først ved første linje).
+    En tidligere fil-handler på loggeren til en anden fil erstattes.
+    """
+    logger = logging.getLogger(name)
+    target = os.path.abspath(path)
+    for handler in [h for h in logger.handlers if isinstance(h, RotatingFileHandler)]:
+        if handler.baseFilename != target:
+            logger.removeHandler(handler)
+            handler.close()
+    if not any(getattr(h, "baseFilename", None) == target for h in logger.handlers):
+        handler = RotatingFileHandler(target, maxBytes=max_bytes, backupCount=backups,
+                                      encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def call_site() -> str:
+    """fil:linje (funktion) for den kode der kaldte execute()."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if not filename.startswith(_SKIP_PATHS):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "?"
+
+
+def _text(query, conn) -> str:
+    if isinstance(query, bytes):
+        return query.decode("utf-8", "replace")
+    if isinstance(query, str):
+        return query
+    return query.as_string(conn)  # psycopg2.sql.Composed
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + " …"
+
+
+class SlowQueryLog:
+    """Query-observer; kaldes som fn(cursor, query, params, sekunder, fejl)."""
+
+    def __init__(self, threshold_ms: float = 200.0, logger: logging.Logger | None = None,
+                 explain_sample: float = 0.0):
+        self.threshold = threshold_ms / 1000
+        self.logger = logger or logging.getLogger("slow_query")
+        self.explain_sample = explain_sample
+        self._local = threading.local()
+        self.logged = 0
+        self.explained = 0
+
+    def __call__(self, cursor, query, params, seconds, error):
+        if seconds < self.threshold or getattr(self._local, "explaining", False):
+            return
+        conn = cursor.connection
+        text = _text(query, conn)
+        lines = [
+            f"SLOW {seconds * 1000:.1f} ms at {call_site()}"
+            + (f" FEJL {type(error).__name__}" if error is not None else ""),
+            f"  query: {_shorten(text, MAX_QUERY_CHARS)}",
+        ]
+        if params is not None:
+            lines.append(f"  params: {_shorten(repr(params), MAX_PARAMS_CHARS)}")
+
+        if (error is None and self.explain_sample > 0 and cursor.name is None
+                and not isinstance(params, list) and random.random() < self.explain_sample):
+            plan = self._explain(conn, text, params)
+            if plan is not None:
+                lines.append("  plan:")
+                lines.extend("    " + row for row in plan)
+
+        self.logged += 1
+        self.logger.warning("\n".join(lines))
+
+    def _explain(self, conn, text: str, params) -> list | None:
+        """EXPLAIN (ANALYZE, BUFFERS) på samme forbindelse; None hvis det ikke er sikkert/muligt."""
+        words = text.lstrip().split(None, 1)
+        verb = words[0].upper() if words else ""
+        in_transaction = (
+            not conn.autocommit
+            and conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        )
+        if verb in _READ_VERBS:
+            use_savepoint = in_transaction
+        elif verb in _WRITE_VERBS and in_transaction:
+            use_savepoint = True
+        else:
+            return None
+
+        self._local.explaining = True
+        try:
+            with conn.cursor() as cur:
+                if use_savepoint:
+                    cur.execute("SAVEPOINT slow_query_explain;")
+                try:
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + text, params)
+                    plan = [row[0] for row in cur.fetchall()]
+                finally:
+                    if use_savepoint:
+                        cur.execute("ROLLBACK TO SAVEPOINT slow_query_explain;")
+                        cur.execute("RELEASE SAVEPOINT slow_query_explain;")
+        except psycopg2.Error as e:
+            return [f"EXPLAIN fejlede: {type(e).__name__}: {_shorten(str(e), 200)}"]
+        finally:
+            self._local.explaining = False
+        self.explained += 1
+        return plan
@@ -6,8 +6,29 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from app import app, get_db_connection
+import schema
 
 
+@pytest.fixture(scope="session", autouse=True)
+def slow_query_log_in_tmp(tmp_path_factory):
+    """Slow-query-loggen skrives i en midlertidig mappe, aldrig i repoet."""
+    import app as app_module
+
+    app.config["SLOW_QUERY_LOG"] = str(tmp_path_factory.mktemp("logs") / "slow_queries.log")
+    app_module.setup_slow_query_log()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database_schema():
+    """
+    Sørger for at testdatabasen har det aktuelle skema og partitioner.
+    """
+    conn = get_db_connection()
+    try:
+        schema.migrate(conn)
+        schema.ensure_partitions(conn)
+    finally:
+        conn.close()
 
 
 @pytest.fixture
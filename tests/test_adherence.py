@@ -0,0 +1,188 @@
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from adherence import MISSED, PENDING, TAKEN, AdherenceEngine, match_reminders
+from app import get_db_connection
+
+T0 = datetime(2024, 3, 1, 8, 0, tzinfo=timezone.utc)
+WINDOW = timedelta(minutes=30)
+
+
+def _at(minutes: int) -> datetime:
+    return T0 + timedelta(minutes=minutes)
+
+
+def _post_batch(client, events):
+    token = client.post("/token/1").get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post("/events/batch", json={"events": events}, headers=headers)
+    assert response.status_code == 201
+
+
+def _reminder(borger_id: int, minutes: int) -> dict:
+    return {"type": "vibration", "borger_id": borger_id, "signaled": True,
+            "created_at": _at(minutes).isoformat()}
+
+
+def _opening(borger_id: int, minutes: int) -> dict:
+    return {"type": "box", "borger_id": borger_id, "box_open": True,
+            "created_at": _at(minutes).isoformat()}
+
+
+def _refresh(engine, now):
+    conn = get_db_connection()
+    try:
+        engine.refresh(conn, now=now)
+    finally:
+        conn.close()
+
+
+def test_match_reminders_single_pass():
+    """Hver påmindelse parres med første åbning i vinduet og før næste påmindelse."""
+    reminders = [(1, _at(0)), (2, _at(60)), (3, _at(120)), (4, _at(180))]
+    openings = [_at(-5), _at(12), _at(14), _at(100), _at(125), _at(190)]
+    done, pending = match_reminders(reminders, openings, WINDOW, now=_at(200))
+
+    assert [(r["reminder_id"], r["status"], r["delay_seconds"]) for r in done] == [
+        (1, TAKEN, 12 * 60),
+        (2, MISSED, None),     # åbning 40 min efter er uden for vinduet
+        (3, TAKEN, 5 * 60),
+        (4, TAKEN, 10 * 60),
+    ]
+    assert pending == []
+
+    # Uden den sidste åbning afventer påmindelse 4 indtil vinduet er udløbet
+    done, pending = match_reminders(reminders, openings[:-1], WINDOW, now=_at(200))
+    assert pending == [(4, _at(180))]
+    done, pending = match_reminders(reminders, openings[:-1], WINDOW, now=_at(210))
+    assert pending == [] and done[-1]["status"] == MISSED
+
+
+def test_engine_processes_only_new_events(client, test_borger_id):
+    """Resultater bygges videre ved næste refresh uden at gamle events læses igen."""
+    engine = AdherenceEngine(WINDOW, retention=timedelta(days=36500))
+    _post_batch(client, [_reminder(test_borger_id, 0), _opening(test_borger_id, 10)])
+    _refresh(engine, now=_at(20))
+    report = engine.report(test_borger_id, now=_at(20))
+    assert (report["taken"], report["missed"], report["pending"]) == (1, 0, 0)
+
+    _post_batch(client, [_reminder(test_borger_id, 60)])
+    _refresh(engine, now=_at(70))
+    report = engine.report(test_borger_id, now=_at(70))
+    assert report["results"][0]["status"] == PENDING
+
+    _post_batch(client, [_opening(test_borger_id, 75)])
+    _refresh(engine, now=_at(80))
+    report = engine.report(test_borger_id, now=_at(80))
+    assert (report["taken"], report["pending"]) == (2, 0)
+    assert report["results"][0]["delay_seconds"] == 15 * 60
+    assert report["adherence_rate"] == 1.0
+
+
+def test_engine_recomputes_on_late_event(client, test_borger_id):
+    """Et forsinket event (fx batch efter WiFi-udfald) genberegner borgeren."""
+    engine = AdherenceEngine(WINDOW, retention=timedelta(days=36500))
+    _post_batch(client, [_reminder(test_borger_id, 0), _reminder(test_borger_id, 60)])
+    _refresh(engine, now=_at(120))
+    report = engine.report(test_borger_id, now=_at(120))
+    assert (report["taken"], report["missed"]) == (0, 2)
+
+    # Åbningen 5 min efter første påmindelse kommer først nu
+    _post_batch(client, [_opening(test_borger_id, 5)])
+    _refresh(engine, now=_at(125))
+    report = engine.report(test_borger_id, now=_at(125))
+    assert (report["taken"], report["missed"]) == (1, 1)
+    assert report["results"][-1]["status"] == TAKEN
+
+
+def test_engine_picks_up_lower_id_committed_after_refresh(test_borger_id):
+    """En række hvis transaktion committer efter en refresh tælles med, selvom dens id er under max(id)."""
+    engine = AdherenceEngine(WINDOW, retention=timedelta(days=36500))
+    insert = ("INSERT INTO box_events (borger_id, box_open, created_at) VALUES (%s, %s, %s) "
+              "RETURNING id;")
+    slow = get_db_connection()
+    fast = get_db_connection()
+    try:
+        with fast:
+            with fast.cursor() as cur:
+                cur.execute("INSERT INTO vibration_events (borger_id, signaled, created_at) "
+                            "VALUES (%s, true, %s);", (test_borger_id, _at(0)))
+        # Åbningen får sit id først, men committer efter en senere række og en refresh
+        with slow.cursor() as cur:
+            cur.execute(insert, (test_borger_id, True, _at(5)))
+            late_id = cur.fetchone()[0]
+        with fast:
+            with fast.cursor() as cur:
+                cur.execute(insert, (test_borger_id, True, _at(50)))
+                later_id = cur.fetchone()[0]
+
+        _refresh(engine, now=_at(60))
+        report = engine.report(test_borger_id, now=_at(60))
+        assert (report["taken"], report["missed"]) == (0, 1)
+        assert engine._box_watermark < late_id
+        assert later_id in engine._box_seen
+
+        slow.commit()
+        _refresh(engine, now=_at(65))
+        report = engine.report(test_borger_id, now=_at(65))
+        assert (report["taken"], report["missed"]) == (1, 0)
+        # Åbningen ved 50 min er ikke talt to gange, og vandmærket er rykket forbi begge
+        _refresh(engine, now=_at(66))
+        assert engine._box_watermark >= later_id
+        assert not any(i <= engine._box_watermark for i in engine._box_seen)
+        assert len(engine.report(test_borger_id, now=_at(66))["results"]) == 1
+    finally:
+        slow.rollback()
+        slow.close()
+        fast.close()
+
+
+def test_engine_watermark_advances_after_max_lag(test_borger_id):
+    """En transaktion der hænger åben holder kun vandmærket tilbage i max_lag."""
+    engine = AdherenceEngine(WINDOW, retention=timedelta(days=36500), max_lag=timedelta(minutes=5))
+    stuck = get_db_connection()
+    try:
+        with stuck.cursor() as cur:
+            cur.execute("INSERT INTO box_events (borger_id, box_open, created_at) "
+                        "VALUES (%s, true, %s);", (test_borger_id, _at(0)))
+        _refresh(engine, now=_at(0))
+        assert engine._box_watermark == 0
+        _refresh(engine, now=_at(5))
+        assert engine._box_watermark > 0
+    finally:
+        stuck.rollback()
+        stuck.close()
+
+
+def test_adherence_endpoint_and_dashboard_column(client, test_borger_id):
+    """/borger/<id>/adherence rapporterer, og dashboardet viser forsinkelsen."""
+    token = client.post("/token/1").get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post("/vibration-event", json={"borger_id": test_borger_id, "signaled": True},
+                           headers=headers)
+    assert response.status_code == 201
+
+    html = client.get("/dashboard").get_data(as_text=True)
+    assert "Boks åbnet" in html
+    assert "Afventer" in html
+
+    response = client.post("/box-event", json={"borger_id": test_borger_id, "box_open": True},
+                           headers=headers)
+    assert response.status_code == 201
+
+    response = client.get(f"/borger/{test_borger_id}/adherence?days=1")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data["reminders"], data["taken"]) == (1, 1)
+    assert data["results"][0]["delay_seconds"] < 60
+
+    html = client.get("/dashboard").get_data(as_text=True)
+    assert "Efter 0 min" in html
+
+    response = client.get("/adherence?days=1")
+    assert response.status_code == 200
+    assert any(b["borger_id"] == test_borger_id for b in response.get_json()["borgere"])
+    assert client.get("/borger/999999/adherence").status_code == 404
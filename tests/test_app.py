@@ -305,3 +305,301 @@ def test_delete_borger_works(client):
         conn.close()
 
     assert row is None
+
+
+# ---------- BATCH TESTS ----------
+
+def test_events_batch_inserts_mixed_events(client, test_borger_id):
+    """/events/batch skal indsætte blandede events med klientens tidspunkter."""
+    token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {
+        "events": [
+            {"type": "box", "borger_id": test_borger_id, "box_open": True,
+             "created_at": "2024-01-02T08:00:00+00:00"},
+            {"type": "pulse", "borger_id": test_borger_id, "bpm": 64},
+            {"type": "vibration", "borger_id": test_borger_id, "signaled": True},
+        ]
+    }
+    response = client.post("/events/batch", json=payload, headers=headers)
+    assert response.status_code == 201
+    data = response.get_json()
+    assert data["accepted"] == 3
+    assert data["rejected"] == 0
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT created_at AT TIME ZONE 'UTC'
+                    FROM box_events
+                    WHERE borger_id = %s;
+                    """,
+                    (test_borger_id,),
+                )
+                row = cur.fetchone()
+    finally:
+        conn.close()
+
+    assert row is not None
+    assert row[0].isoformat() == "2024-01-02T08:00:00"
+
+
+def test_events_batch_reports_per_item_errors(client, test_borger_id):
+    """Én ukendt borger eller ugyldigt event må ikke afvise hele batchen."""
+    token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {
+        "events": [
+            {"type": "pulse", "borger_id": test_borger_id, "bpm": 70},
+            {"type": "pulse", "borger_id": 999999, "bpm": 70},
+            {"type": "pulse", "borger_id": test_borger_id},
+            {"type": "temperatur", "borger_id": test_borger_id},
+        ]
+    }
+    response = client.post("/events/batch", json=payload, headers=headers)
+    assert response.status_code == 207
+    data = response.get_json()
+    assert data["accepted"] == 1
+    assert [r["status"] for r in data["results"]] == ["ok", "error", "error", "error"]
+    assert "bpm" in data["results"][2]["errors"]
+
+
+def test_events_batch_out_of_range_item_is_a_per_item_error(client, test_borger_id):
+    """Værdier uden for kolonnetyperne afvises pr. element i stedet for at give 500."""
+    token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {
+        "events": [
+            {"type": "pulse", "borger_id": test_borger_id, "bpm": 70},
+            {"type": "pulse", "borger_id": test_borger_id, "bpm": 2**40},
+            {"type": "box", "borger_id": 2**40, "box_open": True},
+            {"type": "box", "borger_id": test_borger_id, "box_open": True},
+        ]
+    }
+    response = client.post("/events/batch", json=payload, headers=headers)
+    assert response.status_code == 207
+    data = response.get_json()
+    assert data["accepted"] == 2
+    assert [r["status"] for r in data["results"]] == ["ok", "error", "error", "ok"]
+    assert "bpm" in data["results"][1]["errors"]
+    assert "borger_id" in data["results"][2]["errors"]
+
+
+def test_events_batch_requires_auth(client):
+    """/events/batch kræver Bearer-token ligesom de andre event-routes."""
+    response = client.post("/events/batch", json={"events": []})
+    assert response.status_code == 401
+
+
+# ---------- EVENT-LISTER (PAGINATION) ----------
+
+def _insert_pulse_series(client, borger_id: int, count: int):
+    """Indsætter count pulsmålinger med hver sin time via /events/batch."""
+    token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    events = [
+        {"type": "pulse", "borger_id": borger_id, "bpm": 60 + i,
+         "created_at": f"2024-03-01T{10 + i:02d}:00:00+00:00"}
+        for i in range(count)
+    ]
+    response = client.post("/events/batch", json={"events": events}, headers=headers)
+    assert response.status_code == 201
+
+
+def test_pulse_events_keyset_pagination(client, test_borger_id):
+    """Siderne følger next_cursor og giver alle rækker præcis én gang."""
+    _insert_pulse_series(client, test_borger_id, 5)
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"borger_id": test_borger_id, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/pulse-events", query_string=params)
+        assert response.status_code == 200
+        data = response.get_json()
+        seen.extend(e["bpm"] for e in data["events"])
+        pages += 1
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert seen == [64, 63, 62, 61, 60]
+
+
+def test_pulse_events_time_range_filter(client, test_borger_id):
+    """since/until begrænser listen til tidsintervallet."""
+    _insert_pulse_series(client, test_borger_id, 5)
+
+    response = client.get(
+        "/pulse-events",
+        query_string={
+            "borger_id": test_borger_id,
+            "since": "2024-03-01T11:00:00+00:00",
+            "until": "2024-03-01T13:00:00+00:00",
+        },
+    )
+    assert response.status_code == 200
+    assert [e["bpm"] for e in response.get_json()["events"]] == [62, 61]
+
+
+def test_event_list_invalid_cursor_gives_400(client):
+    """Et ødelagt cursor-token skal give 400."""
+    response = client.get("/box-events", query_string={"cursor": "ikke-et-token"})
+    assert response.status_code == 400
+
+
+def test_pulse_events_export_streams_all_rows(client, test_borger_id):
+    """/pulse-events/export streamer alle rækker som gyldig JSON."""
+    _insert_pulse_series(client, test_borger_id, 5)
+
+    from app import app, get_db_pool
+    app.config["EXPORT_ITERSIZE"] = 2
+    try:
+        response = client.get(
+            "/pulse-events/export", query_string={"borger_id": test_borger_id}
+        )
+        assert response.status_code == 200
+        assert response.is_streamed
+        data = response.get_json()
+        response.close()
+    finally:
+        app.config["EXPORT_ITERSIZE"] = 2000
+
+    assert [e["bpm"] for e in data["events"]] == [64, 63, 62, 61, 60]
+    # Forbindelsen skal være afleveret tilbage til poolen
+    assert get_db_pool().stats()["in_use"] == 0
+
+
+# ---------- LIVE-DASHBOARD ----------
+
+def test_dashboard_receives_pushed_pulse_event(client, test_borger_id):
+    """Et nyt pulse-event skal skubbes til dashboardet via Socket.IO."""
+    from app import app, socketio
+
+    sio = socketio.test_client(app, namespace="/dashboard", flask_test_client=client)
+    assert sio.is_connected(namespace="/dashboard")
+
+    token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post(
+        "/pulse-event", json={"borger_id": test_borger_id, "bpm": 77}, headers=headers
+    )
+    assert response.status_code == 201
+
+    received = sio.get_received(namespace="/dashboard")
+    sio.disconnect(namespace="/dashboard")
+
+    pulses = [m["args"][0] for m in received if m["name"] == "pulse_event"]
+    assert any(p["borger_id"] == test_borger_id and p["bpm"] == 77 for p in pulses)
+    assert all(p["navn"] == "Test Borger" for p in pulses if p["borger_id"] == test_borger_id)
+
+
+def test_dashboard_etag_gives_304_until_new_event(client, test_borger_id):
+    """Dashboardet svarer 304 på If-None-Match indtil der kommer et nyt event."""
+    response = client.get("/dashboard")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/box-event", json={"borger_id": test_borger_id, "box_open": False},
+                headers=headers)
+
+    response = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_dashboard_single_query_matches_buffer(client, test_borger_id):
+    """UNION ALL-forespørgslen giver de samme rækker som ringbufferen."""
+    from app import EVENT_TYPES, fetch_recent_events, recent_events
+
+    _insert_pulse_series(client, test_borger_id, 3)
+    client.get("/dashboard")
+    fetched = fetch_recent_events(10)
+    for kind in EVENT_TYPES:
+        assert [e["id"] for e in fetched[kind]] == [
+            e["id"] for e in recent_events.snapshot(kind)
+        ]
+
+
+# ---------- TOKEN-CACHE / TILBAGEKALDELSE ----------
+
+def test_verified_token_is_cached(client, test_borger_id):
+    """Andet kald med samme token skal ramme cachen i stedet for jwt.decode."""
+    from app import token_cache
+
+    token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"borger_id": test_borger_id, "box_open": True}
+
+    client.post("/box-event", json=payload, headers=headers)
+    hits = token_cache.stats()["hits"]
+    response = client.post("/box-event", json=payload, headers=headers)
+    assert response.status_code == 201
+    assert token_cache.stats()["hits"] == hits + 1
+
+
+def test_revoked_device_token_is_rejected(client, test_borger_id):
+    """Efter tilbagekaldelse afvises gamle tokens, men et nyt token virker."""
+    old_token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {old_token}"}
+    payload = {"borger_id": test_borger_id, "box_open": True}
+    assert client.post("/box-event", json=payload, headers=headers).status_code == 201
+
+    assert client.post("/token/1/revoke").status_code == 401
+    other = {"Authorization": f"Bearer {_get_token(client, user_id=2)}"}
+    assert client.post("/token/1/revoke", headers=other).status_code == 403
+    assert client.post("/box-event", json=payload, headers=headers).status_code == 201
+
+    response = client.post("/token/1/revoke", headers=headers)
+    assert response.status_code == 200
+    assert client.post("/box-event", json=payload, headers=headers).status_code == 401
+
+    new_token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {new_token}"}
+    assert client.post("/box-event", json=payload, headers=headers).status_code == 201
+
+
+def test_revoke_during_verification_is_not_cached(client, test_borger_id, monkeypatch):
+    """En tilbagekaldelse mellem revoked-tjekket og cache-put må ikke efterlade tokenet i cachen."""
+    from app import revoke_device, token_cache
+
+    token = _get_token(client, user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"borger_id": test_borger_id, "box_open": True}
+    put = token_cache.put
+
+    def put_after_revoke(*args, **kwargs):
+        revoke_device(1)
+        put(*args, **kwargs)
+
+    monkeypatch.setattr(token_cache, "put", put_after_revoke)
+    assert client.post("/box-event", json=payload, headers=headers).status_code == 401
+    monkeypatch.setattr(token_cache, "put", put)
+    assert token_cache.get(token) is None
+    assert client.post("/box-event", json=payload, headers=headers).status_code == 401
+
+
+def test_expired_token_is_rejected(client, test_borger_id):
+    """Et token med exp i fortiden skal give 401."""
+    from app import app
+
+    app.config["TOKEN_LIFETIME"] = -10
+    try:
+        token = _get_token(client, user_id=1)
+    finally:
+        app.config["TOKEN_LIFETIME"] = None
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"borger_id": test_borger_id, "box_open": True}
+    assert client.post("/box-event", json=payload, headers=headers).status_code == 401
@@ -0,0 +1,85 @@
+import sys
+import os
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from app import users
+from async_server import create_app
+
+
+def _run(scenario):
+    """Kører scenario(client) mod async-serveren på en lokal port."""
+    async def main():
+        async with TestClient(TestServer(create_app())) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def _headers() -> dict:
+    return {"Authorization": f"Bearer {users[0].get_token()}"}
+
+
+def test_async_ingest_and_list(test_borger_id):
+    """Events gemt via async-serveren kan listes igen med samme format som app.py."""
+    async def scenario(client):
+        for bpm in (61, 62, 63):
+            response = await client.post("/pulse-event", json={"borger_id": test_borger_id, "bpm": bpm},
+                                         headers=_headers())
+            assert response.status == 201
+            assert await response.json() == {"status": "ok"}
+
+        response = await client.get("/pulse-events", params={"borger_id": test_borger_id, "limit": 2})
+        assert response.status == 200
+        page = await response.json()
+        assert [e["bpm"] for e in page["events"]] == [63, 62]
+        assert page["events"][0]["navn"] == "Test Borger"
+
+        response = await client.get("/pulse-events", params={
+            "borger_id": test_borger_id, "limit": 2, "cursor": page["next_cursor"]})
+        page = await response.json()
+        assert [e["bpm"] for e in page["events"]] == [61]
+        assert page["next_cursor"] is None
+
+    _run(scenario)
+
+
+def test_async_auth_and_validation(test_borger_id):
+    """Manglende token giver 401, forkerte felter 422 og ukendt borger 400."""
+    async def scenario(client):
+        response = await client.post("/box-event", json={"borger_id": test_borger_id, "box_open": True})
+        assert response.status == 401
+
+        response = await client.post("/box-event", json={"borger_id": test_borger_id},
+                                     headers=_headers())
+        assert response.status == 422
+        assert "box_open" in (await response.json())["detail"]["json"]
+
+        response = await client.post("/box-event", json={"borger_id": 999999, "box_open": True},
+                                     headers=_headers())
+        assert response.status == 400
+
+        response = await client.get("/box-events", params={"cursor": "ikke-en-cursor"})
+        assert response.status == 400
+
+    _run(scenario)
+
+
+def test_async_events_batch(test_borger_id):
+    """Batch-ruten giver samme 207-resultater som app.py."""
+    async def scenario(client):
+        payload = {"events": [
+            {"type": "pulse", "borger_id": test_borger_id, "bpm": 70,
+             "created_at": "2024-03-01T10:00:00+00:00"},
+            {"type": "box", "borger_id": 999999, "box_open": True},
+            {"type": "vibration", "borger_id": test_borger_id, "signaled": True},
+        ]}
+        response = await client.post("/events/batch", json=payload, headers=_headers())
+        assert response.status == 207
+        data = await response.json()
+        assert data["accepted"] == 2
+        assert [r["status"] for r in data["results"]] == ["ok", "error", "ok"]
+
+    _run(scenario)
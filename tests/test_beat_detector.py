@@ -0,0 +1,88 @@
+import sys
+import os
+import math
+import random
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "ESP32_koder"))
+
+from beat_detector import BeatDetector
+
+SAMPLE_MS = 5
+
+
+def _trace(ibis_ms, baseline=1900, amplitude=600, noise=25, drift=150, seed=1):
+    """
+    Syntetisk ADC-spor (200 Hz): en skarp systolisk top pr. slag plus en
+    lille dikrotisk top, støj og langsom baseline-drift – som pulssensoren.
+    """
+    rng = random.Random(seed)
+    beats = []
+    t = 200
+    for ibi in ibis_ms:
+        beats.append(t)
+        t += ibi
+    samples = []
+    for t_ms in range(0, t, SAMPLE_MS):
+        v = baseline + drift * math.sin(2 * math.pi * t_ms / 7000)
+        for b in beats:
+            dt = t_ms - b
+            if -100 < dt < 400:
+                v += amplitude * math.exp(-((dt - 40) / 35) ** 2)
+                v += 0.25 * amplitude * math.exp(-((dt - 250) / 40) ** 2)
+        v += rng.gauss(0, noise)
+        samples.append((t_ms, max(0, min(4095, int(v)))))
+    return samples
+
+
+def _run(detector, samples):
+    beats = [t for t, v in samples if detector.update(v, t)]
+    return beats
+
+
+def test_detects_steady_pulse():
+    """72 bpm med drift og støj: hvert slag findes én gang, og BPM bliver 72."""
+    samples = _trace([833] * 12)
+    detector = BeatDetector()
+    beats = _run(detector, samples)
+    assert len(beats) == 12
+    assert detector.bpm() == 72
+
+
+def test_adapts_to_low_amplitude_signal():
+    """Samme puls med en svag sensor (lavt niveau og amplitude) – ingen fast tærskel."""
+    samples = _trace([600] * 12, baseline=900, amplitude=180, noise=10)
+    detector = BeatDetector()
+    beats = _run(detector, samples)
+    assert len(beats) == 12
+    assert abs(detector.bpm() - 100) <= 2
+
+
+def test_rejects_irregular_intervals():
+    """Store spring mellem slag (fx bevægelse) giver ingen gyldig BPM."""
+    samples = _trace([450, 1300, 500, 1400, 480, 1350, 520, 1300, 450])
+    detector = BeatDetector()
+    _run(detector, samples)
+    assert detector.jitter() > detector.max_jitter
+    assert detector.bpm() is None
+
+
+def test_needs_min_beats_and_resets_after_pause():
+    detector = BeatDetector(min_beats=6)
+    _run(detector, _trace([800] * 4))
+    assert detector.bpm() is None            # kun 4 slag
+
+    # Pause længere end 60000/min_bpm -> bufferen startes forfra
+    detector = BeatDetector(min_beats=6)
+    _run(detector, _trace([800] * 6 + [2500] + [800] * 3))
+    assert detector.bpm() is None
+
+
+def test_running_statistics_match_window():
+    """Ringbufferens løbende sum svarer til de seneste `window` IBI'er."""
+    detector = BeatDetector(window=4)
+    for ibi in (700, 800, 900, 1000, 1100, 1200):
+        detector._push(ibi)
+    assert detector.mean_ibi() == (900 + 1000 + 1100 + 1200) / 4
+    mean = 1050
+    std = math.sqrt(sum((x - mean) ** 2 for x in (900, 1000, 1100, 1200)) / 4)
+    assert abs(detector.jitter() - std / mean) < 1e-9
@@ -0,0 +1,24 @@
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+import bench_hotpath
+
+
+def test_compare_flags_stages_past_threshold():
+    """Et trin er kun en regression, når det er mere end tærsklen langsommere."""
+    baseline = {"validate_box_event": 10.0, "insert": 400.0, "end_to_end": 2000.0}
+    results = {"validate_box_event": 12.5, "insert": 560.0, "end_to_end": 1500.0, "ny_stage": 1.0}
+    rows = bench_hotpath.compare(results, baseline, 0.2, {"insert": 0.5})
+    flagged = {name: regressed for name, _, _, _, _, regressed in rows}
+    assert flagged == {"validate_box_event": True, "insert": False, "end_to_end": False}
+
+
+def test_stage_threshold_arguments_override_defaults():
+    thresholds = bench_hotpath._parse_stage_thresholds(["insert=1.5", "json_response=0.1"])
+    assert thresholds["insert"] == 1.5
+    assert thresholds["json_response"] == 0.1
+    assert thresholds["end_to_end"] == bench_hotpath.STAGE_THRESHOLDS["end_to_end"]
@@ -0,0 +1,88 @@
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import DB_SETTINGS, borger_directory, get_db_connection, get_db_pool
+from borger_directory import BorgerDirectory, BorgerListener
+
+
+def test_known_depends_on_authoritative():
+    """Et ukendt id er kun sikkert ukendt, når kataloget er autoritativt."""
+    directory = BorgerDirectory()
+    directory.load([(1, "A")])
+    assert directory.known(1) is True
+    assert directory.known(2) is None
+    directory.authoritative = True
+    assert directory.known(2) is False
+
+
+def test_unknown_borger_rejected_without_db(client):
+    """Med autoritativt katalog afvises et ukendt borger_id uden DB-kald."""
+    token = client.post("/token/1").get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/dashboard")  # sørg for at kataloget er indlæst
+
+    borger_directory.authoritative = True
+    try:
+        before = get_db_pool().stats()["checkouts"]
+        response = client.post(
+            "/box-event", json={"borger_id": 999999, "box_open": True}, headers=headers
+        )
+        assert response.status_code == 400
+        assert get_db_pool().stats()["checkouts"] == before
+    finally:
+        borger_directory.authoritative = False
+
+
+def test_crud_keeps_directory_in_sync(client):
+    """Opret, omdøb og slet via API'et opdaterer kataloget."""
+    bid = client.post("/borger", json={"navn": "Katalog Test"}).get_json()["id"]
+    assert borger_directory.get(bid) == "Katalog Test"
+
+    client.put(f"/borger/{bid}", json={"navn": "Katalog Omdøbt"})
+    assert borger_directory.get(bid) == "Katalog Omdøbt"
+
+    client.delete(f"/borger/{bid}")
+    assert borger_directory.get(bid) is None
+
+
+def test_listener_applies_changes_from_other_process(test_borger_id):
+    """NOTIFY fra en anden forbindelse opdaterer kataloget via listeneren."""
+    directory = BorgerDirectory()
+    changed = []
+
+    def on_change(borger_id):
+        changed.append(borger_id)
+        directory.set(borger_id, "Fra NOTIFY")
+
+    listener = BorgerListener(
+        directory, on_change=on_change, on_resync=lambda: None,
+        poll_interval=0.1, **DB_SETTINGS,
+    )
+    listener.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not directory.authoritative and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert directory.authoritative
+
+        conn = get_db_connection()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_notify('borger_changed', %s);",
+                                (str(test_borger_id),))
+        finally:
+            conn.close()
+
+        deadline = time.monotonic() + 5
+        while not changed and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert changed == [test_borger_id]
+        assert directory.get(test_borger_id) == "Fra NOTIFY"
+    finally:
+        listener.stop()
+        listener.join(5)
+    assert not directory.authoritative
@@ -0,0 +1,132 @@
+import pytest
+import sys
+import os
+
+import psycopg2
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import DB_SETTINGS, get_db_pool
+from db_pool import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool():
+    """Lille pool kun til disse tests."""
+    p = ConnectionPool(1, 2, timeout=0.2, health_check_interval=0, **DB_SETTINGS)
+    yield p
+    p.closeall()
+
+
+def test_close_returns_connection_to_pool(pool):
+    """conn.close() skal aflevere forbindelsen, så den genbruges."""
+    conn = pool.getconn()
+    conn.close()
+    assert conn.closed
+    assert not conn.connection.closed
+
+    conn2 = pool.getconn()
+    assert conn2.connection is conn.connection
+    conn2.close()
+
+    stats = pool.stats()
+    assert stats["checkouts"] == 2
+    assert stats["connections_created"] == 1
+    assert stats["idle"] == 1
+    assert stats["in_use"] == 0
+
+
+def test_exhausted_pool_times_out(pool):
+    """Når maxconn er nået, skal getconn vente og derefter give PoolTimeout."""
+    c1 = pool.getconn()
+    c2 = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    c1.close()
+    c2.close()
+
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["timeouts"] == 1
+
+
+def test_broken_connection_is_replaced(pool):
+    """En død forbindelse i poolen fanges af health-check og erstattes."""
+    conn = pool.getconn()
+    conn.close()
+    # Luk den fysiske forbindelse bag om poolen
+    conn.connection.close()
+
+    conn2 = pool.getconn()
+    assert conn2.connection is not conn.connection
+    with conn2.cursor() as cur:
+        cur.execute("SELECT 1;")
+        assert cur.fetchone()[0] == 1
+    conn2.close()
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_closed_connection_releases_its_slot():
+    """En forbindelse psycopg2 har lukket (backend dræbt) skal stadig frigive pladsen ved close()."""
+    pool = ConnectionPool(0, 2, timeout=0.2, **DB_SETTINGS)
+    killer = psycopg2.connect(**DB_SETTINGS)
+    killer.autocommit = True
+    try:
+        for _ in range(3):
+            conn = pool.getconn()
+            with killer.cursor() as cur:
+                cur.execute("SELECT pg_terminate_backend(%s);", (conn.get_backend_pid(),))
+            with pytest.raises(psycopg2.OperationalError):
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+            assert conn.closed
+            conn.close()
+            assert pool.stats()["in_use"] == 0
+
+        conn = pool.getconn()
+        conn.close()
+        assert pool.stats()["connections_discarded"] == 3
+    finally:
+        killer.close()
+        pool.closeall()
+
+
+def test_open_transaction_is_rolled_back(pool):
+    """En forbindelse med åben transaktion rulles tilbage ved aflevering."""
+    conn = pool.getconn()
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1;")
+    conn.close()
+
+    conn2 = pool.getconn()
+    assert conn2.connection is conn.connection
+    assert conn2.get_transaction_status() == 0  # IDLE
+    conn2.close()
+
+
+def test_second_close_does_not_return_a_relent_connection(pool):
+    """Et ekstra close() på et gammelt udlån må ikke aflevere en andens forbindelse."""
+    c1 = pool.getconn()
+    c1.close()
+    c2 = pool.getconn()
+    assert c2.connection is c1.connection
+    c1.close()
+    assert pool.stats()["in_use"] == 1
+
+    c3 = pool.getconn()
+    assert c3.connection is not c2.connection
+    with c2.cursor() as cur:
+        cur.execute("SELECT 1;")
+    with pytest.raises(psycopg2.InterfaceError):
+        c1.cursor()
+    c2.close()
+    c3.close()
+    assert pool.stats()["in_use"] == 0
+
+
+def test_app_uses_shared_pool(client):
+    """Routes skal låne fra app'ens fælles pool."""
+    before = get_db_pool().stats()["checkouts"]
+    response = client.get("/borger")
+    assert response.status_code == 200
+    assert get_db_pool().stats()["checkouts"] == before + 1
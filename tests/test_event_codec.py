@@ -0,0 +1,58 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import event_codec
+from app import users
+
+
+def _headers() -> dict:
+    return {"Authorization": f"Bearer {users[0].get_token()}",
+            "Content-Type": event_codec.MIMETYPE}
+
+
+def test_encode_decode_roundtrip():
+    """Flere records i én body, 11 bytes pr. record plus 5 bytes header."""
+    records = [
+        ("box", 7, True, 1709287200),
+        ("pulse", 7, 72, 0),
+        ("vibration", 70000, False, 1709287260),
+    ]
+    body = event_codec.encode(records)
+    assert len(body) == event_codec.HEADER_SIZE + 3 * event_codec.RECORD_SIZE == 38
+    assert event_codec.decode(body) == records
+
+
+@pytest.mark.parametrize("body", [
+    b"",
+    b"XX\x01\x00\x00",                                  # forkert magic
+    event_codec.encode([("pulse", 1, 60, 0)])[:-1],     # afkortet record
+    b"IE\x01\x01\x00" + b"\x09" + bytes(10),            # ukendt type
+])
+def test_decode_rejects_malformed(body):
+    with pytest.raises(event_codec.CodecError):
+        event_codec.decode(body)
+
+
+def test_events_batch_accepts_binary_body(client, test_borger_id):
+    """/events/batch vælger afkodning ud fra Content-Type; svaret er det samme."""
+    body = event_codec.encode([
+        ("pulse", test_borger_id, 81, 1709287200),
+        ("box", 999999, True, 0),
+        ("vibration", test_borger_id, True, 0),
+    ])
+    response = client.post("/events/batch", data=body, headers=_headers())
+    assert response.status_code == 207
+    data = response.get_json()
+    assert [r["status"] for r in data["results"]] == ["ok", "error", "ok"]
+
+    response = client.get("/pulse-events", query_string={"borger_id": test_borger_id})
+    [event] = response.get_json()["events"]
+    assert event["bpm"] == 81
+    assert "01 Mar 2024 10:00:00" in event["created_at"]
+
+    response = client.post("/events/batch", data=b"IE\x01\xff\xff", headers=_headers())
+    assert response.status_code == 400
@@ -0,0 +1,111 @@
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import app as app_module
+from app import get_db_connection
+from ingest_queue import QueueFull, WriteBehindQueue
+
+
+def test_flush_coalesces_events_by_size():
+    """Events samles til batches på højst batch_size."""
+    batches = []
+    q = WriteBehindQueue(
+        lambda batch: batches.append(list(batch)) or [True] * len(batch),
+        batch_size=4,
+        flush_interval=0.5,
+    )
+    for i in range(10):
+        q.put(i)
+    q.start()
+    q.stop()
+
+    assert [e for b in batches for e in b] == list(range(10))
+    assert all(len(b) <= 4 for b in batches)
+    stats = q.stats()
+    assert stats["flushed_events"] == 10
+    assert stats["depth"] == 0
+
+
+def test_full_queue_gives_backpressure():
+    """Når køen er fuld, skal put rejse QueueFull i stedet for at blokere."""
+    q = WriteBehindQueue(lambda batch: [True] * len(batch), maxsize=2, put_timeout=0.01)
+    q.put(1)
+    q.put(2)
+    with pytest.raises(QueueFull):
+        q.put(3)
+    assert q.stats()["backpressure_rejections"] == 1
+    q.stop()
+    assert q.stats()["flushed_events"] == 2
+
+
+def test_failed_flush_is_retried():
+    """En flush der fejler, prøves igen."""
+    calls = []
+
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("db nede")
+        return [True] * len(batch)
+
+    q = WriteBehindQueue(flaky, flush_interval=0.01)
+    q.put("a")
+    q.stop()
+    assert len(calls) == 2
+    stats = q.stats()
+    assert stats["flush_errors"] == 1
+    assert stats["flushed_events"] == 1
+
+
+def test_put_after_stop_is_rejected():
+    """Efter nedlukning modtager køen ikke flere events."""
+    q = WriteBehindQueue(lambda batch: [True] * len(batch))
+    q.start()
+    q.stop()
+    with pytest.raises(QueueFull):
+        q.put(1)
+
+
+@pytest.fixture
+def write_behind():
+    """Slår write-behind til med en frisk kø og lukker den bagefter."""
+    app_module.app.config["WRITE_BEHIND"] = True
+    app_module._ingest_queue = None
+    yield
+    q = app_module._ingest_queue
+    if q is not None:
+        q.stop()
+    app_module._ingest_queue = None
+    app_module.app.config["WRITE_BEHIND"] = False
+
+
+def test_pulse_event_write_behind(client, test_borger_id, write_behind):
+    """I write-behind mode svarer /pulse-event 202 og rækken skrives ved flush."""
+    response = client.post("/token/1")
+    headers = {"Authorization": f"Bearer {response.get_json()['token']}"}
+
+    response = client.post(
+        "/pulse-event", json={"borger_id": test_borger_id, "bpm": 81}, headers=headers
+    )
+    assert response.status_code == 202
+    assert response.get_json()["status"] == "queued"
+
+    app_module._ingest_queue.stop()
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT bpm FROM pulse_events WHERE borger_id = %s;",
+                    (test_borger_id,),
+                )
+                row = cur.fetchone()
+    finally:
+        conn.close()
+
+    assert row is not None
+    assert row[0] == 81
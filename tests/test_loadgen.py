@@ -0,0 +1,125 @@
+import sys
+import os
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from werkzeug.serving import make_server
+
+import loadgen
+from app import app
+
+
+def test_summarize_percentiles():
+    """Nearest-rank percentiler i millisekunder."""
+    summary = loadgen.summarize([i / 1000 for i in range(100, 0, -1)])
+    assert summary["count"] == 100
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert summary["max_ms"] == 100.0
+    assert loadgen.summarize([])["p50_ms"] is None
+    assert loadgen.percentile([1, 2, 3], 0.5) == 2
+    assert loadgen.percentile([1, 2, 3], 0.0) == 1
+
+
+class _FakeFleet:
+    """Fleet uden netværk: svarer med faste statuskoder pr. route."""
+
+    base = token_base = "http://fake"
+
+    def __init__(self, statuses: dict):
+        self.statuses = statuses
+        self.recorder = loadgen.Recorder()
+        self.sent = []
+
+    async def request(self, route, method, url, scheduled, events=1, **kwargs):
+        status = self.statuses[route]
+        self.sent.append((route, events))
+        if status >= 400:
+            if status != 401:
+                self.recorder.error(route, status)
+            return status, None
+        self.recorder.ok(route, 0.0, 0.0, events)
+        return status, {"token": "t"} if route == "token" else None
+
+
+def test_failed_relogin_counts_as_error():
+    """401 efterfulgt af et mislykket login tælles som fejl (og uden gentagelse)."""
+    fleet = _FakeFleet({"pulse-event": 401, "token": 404})
+    device = loadgen.VirtualDevice(1, 1, {"pulse": 60}, loadgen.random.Random(1))
+    loadgen.asyncio.run(device._send_json(fleet, "pulse", 70, 0.0))
+    assert fleet.recorder.errors["pulse-event"] == {"401": 1}
+    assert [route for route, _ in fleet.sent] == ["pulse-event", "token"]
+
+
+def test_pending_batch_is_flushed_at_deadline():
+    fleet = _FakeFleet({"token": 200, "events/batch": 201})
+    device = loadgen.VirtualDevice(1, 1, {"pulse": 6000}, loadgen.random.Random(1), batch_size=1000)
+    loadgen.asyncio.run(device.run(fleet, 0, loadgen.time.perf_counter() + 0.2))
+    assert device._pending == []
+    batches = [events for route, events in fleet.sent if route == "events/batch"]
+    assert len(batches) == 1 and batches[0] > 0
+    assert fleet.recorder.events["events/batch"] == batches[0]
+
+
+def test_report_separates_errors_and_token_route():
+    recorder = loadgen.Recorder()
+    recorder.ok("token", 0.01, 0.01)
+    for _ in range(3):
+        recorder.ok("pulse-event", 0.02, 0.01)
+    recorder.error("pulse-event", 422)
+    report = recorder.report(2.0)
+    assert report["requests"] == 4
+    assert report["error_rate"] == 0.25
+    assert report["routes"]["pulse-event"]["error_kinds"] == {"422": 1}
+    assert report["routes"]["token"]["requests"] == 1
+
+
+def test_failed_logins_count_and_fail_the_run(monkeypatch):
+    """Kan ingen enhed logge ind, er fejlraten 100 % og kørslen fejler."""
+    fleet = _FakeFleet({"token": 404})
+    device = loadgen.VirtualDevice(1, 1, {"pulse": 60}, loadgen.random.Random(1))
+    loadgen.asyncio.run(device.run(fleet, 0, loadgen.time.perf_counter() + 0.1))
+    report = fleet.recorder.report(1.0)
+    assert (report["requests"], report["errors"], report["completed"]) == (1, 1, 0)
+    assert report["error_rate"] == 1.0
+
+    async def fake_run(args):
+        return report
+
+    monkeypatch.setattr(loadgen, "run", fake_run)
+    assert loadgen.main(["--max-error-rate", "1.0"]) == 1
+
+
+def _serve():
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def test_fleet_against_flask_server():
+    """En lille flåde (JSON og binære batches) mod Flask-appen uden fejl."""
+    server, base = _serve()
+    try:
+        args = loadgen.parse_args([
+            "--base", base, "--boxes", "6", "--wristbands", "4", "--seconds", "1.5",
+            "--ramp", "0.2", "--box-rate", "240", "--pulse-rate", "120", "--vibration-rate", "60",
+        ])
+        report = loadgen.asyncio.run(loadgen.run(args))
+        assert report["errors"] == 0
+        assert report["routes"]["token"]["requests"] == 10
+        assert {"box-event", "pulse-event", "vibration-event"} <= set(report["routes"])
+        assert report["requests"] > 20
+        assert report["latency"]["p99_ms"] >= report["latency"]["p50_ms"]
+
+        args = loadgen.parse_args([
+            "--base", base, "--boxes", "4", "--wristbands", "0", "--seconds", "1.0",
+            "--ramp", "0", "--box-rate", "600", "--pulse-rate", "600", "--batch-size", "5",
+        ])
+        report = loadgen.asyncio.run(loadgen.run(args))
+        batch = report["routes"]["events/batch"]
+        assert batch["errors"] == 0
+        # Fulde batches på 5, plus højst én rest-batch pr. boks ved deadline
+        assert 5 * (batch["requests"] - 4) < batch["events"] <= 5 * batch["requests"]
+    finally:
+        server.shutdown()
@@ -0,0 +1,167 @@
+import sys
+import os
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import psycopg2.extras
+import pytest
+
+import db_pool
+import metrics
+import pulse_rollups
+from app import get_db_connection
+
+
+def _sample(text: str, line_start: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_start + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_counter_and_histogram_sum_across_threads():
+    """Hver tråd tæller i sin egen shard; render() lægger dem sammen – også efter trådene er stoppet."""
+    registry = metrics.Registry()
+    requests = registry.counter("test_requests_total", "Test.", ("route",))
+    latency = registry.histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1.0))
+
+    def work():
+        for i in range(1000):
+            requests.inc("/a")
+            latency.observe(0.05 if i % 2 else 0.5, "/a")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    requests.inc("/b", amount=3)
+
+    text = registry.render()
+    assert _sample(text, 'test_requests_total{route="/a"}') == 8000
+    assert _sample(text, 'test_requests_total{route="/b"}') == 3
+    assert _sample(text, 'test_seconds_bucket{route="/a",le="0.1"}') == 4000
+    assert _sample(text, 'test_seconds_bucket{route="/a",le="1.0"}') == 8000
+    assert _sample(text, 'test_seconds_bucket{route="/a",le="+Inf"}') == 8000
+    assert _sample(text, 'test_seconds_count{route="/a"}') == 8000
+    assert abs(_sample(text, 'test_seconds_sum{route="/a"}') - 8 * (500 * 0.05 + 500 * 0.5)) < 1e-6
+    # Stoppede tråde er foldet sammen
+    assert len(registry._shards) == 1
+
+
+def test_statement_label():
+    assert metrics.statement_label("SELECT id FROM borger WHERE id = %s;") == "SELECT borger"
+    assert metrics.statement_label(
+        b"\n  INSERT INTO pulse_events (borger_id, bpm) VALUES (1, 70)") == "INSERT pulse_events"
+    assert metrics.statement_label("UPDATE reminders SET weekdays = 1") == "UPDATE reminders"
+    assert metrics.statement_label("SELECT 1;") == "SELECT"
+
+
+def test_query_observer_sees_every_cursor_type():
+    """Poolens cursors (også DictCursor og execute_values) rapporterer til observerne."""
+    seen = []
+
+    def observer(cursor, query, params, seconds, error):
+        seen.append((metrics.statement_label(query), error is None))
+
+    db_pool.add_query_observer(observer)
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute("SELECT id FROM borger LIMIT 1;")
+            with conn.cursor() as cur:
+                psycopg2.extras.execute_values(cur, "SELECT * FROM (VALUES %s) v", [(1,), (2,)])
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT * FROM findes_ikke;")
+        except psycopg2.Error:
+            pass
+    finally:
+        conn.close()
+        db_pool.remove_query_observer(observer)
+
+    assert seen == [("SELECT borger", True), ("SELECT", True), ("SELECT findes_ikke", False)]
+
+
+def test_metrics_endpoint(client, test_borger_id):
+    """/metrics tæller requests pr. route-mønster, auth-fejl, ingest og DB-tid."""
+    before = client.get("/metrics").get_data(as_text=True)
+    token = client.post("/token/1").get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/pulse-event", json={"borger_id": test_borger_id, "bpm": 70},
+                       headers=headers).status_code == 201
+    assert client.post("/pulse-event", json={"borger_id": test_borger_id, "bpm": 70}).status_code == 401
+    assert client.post("/pulse-event", json={"borger_id": test_borger_id, "bpm": 70},
+                       headers={"Authorization": "Bearer forkert"}).status_code == 401
+    client.get(f"/borger/{test_borger_id}/pulse-stats")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    after = response.get_data(as_text=True)
+
+    def delta(sample):
+        return _sample(after, sample) - _sample(before, sample)
+
+    assert delta('iomt_http_requests_total{method="POST",route="/pulse-event",status="201"}') == 1
+    assert delta('iomt_http_requests_total{method="POST",route="/pulse-event",status="401"}') == 2
+    assert delta('iomt_http_requests_total{method="GET",route="/borger/<int:borger_id>/pulse-stats",'
+                 'status="200"}') == 1
+    assert delta('iomt_http_request_duration_seconds_count{method="POST",route="/pulse-event"}') == 3
+    assert delta('iomt_auth_failures_total{reason="missing"}') == 1
+    assert delta('iomt_auth_failures_total{reason="invalid"}') == 1
+    assert delta('iomt_ingest_events_total{type="pulse"}') == 1
+    assert delta('iomt_db_query_duration_seconds_count{statement="INSERT pulse_events"}') == 1
+    assert "iomt_db_pool_in_use" in after
+
+
+def test_collectors_for_caches_and_queues(client, monkeypatch):
+    """Token-cache, write-behind-kø og UDP-listener vises på /metrics; UDP-afvisninger pr. årsag."""
+    import app as app_module
+
+    class FakeListener:
+        def stats(self):
+            return {"datagrams": 7, "accepted_events": 4, "dropped_events": 0, "malformed": 1,
+                    "unknown_device": 0, "bad_signature": 1, "replayed": 1, "stale_session": 0,
+                    "devices": 1}
+
+    app_module.get_ingest_queue()
+    monkeypatch.setattr(app_module, "_udp_listener", FakeListener())
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert "iomt_token_cache_hits_total" in text
+    assert "iomt_ingest_queue_depth" in text
+    assert "iomt_ingest_queue_flushes_total" in text
+    assert _sample(text, "iomt_udp_accepted_events_total") == 4
+    assert _sample(text, 'iomt_udp_rejected_total{reason="replayed"}') == 1
+    assert _sample(text, 'iomt_udp_rejected_total{reason="bad_signature"}') == 1
+    assert text.count("# TYPE iomt_udp_rejected_total counter") == 1
+
+
+def test_ingest_counter_only_counts_committed_events(client, test_borger_id, monkeypatch):
+    """Rækker fra en transaktion der rulles tilbage tælles ikke som gemte."""
+    def fail(cur, rows):
+        raise RuntimeError("rollup fejlede")
+
+    token = client.post("/token/1").get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    sample = 'iomt_ingest_events_total{type="pulse"}'
+    before = _sample(metrics.registry.render(), sample)
+    monkeypatch.setattr(pulse_rollups, "update_rollups", fail)
+    with pytest.raises(RuntimeError):
+        client.post("/events/batch", headers=headers, json={"events": [
+            {"type": "pulse", "borger_id": test_borger_id, "bpm": 70},
+            {"type": "pulse", "borger_id": test_borger_id, "bpm": 71},
+        ]})
+    assert _sample(metrics.registry.render(), sample) == before
+
+    monkeypatch.undo()
+    response = client.post("/events/batch", headers=headers, json={"events": [
+        {"type": "pulse", "borger_id": test_borger_id, "bpm": 70},
+        {"type": "pulse", "borger_id": 999999, "bpm": 71},
+    ]})
+    assert response.status_code == 207
+    assert _sample(metrics.registry.render(), sample) == before + 1
@@ -0,0 +1,98 @@
+import sys
+import os
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import get_db_connection
+import pulse_rollups
+import pytest
+
+
+def _post_pulses(client, borger_id: int, values):
+    token = client.post("/token/1").get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for bpm in values:
+        response = client.post("/pulse-event", json={"borger_id": borger_id, "bpm": bpm},
+                               headers=headers)
+        assert response.status_code == 201
+
+
+def _rollup_rows(borger_id: int):
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                result = {}
+                for granularity, (table, _) in pulse_rollups.ROLLUP_TABLES.items():
+                    cur.execute(
+                        f"SELECT bucket, count, min, max, sum, sum_sq FROM {table} "
+                        "WHERE borger_id = %s ORDER BY bucket;",
+                        (borger_id,),
+                    )
+                    result[granularity] = cur.fetchall()
+                return result
+    finally:
+        conn.close()
+
+
+def test_parse_window():
+    assert pulse_rollups.parse_window("24h") == timedelta(hours=24)
+    assert pulse_rollups.parse_window("2w") == timedelta(weeks=2)
+    with pytest.raises(ValueError):
+        pulse_rollups.parse_window("7x")
+    assert pulse_rollups.parse_window("366d") == pulse_rollups.MAX_WINDOW
+    for too_long in ("367d", "53w", "8785h", "800000d", "99999999999w"):
+        with pytest.raises(ValueError):
+            pulse_rollups.parse_window(too_long)
+
+
+def test_pulse_stats_window_is_capped(client, test_borger_id):
+    """For lange vinduer afvises med 422 i stedet for at give OverflowError (500)."""
+    for window in ("52w", "8784h"):
+        response = client.get(f"/borger/{test_borger_id}/pulse-stats?window={window}")
+        assert response.status_code == 200
+    for window in ("800000d", "99999999999w"):
+        response = client.get(f"/borger/{test_borger_id}/pulse-stats?window={window}")
+        assert response.status_code == 422
+
+
+def test_pulse_stats_from_rollups(client, test_borger_id):
+    """/borger/<id>/pulse-stats svarer ud fra rollups opdateret ved insert."""
+    _post_pulses(client, test_borger_id, [60, 70, 80])
+
+    response = client.get(f"/borger/{test_borger_id}/pulse-stats?window=24h")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["granularity"] == "hour"
+    assert data["count"] == 3
+    assert data["min"] == 60
+    assert data["max"] == 80
+    assert data["mean"] == 70
+    assert data["stddev"] == pytest.approx(8.16, abs=0.01)
+
+    response = client.get(f"/borger/{test_borger_id}/pulse-stats?window=4w")
+    data = response.get_json()
+    assert data["granularity"] == "day"
+    assert data["count"] == 3
+
+
+def test_pulse_stats_unknown_borger_gives_404(client):
+    response = client.get("/borger/999999/pulse-stats")
+    assert response.status_code == 404
+
+
+def test_rebuild_matches_incremental_rollups(client, test_borger_id):
+    """Compaction fra rådata giver de samme rollups som de løbende opdateringer."""
+    _post_pulses(client, test_borger_id, [55, 65])
+    incremental = _rollup_rows(test_borger_id)
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                pulse_rollups.rebuild_rollups(cur)
+    finally:
+        conn.close()
+
+    assert _rollup_rows(test_borger_id) == incremental
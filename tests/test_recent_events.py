@@ -0,0 +1,77 @@
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import get_db_pool, recent_events
+from recent_events import RecentEvents
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _row(event_id: int, borger_id: int = 1, minutes: int = 0, navn: str = "A"):
+    return {"id": event_id, "borger_id": borger_id, "navn": navn,
+            "bpm": 60, "created_at": T0 + timedelta(minutes=minutes)}
+
+
+def test_buffer_keeps_newest_rows_in_order():
+    """Bufferen holder de maxlen nyeste rækker, nyeste først."""
+    buf = RecentEvents(["pulse"], maxlen=3)
+    buf.reload(lambda: {"pulse": [_row(1, minutes=1), _row(2, minutes=2)]})
+    buf.add("pulse", [_row(4, minutes=4), _row(3, minutes=3), _row(0, minutes=0)])
+
+    assert [r["id"] for r in buf.snapshot("pulse")] == [4, 3, 2]
+
+
+def test_rename_patches_buffered_rows():
+    """Omdøbning af en borger retter navnet uden genindlæsning."""
+    buf = RecentEvents(["pulse"], maxlen=3)
+    buf.reload(lambda: {"pulse": [_row(1, borger_id=7), _row(2, borger_id=8, minutes=1)]})
+    buf.rename_borger(7, "Nyt Navn")
+
+    names = {r["borger_id"]: r["navn"] for r in buf.snapshot("pulse")}
+    assert names == {7: "Nyt Navn", 8: "A"}
+    assert not buf.needs_reload
+
+
+def test_delete_invalidates_buffer():
+    """Sletning fjerner rækkerne og kræver genindlæsning af de ældre."""
+    buf = RecentEvents(["pulse"], maxlen=3)
+    buf.reload(lambda: {"pulse": [_row(1, borger_id=7), _row(2, borger_id=8, minutes=1)]})
+    buf.remove_borger(7)
+
+    assert [r["id"] for r in buf.snapshot("pulse")] == [2]
+    assert buf.needs_reload
+
+
+def test_changes_during_reload_are_kept():
+    """Events der indsættes mens bufferen genindlæses, går ikke tabt."""
+    buf = RecentEvents(["pulse"], maxlen=3)
+
+    def fetch():
+        buf.add("pulse", [_row(5, minutes=5)])
+        return {"pulse": [_row(1, minutes=1)]}
+
+    buf.reload(fetch)
+    assert [r["id"] for r in buf.snapshot("pulse")] == [5, 1]
+
+
+def test_dashboard_served_from_buffer(client, test_borger_id):
+    """Efter første visning vises nye events uden databasekald."""
+    client.get("/dashboard")
+    token = client.post("/token/1").get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/pulse-event", json={"borger_id": test_borger_id, "bpm": 123},
+                headers=headers)
+    client.put(f"/borger/{test_borger_id}", json={"navn": "Omdøbt Borger"})
+
+    before = get_db_pool().stats()["checkouts"]
+    response = client.get("/dashboard")
+    assert response.status_code == 200
+    assert get_db_pool().stats()["checkouts"] == before
+
+    html = response.get_data(as_text=True)
+    assert "123" in html
+    assert "Omdøbt Borger" in html
+    assert recent_events.snapshot("pulse")[0]["bpm"] == 123
@@ -0,0 +1,140 @@
+import sys
+import os
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import app
+from reminders import ALL_DAYS, ReminderScheduler, mask_days, next_fire, weekdays_mask
+
+CPH = ZoneInfo("Europe/Copenhagen")
+
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_next_fire_follows_local_time_across_dst():
+    """08:00 lokal tid er 07:00 UTC om vinteren og 06:00 UTC om sommeren."""
+    assert next_fire(time(8, 0), ALL_DAYS, CPH, _utc(2026, 1, 15, 12)) == _utc(2026, 1, 16, 7)
+    assert next_fire(time(8, 0), ALL_DAYS, CPH, _utc(2026, 6, 15, 5)) == _utc(2026, 6, 15, 6)
+    # 02:30 findes ikke den dag sommertiden starter -> 03:30 sommertid
+    assert next_fire(time(2, 30), ALL_DAYS, CPH, _utc(2026, 3, 28, 12)) == _utc(2026, 3, 29, 1, 30)
+
+
+def test_next_fire_respects_weekdays():
+    mondays = weekdays_mask([0])
+    assert mask_days(mondays) == [0]
+    # Tirsdag 2026-03-03 -> mandag 2026-03-09
+    fire_at = next_fire(time(9, 0), mondays, CPH, _utc(2026, 3, 3, 10))
+    assert fire_at.astimezone(CPH) == datetime(2026, 3, 9, 9, 0, tzinfo=CPH)
+    assert next_fire(time(9, 0), 0, CPH, _utc(2026, 3, 3, 10)) is None
+
+
+def test_scheduler_orders_per_device_and_rolls_forward():
+    now = _utc(2026, 1, 15, 6)  # 07:00 lokal tid
+    scheduler = ReminderScheduler(CPH)
+    scheduler.set(1, 10, 2, time(20, 0), ALL_DAYS, now=now)
+    scheduler.set(2, 10, 2, time(8, 0), ALL_DAYS, now=now)
+    scheduler.set(3, 11, 5, time(7, 30), ALL_DAYS, now=now)
+
+    fire_at, reminder = scheduler.next_for(2, now)
+    assert (reminder.id, fire_at) == (2, _utc(2026, 1, 15, 7))
+    assert scheduler.next_for(5, now)[1].id == 3
+
+    # Efter kl. 08 er aftenens påmindelse den næste, og 08:00 er rykket til i morgen
+    fire_at, reminder = scheduler.next_for(2, _utc(2026, 1, 15, 7))
+    assert (reminder.id, fire_at) == (1, _utc(2026, 1, 15, 19))
+    fire_at, reminder = scheduler.next_for(2, _utc(2026, 1, 15, 19))
+    assert (reminder.id, fire_at) == (2, _utc(2026, 1, 16, 7))
+    assert scheduler.next_for(99, now) is None
+
+
+def test_scheduler_lazy_deletion_and_compaction():
+    """Ændrede/slettede påmindelser springes over, og heapen vokser ikke ubegrænset."""
+    now = _utc(2026, 1, 15, 6)
+    scheduler = ReminderScheduler(CPH)
+    scheduler.set(1, 10, 2, time(8, 0), ALL_DAYS, now=now)
+    scheduler.set(2, 10, 2, time(9, 0), ALL_DAYS, now=now)
+
+    scheduler.set(1, 10, 2, time(10, 0), ALL_DAYS, now=now)  # flyttet til 10:00
+    assert scheduler.next_for(2, now)[1].id == 2
+    assert scheduler.remove(2)
+    fire_at, reminder = scheduler.next_for(2, now)
+    assert (reminder.id, fire_at) == (1, _utc(2026, 1, 15, 9))
+
+    for minute in range(50):
+        scheduler.set(1, 10, 2, time(10, minute), ALL_DAYS, now=now)
+    assert scheduler.heap_size(2) <= 3
+    assert scheduler.next_for(2, now)[1].time_of_day == time(10, 49)
+
+    # Borger slettet -> enheden har ingen påmindelser
+    scheduler.remove_borger(10)
+    assert scheduler.next_for(2, now) is None
+
+
+def test_reminder_api_and_next_for_device(client, test_borger_id):
+    """CRUD på påmindelser og GET /reminders/next med armbåndets token."""
+    soon = (datetime.now(CPH) + timedelta(minutes=2)).strftime("%H:%M")
+    try:
+        response = client.post(f"/borger/{test_borger_id}/reminders",
+                               json={"time": soon, "device_id": 2})
+        assert response.status_code == 201
+        reminder = response.get_json()
+        assert reminder["weekdays"] == list(range(7))
+
+        assert client.post(f"/borger/{test_borger_id}/reminders",
+                           json={"time": "08:00", "device_id": 99}).status_code == 400
+        assert client.post(f"/borger/{test_borger_id}/reminders",
+                           json={"time": "25:00", "device_id": 2}).status_code == 422
+
+        listed = client.get(f"/borger/{test_borger_id}/reminders").get_json()["reminders"]
+        assert [r["id"] for r in listed] == [reminder["id"]]
+
+        assert client.get("/reminders/next").status_code == 401
+        token = client.post("/token/2").get_json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        nxt = client.get("/reminders/next", headers=headers).get_json()
+        assert nxt["reminder_id"] == reminder["id"]
+        assert nxt["borger_id"] == test_borger_id
+        assert 0 < nxt["in_seconds"] <= 120
+
+        # Efter vibration spørger armbåndet med after -> samme tid i morgen
+        nxt = client.get(f"/reminders/next?after={nxt['epoch']}", headers=headers).get_json()
+        assert nxt["reminder_id"] == reminder["id"]
+        assert nxt["in_seconds"] > 22 * 3600
+
+        response = client.put(f"/reminders/{reminder['id']}",
+                              json={"time": "07:15", "device_id": 2, "weekdays": [5, 6]})
+        assert response.status_code == 200
+        assert response.get_json()["weekdays"] == [5, 6]
+
+        assert client.delete(f"/reminders/{reminder['id']}").status_code == 200
+        assert client.delete(f"/reminders/{reminder['id']}").status_code == 404
+        assert client.get(f"/borger/{test_borger_id}/reminders").get_json()["reminders"] == []
+    finally:
+        client.delete(f"/borger/{test_borger_id}")
+
+
+def test_next_reminder_after_is_bounded_and_clamped(client, test_borger_id):
+    """after uden for uint32 giver 422; et gammelt after (forkert RTC) giver ikke passerede påmindelser."""
+    earlier = (datetime.now(CPH) - timedelta(hours=2)).strftime("%H:%M")
+    try:
+        assert client.post(f"/borger/{test_borger_id}/reminders",
+                           json={"time": earlier, "device_id": 2}).status_code == 201
+        token = client.post("/token/2").get_json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        assert client.get(f"/reminders/next?after={10**12}", headers=headers).status_code == 422
+
+        grace = app.config["REMINDER_GRACE_SECONDS"]
+        now = datetime.now(timezone.utc).timestamp()
+        for after in (0, int(now) - 3 * 86400):
+            response = client.get(f"/reminders/next?after={after}", headers=headers)
+            assert response.status_code == 200
+            nxt = response.get_json()
+            assert nxt["epoch"] > now - grace
+            assert nxt["in_seconds"] > 0
+    finally:
+        client.delete(f"/borger/{test_borger_id}")
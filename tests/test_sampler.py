@@ -0,0 +1,66 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "ESP32_koder"))
+
+from beat_detector import BeatDetector
+from sampler import Average, SampleRing, Sampler
+from test_beat_detector import _trace
+
+
+def test_ring_drain_returns_samples_in_order():
+    ring = SampleRing(size=4)
+    for i in range(3):
+        ring.put(100 + i, i * 5)
+    seen = []
+    cursor = ring.drain(0, lambda v, t: seen.append((v, t)))
+    assert cursor == 3
+    assert seen == [(100, 0), (101, 5), (102, 10)]
+
+    # Intet nyt -> fn kaldes ikke
+    assert ring.drain(cursor, lambda v, t: seen.append(v)) == 3
+    assert len(seen) == 3
+
+
+def test_ring_overrun_skips_overwritten_samples():
+    """En læser der er mere end `size` bagud får kun de nyeste målinger."""
+    ring = SampleRing(size=4)
+    for i in range(10):
+        ring.put(i, i)
+    seen = []
+    cursor = ring.drain(0, lambda v, t: seen.append(v))
+    assert cursor == 10
+    assert seen == [6, 7, 8, 9]
+    assert ring.overruns == 6
+
+
+def test_average_publishes_block_means():
+    avg = Average(samples=3)
+    for v in (10, 20):
+        avg.add(v)
+    assert avg.value is None and avg.seq == 0
+    avg.add(30)
+    assert avg.value == 20 and avg.seq == 1
+    for v in (1, 2, 3):
+        avg.add(v)
+    assert avg.value == 2 and avg.seq == 2
+
+
+def test_pulse_path_through_sampler_finds_bpm():
+    """Pulsspor gennem sampleren og drain() i klumper giver samme BPM som direkte."""
+    samples = _trace([833] * 12)
+    values = iter(v for _, v in samples)
+    sampler = Sampler(lambda: next(values), lambda: 2500, period_ms=5, ring_size=64)
+    detector = BeatDetector()
+
+    cursor = 0
+    for n, (t, _) in enumerate(samples, 1):
+        sampler.poll(t)
+        if n % 4 == 0:  # task_pulse tømmer hver 20. ms
+            cursor = sampler.pulse.drain(cursor, detector.update)
+    sampler.pulse.drain(cursor, detector.update)
+
+    assert sampler.pulse.overruns == 0
+    assert detector.beats == 12
+    assert detector.bpm() == 72
+    assert sampler.ldr.value == 2500
@@ -0,0 +1,92 @@
+import sys
+import os
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import get_db_connection
+import schema
+
+
+def test_migrate_is_idempotent():
+    """Anden kørsel af migrate må ikke gøre noget."""
+    conn = get_db_connection()
+    try:
+        assert schema.migrate(conn) == []
+        assert schema.current_version(conn) == schema.MIGRATIONS[-1][0]
+    finally:
+        conn.close()
+
+
+def test_event_tables_are_partitioned_with_indexes():
+    """Event-tabellerne er partitioneret og har (borger_id, created_at)-indeks."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                for table in schema.EVENT_TABLES:
+                    cur.execute(
+                        "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s);",
+                        (table,),
+                    )
+                    assert cur.fetchone()[0] == "p"
+                    cur.execute(
+                        "SELECT indexdef FROM pg_indexes WHERE tablename = %s;",
+                        (table,),
+                    )
+                    defs = " ".join(r[0] for r in cur.fetchall())
+                    assert "(borger_id, created_at)" in defs
+                    assert "(created_at, id)" in defs
+    finally:
+        conn.close()
+
+
+def test_current_month_partition_exists():
+    """Partitionen for indeværende måned er oprettet i forvejen."""
+    month = schema._month_start(date.today())
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass(%s);",
+                            (schema.partition_name("pulse_events", month),))
+                assert cur.fetchone()[0] is not None
+    finally:
+        conn.close()
+
+
+def test_new_partition_takes_rows_from_default(test_borger_id):
+    """Rækker i default-partitionen flyttes, når månedens partition oprettes."""
+    month = date(2099, 5, 1)
+    name = schema.partition_name("pulse_events", month)
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO pulse_events (borger_id, bpm, created_at)
+                    VALUES (%s, 70, '2099-05-10 12:00:00+00');
+                    """,
+                    (test_borger_id,),
+                )
+
+        created = schema.ensure_partitions(conn, months_ahead=0, today=month)
+        assert created == [schema.partition_name(t, month) for t in schema.EVENT_TABLES]
+
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT count(*) FROM {name} WHERE borger_id = %s;",
+                            (test_borger_id,))
+                assert cur.fetchone()[0] == 1
+                cur.execute(
+                    "SELECT count(*) FROM pulse_events_default WHERE borger_id = %s;",
+                    (test_borger_id,),
+                )
+                assert cur.fetchone()[0] == 0
+    finally:
+        with conn:
+            with conn.cursor() as cur:
+                for table in schema.EVENT_TABLES:
+                    cur.execute(f"DROP TABLE IF EXISTS {schema.partition_name(table, month)};")
+        conn.close()
@@ -0,0 +1,129 @@
+import sys
+import os
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import db_pool
+from app import get_db_connection
+from slow_query import SlowQueryLog, file_logger
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _observed(log: SlowQueryLog, scenario):
+    """Kører scenario(conn) med log som query-observer; returnerer de loggede beskeder."""
+    handler = _ListHandler()
+    log.logger = logging.getLogger(f"test_slow_query_{id(log)}")
+    log.logger.addHandler(handler)
+    log.logger.propagate = False
+    db_pool.add_query_observer(log)
+    conn = get_db_connection()
+    try:
+        scenario(conn)
+    finally:
+        conn.close()
+        db_pool.remove_query_observer(log)
+    return handler.messages
+
+
+def test_logs_slow_statement_with_params_and_call_site():
+    """Kun statements over tærsklen logges – med parametre og linjen i vores kode."""
+    log = SlowQueryLog(threshold_ms=50)
+
+    def scenario(conn):
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+                cur.execute("SELECT pg_sleep(%s), %s;", (0.08, "hemmelig"))
+
+    messages = _observed(log, scenario)
+    assert len(messages) == 1
+    first_line = messages[0].splitlines()[0]
+    assert first_line.startswith("SLOW ")
+    assert "test_slow_query.py:" in first_line and "(scenario)" in first_line
+    assert "SELECT pg_sleep(%s), %s;" in messages[0]
+    assert "(0.08, 'hemmelig')" in messages[0]
+    assert "plan:" not in messages[0]
+
+
+def test_explain_select_and_rolled_back_dml(test_borger_id):
+    """EXPLAIN ANALYZE for SELECT, og for INSERT i en savepoint så rækken ikke indsættes to gange."""
+    log = SlowQueryLog(threshold_ms=0, explain_sample=1.0)
+
+    def scenario(conn):
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT count(*) FROM pulse_events WHERE borger_id = %s;",
+                            (test_borger_id,))
+                cur.execute("INSERT INTO pulse_events (borger_id, bpm) VALUES (%s, 66);",
+                            (test_borger_id,))
+
+    messages = _observed(log, scenario)
+    assert len(messages) == 2
+    assert all("plan:" in m and "actual time=" in m for m in messages)
+    assert log.explained == 2
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT count(*) FROM pulse_events WHERE borger_id = %s;",
+                            (test_borger_id,))
+                assert cur.fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def test_no_explain_for_named_cursor_or_autocommit_dml(test_borger_id):
+    log = SlowQueryLog(threshold_ms=0, explain_sample=1.0)
+
+    def scenario(conn):
+        with conn:
+            with conn.cursor(name="eksport") as cur:
+                cur.execute("SELECT id FROM pulse_events WHERE borger_id = %s;", (test_borger_id,))
+                cur.fetchall()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM pulse_events WHERE borger_id = %s;", (test_borger_id,))
+        finally:
+            conn.autocommit = False
+
+    messages = _observed(log, scenario)
+    assert len(messages) == 2
+    assert not any("plan:" in m for m in messages)
+    assert log.explained == 0
+
+
+def test_file_logger_rotates(tmp_path):
+    path = tmp_path / "slow.log"
+    logger = file_logger(str(path), max_bytes=200, backups=2, name="test_slow_query_file")
+    for i in range(20):
+        logger.warning("SLOW %d ms " % i + "x" * 50)
+    assert path.exists()
+    assert (tmp_path / "slow.log.1").exists()
+    assert not (tmp_path / "slow.log.3").exists()
+
+
+def test_app_slow_query_log_is_off_by_default_and_configurable(client, tmp_path):
+    import app as app_module
+
+    assert app_module.slow_query_log is None
+    app_module.app.config["SLOW_QUERY_MS"] = 0.0
+    app_module.app.config["SLOW_QUERY_LOG"] = str(tmp_path / "logs" / "slow.log")
+    try:
+        app_module.setup_slow_query_log()
+        client.get("/borger")
+    finally:
+        app_module.app.config["SLOW_QUERY_MS"] = None
+        app_module.setup_slow_query_log()
+    assert app_module.slow_query_log is None
+    assert "SLOW " in (tmp_path / "logs" / "slow.log").read_text(encoding="utf-8")
@@ -0,0 +1,100 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "ESP32_koder"))
+
+import event_codec
+from spool import Backoff, Spool, upload_once, upload_result
+
+
+def test_spool_survives_reopen(tmp_path):
+    """Events og position ligger i filen, så de overlever en genstart."""
+    path = str(tmp_path / "spool.bin")
+    spool = Spool(path, capacity=8)
+    spool.push("box", 1, True, 1709287200)
+    spool.push("pulse", 1, 72, 0)
+    spool.commit(1)
+    spool.close()
+
+    spool = Spool(path, capacity=8)
+    assert len(spool) == 1
+    assert spool.peek(10) == [("pulse", 1, 72, 0)]
+
+
+def test_spool_overwrites_oldest_when_full(tmp_path):
+    spool = Spool(str(tmp_path / "spool.bin"), capacity=4)
+    for bpm in range(60, 66):
+        spool.push("pulse", 1, bpm, 0)
+    assert len(spool) == 4
+    assert spool.dropped == 2
+    assert [r[2] for r in spool.peek(10)] == [62, 63, 64, 65]
+
+
+def test_batch_is_valid_codec_body_across_wrap(tmp_path):
+    """batch() giver en event_codec-body direkte fra filen, også hen over wrap."""
+    spool = Spool(str(tmp_path / "spool.bin"), capacity=4)
+    for bpm in range(60, 63):
+        spool.push("pulse", 2, bpm, 0)
+    spool.commit(2)
+    for bpm in range(63, 66):
+        spool.push("pulse", 2, bpm, 0)
+
+    body, count = spool.batch(10)
+    assert count == 4
+    assert [r[2] for r in event_codec.decode(body)] == [62, 63, 64, 65]
+
+
+def test_upload_once_commits_only_on_success(tmp_path):
+    spool = Spool(str(tmp_path / "spool.bin"), capacity=16)
+    for bpm in range(60, 65):
+        spool.push("pulse", 1, bpm, 0)
+
+    assert upload_once(spool, lambda body: None, max_records=2) == "retry"
+    assert len(spool) == 5
+    assert upload_once(spool, lambda body: 503, max_records=2) == "retry"
+    assert upload_once(spool, lambda body: 201, max_records=2) == "sent"
+    assert upload_once(spool, lambda body: 400, max_records=2) == "discarded"
+    assert len(spool) == 1
+    assert upload_once(spool, lambda body: 207, max_records=2) == "sent"
+    assert upload_once(spool, lambda body: 201) == "empty"
+
+
+def test_events_overwritten_during_upload_are_not_committed_twice(tmp_path):
+    """Fyldes spoolen mens en batch er undervejs, fjerner commit kun resten af batchen."""
+    spool = Spool(str(tmp_path / "spool.bin"), capacity=4)
+    for bpm in range(60, 64):
+        spool.push("pulse", 1, bpm, 0)
+    start = spool.head
+    body, count = spool.batch(3)
+    # Under uploaden: to nye events overskriver de to ældste (som er i batchen)
+    spool.push("pulse", 1, 64, 0)
+    spool.push("pulse", 1, 65, 0)
+    assert upload_result(spool, start, count, 201) == "sent"
+    assert [r[2] for r in spool.peek(10)] == [63, 64, 65]
+
+
+def test_backoff_grows_to_max_and_resets():
+    backoff = Backoff(base_ms=100, max_ms=1000)
+    delays = [backoff.next_ms() for _ in range(8)]
+    assert 50 <= delays[0] <= 100
+    assert 400 <= delays[3] <= 800
+    assert all(500 <= d <= 1000 for d in delays[4:])
+    backoff.reset()
+    assert backoff.next_ms() <= 100
+
+
+def test_spool_batch_accepted_by_server(client, test_borger_id, tmp_path):
+    """En batch direkte fra spoolen accepteres af /events/batch."""
+    spool = Spool(str(tmp_path / "spool.bin"), capacity=16)
+    spool.push("box", test_borger_id, True, 0)
+    spool.push("pulse", test_borger_id, 75, 0)
+    token = client.post("/token/1").get_json()["token"]
+
+    def send(body):
+        return client.post("/events/batch", data=body, headers={
+            "Authorization": f"Bearer {token}", "Content-Type": event_codec.MIMETYPE,
+        }).status_code
+
+    assert upload_once(spool, send) == "sent"
+    assert len(spool) == 0
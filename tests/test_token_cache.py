@@ -0,0 +1,43 @@
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from token_cache import TokenCache
+
+
+def test_lru_evicts_least_recently_used():
+    """Ved fuld cache fjernes det token der er brugt mindst for nylig."""
+    cache = TokenCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1      # "a" er nu senest brugt
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    """Et token lever ikke længere end ttl eller sit eget exp."""
+    cache = TokenCache(ttl=0.05)
+    cache.put("a", 1)
+    cache.put("udløbet", 2, exp=time.time() - 1)
+    assert cache.get("a") == 1
+    assert cache.get("udløbet") is None
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_evict_user_removes_all_tokens():
+    """evict_user fjerner alle tokens for én enhed og kun dem."""
+    cache = TokenCache()
+    cache.put("a", 1)
+    cache.put("b", 1)
+    cache.put("c", 2)
+    assert cache.evict_user(1) == 2
+    assert cache.get("a") is None
+    assert cache.get("c") == 2
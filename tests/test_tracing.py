@@ -0,0 +1,106 @@
+import sys
+import os
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import app as app_module
+import tracing
+from app import app
+
+
+def test_spans_nest_and_record_after_the_fact():
+    trace = tracing.start("root", sample_rate=1.0)
+    with tracing.span("auth", user=1):
+        with tracing.span("db"):
+            tracing.record("execute", 0.002, statement="SELECT borger")
+    try:
+        with tracing.span("render"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    tracing.finish(trace)
+    assert tracing.current() is None
+
+    by_name = {d["name"]: d for d in trace.to_dicts()}
+    root_id = by_name["root"]["span_id"]
+    assert by_name["root"]["parent_id"] is None
+    assert by_name["auth"]["parent_id"] == root_id
+    assert by_name["auth"]["attrs"] == {"user": 1}
+    assert by_name["db"]["parent_id"] == by_name["auth"]["span_id"]
+    assert by_name["execute"]["parent_id"] == by_name["db"]["span_id"]
+    assert by_name["execute"]["duration_ms"] >= 2.0
+    assert by_name["render"]["attrs"] == {"error": "ValueError"}
+    assert {d["trace_id"] for d in by_name.values()} == {trace.trace_id}
+
+
+def test_unsampled_is_a_no_op():
+    """Uden aktiv trace gør span/traced/record ingenting."""
+    assert tracing.start("root", sample_rate=0.0) is None
+
+    @tracing.traced("fn")
+    def fn(x):
+        return x + 1
+
+    with tracing.span("ingenting") as s:
+        assert s is None
+        assert fn(1) == 2
+        tracing.record("execute", 0.1)
+    assert tracing.current() is None
+
+
+@pytest.fixture
+def traced_app(tmp_path):
+    """Sampler alle requests og skriver traces til tmp_path."""
+    exporter = tracing.JsonLinesExporter(str(tmp_path / "traces.jsonl"))
+    old_exporter, old_rate = app_module.trace_exporter, app.config["TRACE_SAMPLE_RATE"]
+    app_module.trace_exporter = exporter
+    app.config["TRACE_SAMPLE_RATE"] = 1.0
+    app.config["TESTING"] = True
+    try:
+        yield app.test_client(), tmp_path / "traces.jsonl"
+    finally:
+        app_module.trace_exporter = old_exporter
+        app.config["TRACE_SAMPLE_RATE"] = old_rate
+        exporter.close()
+
+
+def _traces(path) -> dict:
+    traces = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        span = json.loads(line)
+        traces.setdefault(span["trace_id"], []).append(span)
+    return traces
+
+
+def test_request_spans_are_exported(traced_app, test_borger_id):
+    client, path = traced_app
+    token = client.post("/token/1").get_json()["token"]
+    response = client.post("/box-event", json={"borger_id": test_borger_id, "box_open": True},
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+    assert client.get("/dashboard").status_code == 200
+
+    traces = _traces(path)
+    assert len(traces) == 3
+    roots = {}
+    for spans in traces.values():
+        root = next(s for s in spans if s["parent_id"] is None)
+        roots[root["name"]] = (root, spans)
+
+    root, spans = roots["POST /box-event"]
+    assert root["attrs"]["status"] == 201
+    names = [s["name"] for s in spans]
+    for name in ("verify_token", "validate", "get_db_connection", "execute"):
+        assert name in names
+    assert all(s["parent_id"] == root["span_id"] for s in spans
+               if s["name"] in ("verify_token", "validate", "get_db_connection"))
+    assert next(s for s in spans if s["name"] == "validate")["attrs"]["schema"] == "BoxEventIn"
+    assert "INSERT box_events" in {s["attrs"].get("statement") for s in spans}
+
+    root, spans = roots["GET /dashboard"]
+    render = next(s for s in spans if s["name"] == "render_template")
+    assert render["parent_id"] == root["span_id"]
+    assert render["attrs"] == {"template": "dashboard.html"}
@@ -0,0 +1,97 @@
+import sys
+import os
+import hashlib
+import hmac
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "ESP32_koder"))
+
+import event_codec
+from app import _flush_events, app, get_db_connection, users
+from ingest_queue import WriteBehindQueue
+from udp_listener import ReplayWindow, UdpListener, derive_key, pack_datagram
+from udp_sender import UdpSender, hmac_sha256
+
+SECRET = b"test-secret"
+
+
+def _listener(events, **kwargs):
+    return UdpListener(SECRET, submit=events.append, is_device=lambda i: i in (1, 2),
+                       host="127.0.0.1", port=0, **kwargs)
+
+
+def test_replay_window():
+    """Nye seq accepteres, gentagelser og seq uden for vinduet afvises."""
+    window = ReplayWindow(size=8)
+    assert [window.check_and_update(s) for s in (0, 2, 1, 2, 10)] == [True, True, True, False, True]
+    assert window.check_and_update(3) is True      # inden for vinduet, ikke set
+    assert window.check_and_update(2) is False     # 8 bag højeste -> for gammel
+
+
+def test_micropython_hmac_matches_stdlib():
+    key, msg = b"k" * 32, b"besked"
+    assert hmac_sha256(key, msg) == hmac.new(key, msg, hashlib.sha256).digest()
+
+
+def test_handle_rejects_forged_replayed_and_stale():
+    events = []
+    listener = _listener(events)
+    try:
+        body = event_codec.encode([("pulse", 1, 70, 0)])
+        key = derive_key(SECRET, 1, 100)
+
+        assert listener.handle(pack_datagram(key, 1, 100, 0, body)) == "ok"
+        assert listener.handle(pack_datagram(key, 1, 100, 0, body)) == "replayed"
+        assert listener.handle(pack_datagram(b"forkert", 1, 100, 1, body)) == "bad_signature"
+        assert listener.handle(pack_datagram(key, 9, 100, 1, body)) == "unknown_device"
+        assert listener.handle(b"kort") == "malformed"
+
+        # Ny session: seq starter forfra, og den gamle session er død
+        new_key = derive_key(SECRET, 1, 101)
+        assert listener.handle(pack_datagram(new_key, 1, 101, 0, body)) == "ok"
+        assert listener.handle(pack_datagram(key, 1, 100, 5, body)) == "stale_session"
+
+        assert len(events) == 2
+        assert events[0][:3] == ("pulse", 1, 70)
+        assert listener.stats()["replayed"] == 1
+    finally:
+        listener._sock.close()
+
+
+def test_udp_end_to_end_on_localhost(client, test_borger_id):
+    """Enhed henter nøgle via /udp-key, sender over UDP, og events lander i databasen."""
+    token = client.post("/token/1").get_json()["token"]
+    response = client.post("/udp-key/1", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    info = response.get_json()
+    assert client.post("/udp-key/2", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+    queue = WriteBehindQueue(_flush_events, batch_size=100, flush_interval=0.05)
+    queue.start()
+    listener = UdpListener(app.config["SECRET_KEY"], submit=queue.put,
+                           is_device=lambda i: i == users[0].id, host="127.0.0.1", port=0)
+    listener.start()
+    try:
+        sender = UdpSender("127.0.0.1", listener.address[1], 1, info["session"],
+                           bytes.fromhex(info["key"]))
+        for bpm in (60, 61, 62):
+            assert sender.send([("pulse", test_borger_id, bpm, 0)])
+        deadline = time.monotonic() + 5
+        while listener.stats()["accepted_events"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sender.close()
+    finally:
+        listener.stop()
+        listener.join()
+        queue.stop()
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT bpm FROM pulse_events WHERE borger_id = %s ORDER BY bpm;",
+                            (test_borger_id,))
+                assert [r[0] for r in cur.fetchall()] == [60, 61, 62]
+    finally:
+        conn.close()
@@ -0,0 +1,74 @@
+# token_cache.py
+"""
+LRU-cache over allerede verificerede Bearer-tokens.
+
+En cache-hit sparer jwt.decode() med HMAC-verifikation på hvert
+ingest-kald. Hvert opslag gemmer enhedens id og et udløbstidspunkt,
+så tokens med "exp" ikke lever længere i cachen end i sig selv.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """Trådsikker LRU-cache: token -> (user_id, udløber)."""
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, token: str) -> int | None:
+        """Returnerer user_id for et gyldigt cachet token, ellers None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            uid, expires = entry
+            if expires <= now:
+                del self._entries[token]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(token)
+            self._stats["hits"] += 1
+            return uid
+
+    def put(self, token: str, uid: int, exp: float | None = None):
+        """
+        Cacher et verificeret token i højst ttl sekunder.
+        exp er tokenets eget udløb (unix-tid), hvis det har et.
+        """
+        lifetime = self.ttl
+        if exp is not None:
+            lifetime = min(lifetime, exp - time.time())
+            if lifetime <= 0:
+                return
+        with self._lock:
+            self._entries[token] = (uid, time.monotonic() + lifetime)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def evict_user(self, uid: int) -> int:
+        """Fjerner alle cachede tokens for en enhed. Returnerer antal."""
+        with self._lock:
+            tokens = [t for t, (u, _) in self._entries.items() if u == uid]
+            for t in tokens:
+                del self._entries[t]
+        return len(tokens)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = len(self._entries)
+        return data
@@ -0,0 +1,167 @@
+# tracing.py
+"""
+Letvægts-tracing: indlejrede spans med tider pr. request, skrevet som
+JSON-lines (ét span pr. linje) til en roterende fil.
+
+Det aktuelle span ligger i en ContextVar. Kun en stikprøve af requests
+(sample_rate) får et rod-span; for alle andre finder span()/traced() intet
+aktivt span og koster kun et ContextVar-opslag, så instrumenteringen kan
+blive i koden. Spans samles i hukommelsen og skrives samlet når requesten
+slutter.
+
+Brug:
+    trace = tracing.start("POST /box-event", sample_rate=0.01)
+    with tracing.span("get_db_connection"):
+        ...
+    tracing.record("execute", sekunder, statement="INSERT box_events")  # efter tiden
+    tracing.finish(trace, exporter)
+"""
+import functools
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+_current = ContextVar("iomt_span", default=None)
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "root", "token", "_t0_perf", "_t0_unix", "_next_id")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(64):016x}"
+        self.spans = []
+        self.root = None
+        self.token = None
+        self._t0_perf = time.perf_counter()
+        self._t0_unix = time.time()
+        self._next_id = 0
+
+    def new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def to_dicts(self) -> list:
+        return [{
+            "trace_id": self.trace_id,
+            "span_id": s.span_id,
+            "parent_id": s.parent.span_id if s.parent is not None else None,
+            "name": s.name,
+            "start": round(self._t0_unix + (s.start - self._t0_perf), 6),
+            "duration_ms": round((s.end - s.start) * 1000, 3),
+            "attrs": s.attrs,
+        } for s in self.spans]
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent", "name", "attrs", "start", "end")
+
+    def __init__(self, trace, parent, name, attrs, start):
+        self.trace = trace
+        self.span_id = trace.new_id()
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+        self.start = start
+        self.end = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+def current() -> Span | None:
+    return _current.get()
+
+
+def start(name: str, sample_rate: float, **attrs) -> Trace | None:
+    """Starter et rod-span for en stikprøve af kaldene; None hvis dette ikke er med."""
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    trace = Trace()
+    trace.root = Span(trace, None, name, attrs, trace._t0_perf)
+    trace.token = _current.set(trace.root)
+    return trace
+
+
+def finish(trace: Trace, exporter=None):
+    """Afslutter rod-spannet og eksporterer hele tracen."""
+    root = trace.root
+    root.end = time.perf_counter()
+    trace.spans.append(root)
+    _current.reset(trace.token)
+    if exporter is not None:
+        exporter.export(trace)
+
+
+class span:
+    """with tracing.span("navn", nøgle=værdi): ... – no-op uden aktiv trace."""
+
+    __slots__ = ("name", "attrs", "_span", "_token")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self._span = None
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is not None:
+            self._span = Span(parent.trace, parent, self.name, self.attrs, time.perf_counter())
+            self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        s = self._span
+        if s is not None:
+            s.end = time.perf_counter()
+            if exc_type is not None:
+                s.attrs["error"] = exc_type.__name__
+            s.trace.spans.append(s)
+            _current.reset(self._token)
+        return False
+
+
+def traced(name: str):
+    """Decorator: funktionen bliver et span, når den kaldes under en aktiv trace."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name: str, seconds: float, **attrs):
+    """Span for noget der allerede er sket og tog `seconds` (slutter nu)."""
+    parent = _current.get()
+    if parent is None:
+        return
+    end = time.perf_counter()
+    s = Span(parent.trace, parent, name, attrs, end - seconds)
+    s.end = end
+    parent.trace.spans.append(s)
+
+
+class JsonLinesExporter:
+    """Skriver spans som JSON-lines til en roterende fil (trådsikkert via logging-handleren)."""
+
+    def __init__(self, path: str, max_bytes: int = 20 * 1024 * 1024, backups: int = 3):
+        self.path = os.path.abspath(path)
+        self._handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backups,
+                                            encoding="utf-8", delay=True)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def export(self, trace: Trace):
+        lines = [json.dumps(d, ensure_ascii=False, default=str) for d in trace.to_dicts()]
+        # Hele tracen i ét skriv (under handlerens lås), så samtidige requests ikke blandes
+        record = logging.LogRecord("tracing", logging.INFO, __file__, 0, "\n".join(lines), None, None)
+        self._handler.handle(record)
+
+    def close(self):
+        self._handler.close()
@@ -0,0 +1,199 @@
+# udp_listener.py
+"""
+UDP-indsamling af telemetri (fx rå pulsmålinger), hvor et tabt datagram
+er acceptabelt, men en fuld HTTP-request pr. måling er for dyr.
+
+Datagram (little-endian):
+    device_id (uint16), session (uint32), seq (uint32)   10 bytes
+    body i event_codec-format                             5 + 11*n bytes
+    HMAC-SHA256 over alt ovenfor, afkortet til 16 bytes
+
+Nøglen afhænger af enhed og session og udledes af serverens SECRET_KEY,
+så serveren ikke skal gemme nøgler. En enhed henter session og nøgle via
+POST /udp-key/<id> (med sit Bearer-token) og tæller seq op fra 0.
+Gentagne eller for gamle seq afvises med et glidende vindue pr. enhed,
+og datagrammer fra en ældre session end den seneste afvises helt.
+Gyldige events sendes videre til submit() – i app.py write-behind-køen.
+"""
+import hashlib
+import hmac
+import logging
+import socket
+import struct
+import threading
+from datetime import datetime, timezone
+
+import event_codec
+
+logger = logging.getLogger(__name__)
+
+HEADER = "<HII"
+HEADER_SIZE = struct.calcsize(HEADER)
+TAG_SIZE = 16
+REPLAY_WINDOW = 64
+
+
+def derive_key(secret: bytes, device_id: int, session: int) -> bytes:
+    """Nøgle for én enhed og session."""
+    return hmac.new(secret, f"udp:{device_id}:{session}".encode(), hashlib.sha256).digest()
+
+
+def sign(key: bytes, message: bytes) -> bytes:
+    return hmac.new(key, message, hashlib.sha256).digest()[:TAG_SIZE]
+
+
+def pack_datagram(key: bytes, device_id: int, session: int, seq: int, body: bytes) -> bytes:
+    """Bygger et signeret datagram (samme format som ESP32_koder/udp_sender.py)."""
+    message = struct.pack(HEADER, device_id, session, seq) + body
+    return message + sign(key, message)
+
+
+class ReplayWindow:
+    """
+    Glidende vindue over de seneste `size` sekvensnumre (som IPsec):
+    højeste set seq plus en bitmaske for dem lige under.
+    """
+
+    def __init__(self, size: int = REPLAY_WINDOW):
+        self.size = size
+        self.highest = -1
+        self._bits = 0
+
+    def check_and_update(self, seq: int) -> bool:
+        """True hvis seq er ny (og markeres set), False ved gentagelse/for gammel."""
+        if seq > self.highest:
+            shift = seq - self.highest
+            self._bits = ((self._bits << shift) | 1) & ((1 << self.size) - 1)
+            self.highest = seq
+            return True
+        offset = self.highest - seq
+        if offset >= self.size or self._bits >> offset & 1:
+            return False
+        self._bits |= 1 << offset
+        return True
+
+
+class _DeviceState:
+    __slots__ = ("session", "key", "window")
+
+    def __init__(self, session: int, key: bytes, window_size: int):
+        self.session = session
+        self.key = key
+        self.window = ReplayWindow(window_size)
+
+
+class UdpListener(threading.Thread):
+    """
+    Baggrundstråd der modtager datagrammer på (host, port).
+    submit(event) får (type, borger_id, værdi, created_at) og må rejse en
+    exception (fx QueueFull) – eventet tælles så som droppet.
+    is_device(id) afgør om enheden findes, før HMAC regnes.
+    """
+
+    def __init__(self, secret: bytes, submit, is_device, host: str = "0.0.0.0",
+                 port: int = 5005, window: int = REPLAY_WINDOW):
+        super().__init__(name="udp-listener", daemon=True)
+        self.secret = secret
+        self.submit = submit
+        self.is_device = is_device
+        self.window_size = window
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.settimeout(0.5)
+        self._stop_event = threading.Event()
+        self._devices = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "datagrams": 0,
+            "accepted_events": 0,
+            "dropped_events": 0,
+            "malformed": 0,
+            "unknown_device": 0,
+            "bad_signature": 0,
+            "replayed": 0,
+            "stale_session": 0,
+        }
+
+    @property
+    def address(self) -> tuple:
+        return self._sock.getsockname()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    data, _ = self._sock.recvfrom(2048)
+                except socket.timeout:
+                    continue
+                try:
+                    self.handle(data)
+                except Exception:
+                    logger.exception("Fejl ved UDP-datagram")
+        finally:
+            self._sock.close()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def handle(self, data: bytes) -> str:
+        """Behandler ét datagram. Returnerer udfaldet (til tests/logning)."""
+        self._count("datagrams")
+        if len(data) < HEADER_SIZE + event_codec.HEADER_SIZE + TAG_SIZE:
+            self._count("malformed")
+            return "malformed"
+        device_id, session, seq = struct.unpack_from(HEADER, data, 0)
+        if not self.is_device(device_id):
+            self._count("unknown_device")
+            return "unknown_device"
+
+        state = self._devices.get(device_id)
+        if state is not None and session < state.session:
+            self._count("stale_session")
+            return "stale_session"
+        key = state.key if state is not None and state.session == session \
+            else derive_key(self.secret, device_id, session)
+
+        message, tag = data[:-TAG_SIZE], data[-TAG_SIZE:]
+        if not hmac.compare_digest(sign(key, message), tag):
+            self._count("bad_signature")
+            return "bad_signature"
+
+        try:
+            records = event_codec.decode(message[HEADER_SIZE:])
+        except event_codec.CodecError:
+            self._count("malformed")
+            return "malformed"
+
+        with self._lock:
+            state = self._devices.get(device_id)
+            if state is None or session > state.session:
+                state = self._devices[device_id] = _DeviceState(session, key, self.window_size)
+            elif session < state.session:
+                self._stats["stale_session"] += 1
+                return "stale_session"
+            if not state.window.check_and_update(seq):
+                self._stats["replayed"] += 1
+                return "replayed"
+
+        received_at = datetime.now(timezone.utc)
+        accepted = dropped = 0
+        for kind, borger_id, value, ts in records:
+            created_at = datetime.fromtimestamp(ts, timezone.utc) if ts else received_at
+            try:
+                self.submit((kind, borger_id, value, created_at))
+                accepted += 1
+            except Exception:
+                dropped += 1
+        self._count("accepted_events", accepted)
+        self._count("dropped_events", dropped)
+        return "ok"
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data["devices"] = len(self._devices)
+        return data